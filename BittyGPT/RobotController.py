@@ -9,6 +9,10 @@ import struct
 import threading
 import time
 
+import bootstrap    # serialMaster on sys.path
+from skill import Skill, splitLargeAngles
+from skillLibrary import library
+
 
 # Configure logging
 FORMAT = '%(asctime)-15s %(name)s - %(levelname)s - %(message)s'
@@ -25,11 +29,12 @@ def ensure_bytes(value):
     return value
 
 class RobotController:
-    def __init__(self):
+    def __init__(self, model='Bittle'):
         self.delay_between_slices = 0.001
         self.return_value = ''
         self.logger = logging.getLogger(self.__class__.__name__)
         self.port = None
+        self.model = model
 
 
     def serial_write_num_to_byte(self, port, token, var=None):
@@ -38,41 +43,10 @@ class RobotController:
             var = []
 
         if token == 'K':
-            period = var[0]
-            skill_header = 4 if period > 0 else 7
-            frame_size = (
-                8 if period > 1 else 16 if period == 1 else 20
-            )  # gait, posture, behavior
-            angle_ratio = 1
-
-            for row in range(abs(period)):
-                angles = var[
-                    skill_header
-                    + row * frame_size : skill_header
-                    + row * frame_size
-                    + min(16, frame_size)
-                ]
-                if any(angle > 125 or angle < -125 for angle in angles):
-                    angle_ratio = 2
-                    break
-
-            if angle_ratio == 2:
-                var[3] = 2
-                for row in range(abs(period)):
-                    indices = range(
-                        skill_header + row * frame_size,
-                        skill_header
-                        + row * frame_size
-                        + min(16, frame_size),
-                    )
-                    for i in indices:
-                        var[i] //= 2
-
-                msg = f'rescaled: {var}'
-                self.logger.debug(msg)
-
-            var = list(map(int, var))
-            in_str = token.encode() + struct.pack('b' * len(var), *var) + b'~'
+            skill = var if isinstance(var, Skill) else Skill(var)
+            if skill.angleRatio > 1 and not isinstance(var, Skill):
+                self.logger.debug(f'rescaled: {skill.toList()}')
+            in_str = skill.encode()
 
         else:
             message = list(map(int, var)) if var else []
@@ -129,38 +103,25 @@ class RobotController:
         time.sleep(0.01)
 
     def print_serial_message(self, port, token, timeout=0):
-        threshold = 4 if token in 'kK' else 3
-        start_time = time.time()
-        all_prints = ''
-        while True:
-            time.sleep(0.001)
-            if port:
-                response = port.serial_engine.readline().decode('ISO-8859-1')
-                if response:
-                    self.logger.debug(f"response is: {response}")
-                    response_trim = response.split('\r')[0]
-                    self.logger.debug(f"response_trim is: {response_trim}")
-                    if response_trim.lower() == token.lower():
-                        return [response, all_prints]
-                    elif token == 'p' and response_trim == 'k':
-                        return [response, all_prints]
-                    else:
-                        all_prints += response
-            now = time.time()
-            if (now - start_time) > threshold:
-                self.logger.debug(f"Elapsed time: {threshold} seconds")
-                threshold += 2
-                if threshold > 5:
-                    return -1
-            if 0 < timeout < now - start_time:
-                return -1
+        threshold = 4 if token in 'kK' else 5
+        if 0 < timeout < threshold:
+            threshold = timeout
+        if not port:
+            return -1
+        # The reader thread of the port collects the lines and wakes us up on the echoed token
+        port.start_reader()
+        result = port.wait_response(port.expect(token), threshold)
+        if result == -1:
+            self.logger.debug(f"Elapsed time: {threshold} seconds")
+        return result
 
     # TODO: make port member of the class
     def send_task(self, port, task, timeout=0):
         self.logger.debug(f'Task: {task}')
         if port:
             try:
-                if (previous_buffer := port.serial_engine.read_all().decode('ISO-8859-1')):
+                port.start_reader()
+                if (previous_buffer := port.flush_input()):
                     self.logger.debug(f'Previous buffer: {previous_buffer}')
 
                 if len(task) == 2:
@@ -192,12 +153,7 @@ class RobotController:
             indexed_list = []
 
             if token == 'L':
-                for i in range(4):
-                    for j in range(4):
-                        angle = var[4 * j + i]
-                        if angle < -125 or angle > 125:
-                            indexed_list += [4 * j + i, angle]
-                            var[4 * j + i] = max(min(angle, 125), -125)
+                var, indexed_list = splitLargeAngles(var)
                 if var:
                     queue.append(['L', var, task[-1]])
                 if indexed_list:
@@ -225,6 +181,18 @@ class RobotController:
         else:
             return self._send_to_single_port(ports, task, timeout)
 
+    def skill_names(self, kind=None):
+        """Names of the skills of the model in the skill library, e.g. kind='posture'."""
+        return library().names(self.model, kind)
+
+    def send_skill(self, ports, name, timeout=0):
+        """Send a skill of the library by name as a K command, or return None if the model has no such skill."""
+        skill = library().skill(name, self.model)
+        if skill is None:
+            self.logger.info(f'No skill {name} for {self.model}')
+            return None
+        return self.send(ports, ['K', skill, timeout])
+
     def _send_to_single_port(self, port, task, timeout=0):
         queue = self.split_task_for_large_angles(task)
         for task in queue:
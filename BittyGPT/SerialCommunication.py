@@ -1,9 +1,52 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
+import logging
+import threading
+import time
+
 import serial
 import serial.tools.list_ports
 
+logger = logging.getLogger(__name__)
+
+# How long a timed-out request keeps absorbing its late echo, in seconds
+LATE_RESPONSE_GRACE = 10
+# How many lines to keep when nobody is waiting for them
+UNCLAIMED_LINES = 200
+# Echoes of the tokens that the firmware answers with another token
+ECHO_TOKENS = {'K': ['k'], 'T': ['T', 'k'], 'p': ['p', 'P', 'k'], 'g': ['g', 'G'], 'G': ['g', 'G'],
+               'v': ['v', 'V'], 'V': ['v', 'V'], 'z': ['z', 'Z']}
+
+
+class PendingResponse:
+    """
+    A command waiting for its echoed token from the robot.
+    """
+
+    def __init__(self, token):
+        """
+        :param token: Command token whose echo completes the request.
+        """
+        self.token = 'X' if 'X' in token else token
+        self.prints = ''
+        self.response = None
+        self.expired = None  # time.monotonic() when the waiter gave up
+        self.event = threading.Event()
+
+    def matches(self, line):
+        """
+        Check whether a received line is the echo of this command.
+
+        :param line: Decoded line including its line ending.
+        :return: True if the line completes the request.
+        """
+        line_trim = line.split('\r')[0]
+        if self.expired is not None:
+            # Only the exact echo, so a late 'i' does not take the 'I' of a later command
+            return line_trim in ECHO_TOKENS.get(self.token, [self.token])
+        return line_trim.lower() == self.token.lower() or (self.token == 'p' and line_trim == 'k')
+
 
 class Communication:
     """
@@ -23,6 +66,12 @@ class Communication:
         self.timeout = timeout
         self.serial_engine = None
         # self.is_open = False
+        self.reader_thread = None
+        self.reader_running = False
+        self.response_lock = threading.Lock()
+        self.waiters = []  # PendingResponse objects in the order the commands were sent
+        self.unclaimed = []  # Lines received while no command was waiting
+        self.late_responses = []  # Echoes that arrived after their command timed out
 
         try:
             # Open the serial port
@@ -88,10 +137,151 @@ class Communication:
         """
         Close the serial port if it's open.
         """
+        self.stop_reader()
         if self.serial_engine.is_open:
             self.serial_engine.close()
             # self.is_open = False
 
+    def start_reader(self):
+        """
+        Start the background thread that reads the serial port continuously
+        and hands every line to the command waiting for it.
+        """
+        if self.serial_engine is None or not self.serial_engine.is_open:
+            return
+        if self.reader_thread is not None and self.reader_thread.is_alive():
+            return
+        self.reader_running = True
+        self.reader_thread = threading.Thread(
+            target=self._read_loop, name=f'reader-{self.port}', daemon=True
+        )
+        self.reader_thread.start()
+
+    def stop_reader(self):
+        """
+        Stop the background reader thread.
+        """
+        self.reader_running = False
+        if self.reader_thread is not None and self.reader_thread is not threading.current_thread():
+            try:
+                self.serial_engine.cancel_read()  # Return from a blocking read() right away
+            except Exception:
+                pass
+            self.reader_thread.join(2 * (self.timeout or 0) + 0.1)
+        self.reader_thread = None
+
+    def _read_loop(self):
+        """
+        Body of the reader thread. read() blocks until data arrives or the
+        port timeout passes, so an idle port costs no CPU.
+        """
+        buffer = b''
+        while self.reader_running:
+            try:
+                data = self.serial_engine.read(max(1, self.serial_engine.in_waiting))
+            except Exception as e:  # The port is closed or unplugged
+                logger.debug(f'Reader of {self.port} stopped: {e}')
+                break
+            if not data:
+                continue
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                self._dispatch_line((line + b'\n').decode('ISO-8859-1'))
+        self.reader_running = False
+        # Wake up the commands that are still waiting so they fail right away
+        with self.response_lock:
+            for waiter in self.waiters:
+                waiter.event.set()
+            self.waiters.clear()
+
+    def _dispatch_line(self, line):
+        """
+        Give a received line to the oldest command whose token it echoes,
+        otherwise add it to the prints of the oldest command still waiting.
+
+        :param line: Decoded line including its line ending.
+        """
+        logger.debug(f'response is: {line}')
+        with self.response_lock:
+            for waiter in self.waiters:
+                if waiter.matches(line):
+                    self.waiters.remove(waiter)
+                    waiter.response = line
+                    if waiter.expired is not None:
+                        logger.info(f'Late response on {self.port} for {waiter.token}: {line.strip()}')
+                        self.late_responses = (self.late_responses + [[line, waiter.prints]])[-UNCLAIMED_LINES:]
+                    waiter.event.set()
+                    return
+            for waiter in self.waiters:
+                if waiter.expired is None:
+                    waiter.prints += line
+                    return
+            self.unclaimed = (self.unclaimed + [line])[-UNCLAIMED_LINES:]
+
+    def flush_input(self):
+        """
+        Drop the lines nobody has claimed yet.
+
+        :return: The dropped lines as one string.
+        """
+        with self.response_lock:
+            text = ''.join(self.unclaimed)
+            self.unclaimed = []
+        return text
+
+    def expect(self, token):
+        """
+        Register a command that waits for its echoed token. Lines that
+        arrived after the last flush_input() are claimed first.
+
+        :param token: Command token.
+        :return: PendingResponse to pass to wait_response().
+        """
+        waiter = PendingResponse(token)
+        with self.response_lock:
+            now = time.monotonic()
+            self.waiters = [w for w in self.waiters
+                            if w.expired is None or now - w.expired < LATE_RESPONSE_GRACE]
+            while self.unclaimed and waiter.response is None:
+                line = self.unclaimed.pop(0)
+                if waiter.matches(line):
+                    waiter.response = line
+                    waiter.event.set()
+                else:
+                    waiter.prints += line
+            if waiter.response is None:
+                self.waiters.append(waiter)
+        return waiter
+
+    def wait_response(self, waiter, timeout):
+        """
+        Wait for the echo registered by expect().
+
+        :param waiter: PendingResponse returned by expect().
+        :param timeout: Seconds to wait.
+        :return: [response, all_prints], or -1 on timeout or if the reader stopped.
+        """
+        waiter.event.wait(timeout)
+        with self.response_lock:
+            if waiter.response is not None:
+                return [waiter.response, waiter.prints]
+            if waiter in self.waiters:
+                # Keep it queued for a while so a late echo is not mistaken for the next command's
+                waiter.expired = time.monotonic()
+        return -1
+
+    def cancel(self, waiter):
+        """
+        Stop waiting for the echo registered by expect() without keeping it for a late echo,
+        so the echo goes to the next command with the same token.
+
+        :param waiter: PendingResponse returned by expect().
+        """
+        with self.response_lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
     @staticmethod
     def list_available_ports():
         """
@@ -102,6 +292,15 @@ class Communication:
         ports = serial.tools.list_ports.comports()
         return [(port.device, port.name) for port in ports]
 
+    @staticmethod
+    def used_ports():
+        """
+        List the devices of the available serial ports.
+
+        :return: List of port device strings, e.g. '/dev/ttyUSB0'.
+        """
+        return [device for device, name in Communication.list_available_ports()]
+
     def read_size(self, size):
         """
         Read a specific number of bytes from the serial port.
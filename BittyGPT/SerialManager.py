@@ -15,6 +15,10 @@ from SerialCommunication import Communication
 import config
 import tkinter as tk
 
+import bootstrap    # serialMaster on sys.path
+from skill import Skill, splitLargeAngles
+from robotProbe import waitForRobot
+
 # Configure logging
 FORMAT = '%(asctime)-15s %(name)s - %(levelname)s - %(message)s'
 logging.basicConfig(
@@ -44,39 +48,10 @@ class RobotController:
             var = []
 
         if token == 'K':
-            period = var[0]
-            skill_header = 4 if period > 0 else 7
-            frame_size = (
-                8 if period > 1 else 16 if period == 1 else 20
-            )  # gait, posture, behavior
-            angle_ratio = 1
-
-            for row in range(abs(period)):
-                angles = var[
-                    skill_header
-                    + row * frame_size : skill_header
-                    + row * frame_size
-                    + min(16, frame_size)
-                ]
-                if any(angle > 125 or angle < -125 for angle in angles):
-                    angle_ratio = 2
-                    break
-
-            if angle_ratio == 2:
-                var[3] = 2
-                for row in range(abs(period)):
-                    indices = range(
-                        skill_header + row * frame_size,
-                        skill_header
-                        + row * frame_size
-                        + min(16, frame_size),
-                    )
-                    for i in indices:
-                        var[i] //= 2
-                print_header('rescaled:\n', var)
-
-            var = list(map(int, var))
-            in_str = token.encode() + struct.pack('b' * len(var), *var) + b'~'
+            skill = var if isinstance(var, Skill) else Skill(var)
+            if skill.angleRatio > 1 and not isinstance(var, Skill):
+                print_header('rescaled:\n', skill.toList())
+            in_str = skill.encode()
 
         else:
             message = list(map(int, var)) if var else []
@@ -132,37 +107,24 @@ class RobotController:
         time.sleep(0.01)
 
     def print_serial_message(self, port, token, timeout=0):
-        threshold = 4 if token in 'kK' else 3
-        start_time = time.time()
-        all_prints = ''
-        while True:
-            time.sleep(0.001)
-            if port:
-                response = port.serial_engine.readline().decode('ISO-8859-1')
-                if response:
-                    self.logger.debug(f"response is: {response}")
-                    response_trim = response.split('\r')[0]
-                    self.logger.debug(f"response_trim is: {response_trim}")
-                    if response_trim.lower() == token.lower():
-                        return [response, all_prints]
-                    elif token == 'p' and response_trim == 'k':
-                        return [response, all_prints]
-                    else:
-                        all_prints += response
-            now = time.time()
-            if (now - start_time) > threshold:
-                self.logger.debug(f"Elapsed time: {threshold} seconds")
-                threshold += 2
-                if threshold > 5:
-                    return -1
-            if 0 < timeout < now - start_time:
-                return -1
+        threshold = 4 if token in 'kK' else 5
+        if 0 < timeout < threshold:
+            threshold = timeout
+        if not port:
+            return -1
+        # The reader thread of the port collects the lines and wakes us up on the echoed token
+        port.start_reader()
+        result = port.wait_response(port.expect(token), threshold)
+        if result == -1:
+            self.logger.debug(f"Elapsed time: {threshold} seconds")
+        return result
 
     def send_task(self, port_list, port, task, timeout=0):
         self.logger.debug(f'Task: {task}')
         if port:
             try:
-                previous_buffer = port.serial_engine.read_all().decode('ISO-8859-1')
+                port.start_reader()
+                previous_buffer = port.flush_input()
                 if previous_buffer:
                     self.logger.debug(f"Previous buffer: {previous_buffer}")
                 if len(task) == 2:
@@ -207,12 +169,7 @@ class RobotController:
             var = task[1]
             indexed_list = []
             if token == 'L':
-                for i in range(4):
-                    for j in range(4):
-                        angle = var[4 * j + i]
-                        if angle < -125 or angle > 125:
-                            indexed_list += [4 * j + i, angle]
-                            var[4 * j + i] = max(min(angle, 125), -125)
+                var, indexed_list = splitLargeAngles(var)
                 if var:
                     queue.append(['L', var, task[-1]])
                 if indexed_list:
@@ -303,21 +260,10 @@ class PortManager:
 
     def test_port(self, port_list, serial_object, port_name):
         try:
-            time.sleep(3)
-            wait_time = 0
+            serial_object.start_reader()  # Buffer the boot messages while waiting
             result = serial_object.serial_engine
             if result:
-                result = result.read_all().decode('ISO-8859-1')
-                if result:
-                    print('Waiting for the robot to boot up')
-                    time.sleep(2)
-                    wait_time = 3
-                else:
-                    wait_time = 2
-                robot_controller = RobotController()
-                result = robot_controller.send_task(
-                    port_list, serial_object, ['?', 0], wait_time
-                )
+                result = waitForRobot(serial_object, lambda port: RobotController().serial_write_byte(port, ['?']))
                 if result != -1:
                     self.logger.debug(f"Adding port: {port_name}")
                     port_list.update({serial_object: port_name})
@@ -440,10 +386,10 @@ class PortManager:
         print('Counting down to manual mode:')
 
         def countdown(start, ap):
-            cur_ports = copy.deepcopy(Communication.Print_Used_Com())
+            cur_ports = copy.deepcopy(Communication.used_ports())
             if len(cur_ports) != len(ap):
                 time.sleep(0.5)
-                cur_ports = copy.deepcopy(Communication.Print_Used_Com())
+                cur_ports = copy.deepcopy(Communication.used_ports())
                 if len(cur_ports) < len(ap):
                     ap = cur_ports
                     start = time.time()
@@ -492,7 +438,7 @@ class PortManager:
             label_t.grid(row=0, column=0)
             label.grid(row=1, column=0)
             label['text'] = "{} s".format(thres)
-            countdown(time.time(), copy.deepcopy(Communication.Print_Used_Com()))
+            countdown(time.time(), copy.deepcopy(Communication.used_ports()))
 
         label_c = tk.Label(window, font='sans 14 bold', justify='left')
         label_c['text'] = 'Please reconnect the device.'
@@ -505,7 +451,7 @@ class PortManager:
         window.mainloop()
 
     def manual_select(self, port_list, window, need_send_task=True, need_open_port=True):
-        all_ports = self.delete_duplicated_usb_serial(Communication.Print_Used_Com())
+        all_ports = self.delete_duplicated_usb_serial(Communication.used_ports())
         window.title('Manual mode')
         l1 = tk.Label(window, font='sans 14 bold')
         l1['text'] = 'Manual mode'
@@ -517,7 +463,7 @@ class PortManager:
         ls.grid(row=2, column=0)
 
         def refresh_box(ls):
-            all_ports = self.delete_duplicated_usb_serial(Communication.Print_Used_Com())
+            all_ports = self.delete_duplicated_usb_serial(Communication.used_ports())
             ls.delete(0, tk.END)
             for p in all_ports:
                 ls.insert(tk.END, p)
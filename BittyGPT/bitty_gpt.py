@@ -15,6 +15,13 @@ import time
 
 import config
 
+import bootstrap    # serialMaster on sys.path
+from skill import Skill, splitLargeAngles
+from skillLibrary import library
+from scheduleCompiler import compileSchedule
+from portWorker import PortWorker
+from robotProbe import waitForRobot
+
 
 FORMAT = '%(asctime)-15s %(name)s - %(levelname)s - %(message)s'
 logging.basicConfig(filename='./logfile.log', filemode='a+', level=logging.INFO, format=FORMAT)
@@ -45,38 +52,10 @@ def serialWriteNumToByte(port, token, var=None):  # Only to be used for c m u b
     if var is None:
         var = []
     if token == 'K':
-        period = var[0]
-        #        print(encode(in_str))
-        if period > 0:
-            skillHeader = 4
-        else:
-            skillHeader = 7
-
-        if period > 1:
-            frameSize = 8  # gait
-        elif period == 1:
-            frameSize = 16  # posture
-        else:
-            frameSize = 20  # behavior
-    # divide large angles by 2
-        angleRatio = 1
-        for row in range(abs(period)):
-            for angle in var[skillHeader + row * frameSize:skillHeader + row * frameSize + min(16,frameSize)]:
-                if angle > 125 or angle<-125:
-                    angleRatio = 2
-                    break
-            if angleRatio ==2:
-                break
-        
-        if angleRatio == 2:
-            var[3] = 2
-            for row in range(abs(period)):
-                for i in range(skillHeader + row * frameSize,skillHeader + row * frameSize + min(16,frameSize)):
-                    var[i] //=2
-            printH('rescaled:\n',var)
-            
-        var = list(map(int, var))
-        in_str = token.encode() + struct.pack('b' * len(var), *var) + '~'.encode()
+        skill = var if isinstance(var, Skill) else Skill(var)    # angles beyond 125 are halved
+        if skill.angleRatio > 1 and not isinstance(var, Skill):
+            printH('rescaled:\n', skill.toList())
+        in_str = skill.encode()
 
     else:
         if token.isupper():# == 'L' or token == 'I' or token == 'B' or token == 'C':
@@ -84,7 +63,7 @@ def serialWriteNumToByte(port, token, var=None):  # Only to be used for c m u b
 #                packType = 'B'
 #            else:
 #                packType = 'b'
-#            port.Send_data(token.encode())
+#            port.send_data(token.encode())
             if len(var)>0:
                 message = list(map(int, var))
                 if token == 'B':
@@ -108,14 +87,14 @@ def serialWriteNumToByte(port, token, var=None):  # Only to be used for c m u b
     slice = 0
     while len(in_str) > slice:
         if len(in_str) - slice >= 20:
-            port.Send_data(in_str[slice:slice+20])
+            port.send_data(in_str[slice:slice+20])
         else:
-            port.Send_data(in_str[slice:])
+            port.send_data(in_str[slice:])
         slice+=20
         time.sleep(delayBetweenSlice)
     logger.debug(f"!!!! {in_str}")
             #print(encode(in_str))
-#            port.Send_data(encode(message))
+#            port.send_data(encode(message))
 
 
 def serialWriteByte(port, var=None):
@@ -139,7 +118,7 @@ def serialWriteByte(port, var=None):
     else:
         in_str = token + '\n'
     logger.debug(f"!!!!!!! {in_str}")
-    port.Send_data(encode(in_str))
+    port.send_data(encode(in_str))
     time.sleep(0.01)
 
 
@@ -147,37 +126,17 @@ def printSerialMessage(port, token, timeout=0):
     if token == 'k' or token == 'K':
         threshold = 4
     else:
-        threshold = 3
-    #    if token == 'K':
-    #        timeout = 1
-    startTime = time.time()
-    allPrints = ''
-    while True:
-        time.sleep(0.001)
-        #            return 'err'
-        if port:
-            response = port.main_engine.readline().decode('ISO-8859-1')
-            if response != '':
-                logger.debug(f"response is: {response}")
-                responseTrim = response.split('\r')[0]
-                logger.debug(f"responseTrim is: {responseTrim}")
-                if responseTrim.lower() == token.lower(): 
-                    return [response, allPrints]
-                elif token == 'p' and responseTrim == 'k':
-                    return [response, allPrints]
-                else:
-                    # print(response, flush=True)
-                    allPrints += response
-        now = time.time()
-        if (now - startTime) > threshold:
-            # print('Elapsed time: ', end='')
-            # print(threshold, end=' seconds\n', flush=True)
-            logger.debug(f"Elapsed time: {threshold} seconds")
-            threshold += 2
-            if threshold > 5:
-                return -1
-        if 0 < timeout < now - startTime:
-            return -1
+        threshold = 5
+    if 0 < timeout < threshold:
+        threshold = timeout
+    if not port:
+        return -1
+    # the reader thread of the port collects the lines and wakes us up on the echoed token
+    port.start_reader()
+    result = port.wait_response(port.expect(token), threshold)
+    if result == -1:
+        logger.debug(f"Elapsed time: {threshold} seconds")
+    return result
 
 
 def sendTask(PortList, port, task, timeout=0):  # task Structure is [token, var=[], time]
@@ -187,7 +146,8 @@ def sendTask(PortList, port, task, timeout=0):  # task Structure is [token, var=
     #    print(task)
     if port:
         try:
-            previousBuffer = port.main_engine.read_all().decode('ISO-8859-1')
+            port.start_reader()
+            previousBuffer = port.flush_input()
             if previousBuffer:
                 logger.debug(f"Previous buffer: {previousBuffer}")
                 pass
@@ -223,19 +183,30 @@ def sendTask(PortList, port, task, timeout=0):  # task Structure is [token, var=
     return lastMessage
 
 
+portWorkers = {}    # {SerialPort Object: PortWorker}
+portWorkersLock = threading.Lock()    # two threads sending to a new port must get the same worker
+
+
+def portWorker(port):
+    with portWorkersLock:
+        if port not in portWorkers:
+            portWorkers[port] = PortWorker(port, lambda port, task, timeout: sendTask(goodPorts, port, task, timeout))
+        return portWorkers[port]
+
+
 def sendTaskParallel(ports, task, timeout=0):
-    global returnValue
-    #    global sync
-    #    sync = 0
-    threads = list()
+    # returns {SerialPort Object: [response, allPrints] or -1}
+    futures = {}
     for p in ports:
-        t = threading.Thread(target=sendTask, args=(goodPorts, p, task, timeout))
-        threads.append(t)
-        t.start()
-    for t in threads:
-        if t.is_alive():
-            t.join()
-    return returnValue
+        futures[p] = portWorker(p).submit(task, timeout)
+    return {p: future.result() for p, future in futures.items()}
+
+
+def closePortWorker(port):
+    with portWorkersLock:
+        worker = portWorkers.pop(port, None)
+    if worker is not None:
+        worker.close()
 
 
 def splitTaskForLargeAngles(task):
@@ -245,12 +216,7 @@ def splitTaskForLargeAngles(task):
         var = task[1]
         indexedList = list()
         if token == 'L':
-            for i in range(4):
-                for j in range(4):
-                    angle = var[4 * j + i]
-                    if angle < -125 or angle > 125:
-                        indexedList += [4 * j + i, angle]
-                        var[4 * j + i] = max(min(angle, 125), -125)
+            var, indexedList = splitLargeAngles(var)
             if len(var):
                 queue.append(['L', var, task[-1]])
             if len(indexedList):
@@ -266,23 +232,26 @@ def splitTaskForLargeAngles(task):
     return queue
 
 
-def send(port, task, timeout=0):
+def send(port, task, timeout=0, perPort=False):
+    # returns what sendTask returned for the first port,
+    # or {SerialPort Object: [response, allPrints] or -1} for every port if perPort is True
 #    printH('*** @@@ open port ',port) #debug
     if isinstance(port, dict):
         p = list(port.keys())
     elif isinstance(port, list):
         p = port
+    if len(p) == 0:
+        # print('no ports')
+        if perPort:
+            return {}
+        return -1
     queue = splitTaskForLargeAngles(task)
     for task in queue:
         # printH("task",task)
-        if len(port) > 1:
-            returnResult = sendTaskParallel(p, task, timeout)
-        elif len(port) == 1:
-            returnResult = sendTask(goodPorts, p[0], task, timeout)
-        else:
-            # print('no ports')
-            return -1
-    return returnResult
+        results = sendTaskParallel(p, task, timeout)
+    if perPort:
+        return results
+    return results[p[0]]
 
 
 def keepReadingInput(ports):
@@ -302,10 +271,11 @@ def keepReadingInput(ports):
 
 
 def closeSerialBehavior(port):
+    closePortWorker(port)
     try:
-        port.Close_Engine()
+        port.close_engine()
     except Exception as e:
-        port.Close_Engine()
+        port.close_engine()
         raise e
     logger.info("close the serial port.")
 
@@ -470,57 +440,28 @@ model = 'Bittle'
 postureTable = postureDict[model]
 
 
+def postureAngles(name):
+    # the 16 angles of the posture the robot takes on 'k' + name: from the skill library, which reads them from the
+    # Instinct header of the firmware, or from postureTable
+    posture = library().skill(name, model)
+    if posture is not None and posture.kind == 'posture':
+        return posture.frameValues(0)
+    if name in postureTable:
+        return postureTable[name][-16:]
+    return None
+
+
 def schedulerToSkill(ports, testSchedule):
-    compactSkillData = []
-    newSkill = []
-    outputStr = ""
-
-    for task in testSchedule:  # execute the tasks in the testSchedule
-        print(task)
-        token = task[0][0]
-        if token == 'k' and task[0][1:] in postureTable:
-            currentRow = postureTable[task[0][1:]][-16:]
-            skillRow = copy.deepcopy(currentRow)
-            compactSkillData.append(skillRow + [8, int(task[1] * 1000 / 500), 0, 0])
-            newSkill = newSkill + skillRow + [8, int(task[1] * 1000 / 500), 0, 0]
-
-        elif token == 'i' or token == 'I':
-            currentRow = copy.deepcopy(skillRow)
-            for e in range(0, len(task[1]), 2):
-                #                    print(task[1][e],task[1][e+1])
-                currentRow[task[1][e]] = task[1][e + 1]
-            skillRow = copy.deepcopy(currentRow)
-            compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
-            newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
-        elif token == 'L':
-            skillRow = copy.deepcopy(task[1][:16])
-            compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
-            newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
-
-        elif token == 'm':
-            currentRow = copy.deepcopy(skillRow)
-            for e in range(0, len(task[1]), 2):
-                currentRow[task[1][e]] = task[1][e + 1]
-                skillRow = copy.deepcopy(currentRow)
-                compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
-                newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
-    if len(compactSkillData) > 0:
-        print('{')
-        print('{:>4},{:>4},{:>4},{:>4},'.format(*[-len(compactSkillData), 0, 0, 1]))
-        print('{:>4},{:>4},{:>4},'.format(*[0, 0, 0]))
-    else:
-        return
-    angleRatio = 1
-    for row in compactSkillData:
-        if min(row) < -125 or max(row) > 125:
-            angleRatio = 2
-        print(('{:>4},' * 20).format(*row))
-    print('};')
-    newSkill = list(map(lambda x: x // angleRatio, newSkill))
-    newSkill = [-len(compactSkillData), 0, 0, angleRatio, 0, 0, 0] + newSkill
-    print(newSkill)
+    # compile the motion tasks of testSchedule into one behavior, print it and send it. returns the Skill, or None
+    newSkill = compileSchedule(testSchedule, postureAngles)
+    if newSkill is None:
+        return None
+    print(newSkill.text())
+    print(newSkill.toList())
     #    sendTaskParallel(['K', newSkill, 1])
     send(ports, ['K', newSkill, 1])
+    return newSkill
+
 
 def getModelAndVersion(result):
     if result != -1:
@@ -552,29 +493,25 @@ def deleteDuplicatedUsbSerial(list):
             list.remove(item)
     return list
     
+def writeProbe(serialObject):
+    serialObject.send_data(encode('?\n'))
+
+
 def testPort(PortList, serialObject, p):
     global goodPortCount
     #    global sync
     try:
-        time.sleep(3)
-        waitTime = 0
-        result = serialObject.main_engine
+        serialObject.start_reader()    # buffer the boot messages while waiting
+        result = serialObject.serial_engine
         if result != None:
-            result = result.read_all().decode('ISO-8859-1')
-            if result != '':
-                print('Waiting for the robot to boot up')
-                time.sleep(2)
-                waitTime = 3
-            else:
-                waitTime = 2
-            result = sendTask(PortList, serialObject, ['?', 0], waitTime)
+            result = waitForRobot(serialObject, writeProbe)
             if result != -1:
                 logger.debug(f"Adding in testPort: {p}")
                 PortList.update({serialObject: p})
                 goodPortCount += 1
                 getModelAndVersion(result)
             else:
-                serialObject.Close_Engine()
+                serialObject.close_engine()
                 print('* Port ' + p + ' is not connected to a Petoi device!')
     #    sync +=1
     except Exception as e:
@@ -610,19 +547,19 @@ def keepCheckingPort(portList, cond1=None, check=True, updateFunc = lambda:None)
     # allPorts is a string list which delete the duplicated port(Reserve the name of the serial port that contains the usbmodem)
     # portStrList is the serial port string list
     global portStrList
-    allPorts = Communication.Print_Used_Com()
+    allPorts = Communication.used_ports()
     logger.debug(f"allPorts is {allPorts}")
     if cond1 is None:
         cond1 = lambda: len(portList) > 0
 
     while cond1():
         time.sleep(0.5)
-        currentPorts = Communication.Print_Used_Com()    # string list
+        currentPorts = Communication.used_ports()    # string list
         # logger.debug(f"currentPorts is {currentPorts}")
         
         if set(currentPorts) - set(allPorts):
             time.sleep(1) #usbmodem is slower in detection
-            currentPorts = Communication.Print_Used_Com()
+            currentPorts = Communication.used_ports()
             newPort = deleteDuplicatedUsbSerial(list(set(currentPorts) - set(allPorts)))
             if check:
                 time.sleep(0.5)
@@ -636,7 +573,7 @@ def keepCheckingPort(portList, cond1=None, check=True, updateFunc = lambda:None)
             updateFunc()
         elif set(allPorts) - set(currentPorts):
             time.sleep(1) #usbmodem is slower in detection
-            currentPorts = Communication.Print_Used_Com()
+            currentPorts = Communication.used_ports()
             closedPort = list(set(allPorts) - set(currentPorts))
             if check:
                 inv_dict = {v: k for k, v in portList.items()}
@@ -688,7 +625,7 @@ def showSerialPorts(allPorts):
 def connectPort(PortList, needTesting=True, needSendTask=True, needOpenPort=True):
     global initialized
     global goodPortCount
-    allPorts = Communication.Print_Used_Com()
+    allPorts = Communication.used_ports()
     showSerialPorts(allPorts)
 
     if len(allPorts) > 0:
@@ -741,7 +678,7 @@ def replug(PortList, needSendTask=True, needOpenPort=True):
         
         label.grid(row=1,column=0)
         label['text']="{} s".format(thres)
-        countdown(time.time(),copy.deepcopy(Communication.Print_Used_Com()))
+        countdown(time.time(),copy.deepcopy(Communication.used_ports()))
         
     labelC = tk.Label(window, font='sans 14 bold', justify='left')
     labelC['text'] = txt('Replug prompt')
@@ -753,11 +690,11 @@ def replug(PortList, needSendTask=True, needOpenPort=True):
     def countdown(start,ap):
         global goodPortCount
         global timePassed
-        curPorts = copy.deepcopy(Communication.Print_Used_Com())
+        curPorts = copy.deepcopy(Communication.used_ports())
 
         if len(curPorts) != len(ap):
             time.sleep(0.5)    # USB modem serial takes longer time to get ready
-            curPorts = copy.deepcopy(Communication.Print_Used_Com())
+            curPorts = copy.deepcopy(Communication.used_ports())
             print(ap)
             print('---')
             print(curPorts)
@@ -846,7 +783,7 @@ def selectList(PortList,ls,win, needSendTask=True, needOpenPort=True):
     win.destroy()
 
 def manualSelect(PortList, window, needSendTask=True, needOpenPort=True):
-    allPorts = deleteDuplicatedUsbSerial(Communication.Print_Used_Com())
+    allPorts = deleteDuplicatedUsbSerial(Communication.used_ports())
     window.title(txt('Manual mode'))
     l1 = tk.Label(window, font = 'sans 14 bold')
     l1['text'] = txt('Manual mode')
@@ -857,7 +794,7 @@ def manualSelect(PortList, window, needSendTask=True, needOpenPort=True):
     ls = tk.Listbox(window,selectmode="multiple")
     ls.grid(row=2,column=0)
     def refreshBox(ls):
-        allPorts = deleteDuplicatedUsbSerial(Communication.Print_Used_Com())
+        allPorts = deleteDuplicatedUsbSerial(Communication.used_ports())
         ls.delete(0,tk.END)
         for p in allPorts:
             ls.insert(tk.END,p)
@@ -0,0 +1,15 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Puts serialMaster on sys.path for the modules of BittyGPT, which share its Skill data model, skill library and
+# port worker. Import it before them:
+# import bootstrap
+# from skill import Skill
+# serialMaster is appended last, so BittyGPT's own modules (SerialCommunication, config) still come first.
+
+import os
+import sys
+
+serialMasterDir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'serialMaster')
+if serialMasterDir not in sys.path:
+    sys.path.append(serialMasterDir)
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 # -*- coding: UTF-8 -*-
 from commonVar import *
+from deviceCache import cachedOffsets
 
 language = languageList['English']
 
@@ -61,7 +62,8 @@ class Calibrator:
         global language
         language = lan
 #        global goodPorts
-        connectPort(goodPorts)
+        acquirePorts(goodPorts)
+        self.channel = CommandChannel(goodPorts)    # the offsets of the sliders, sent at most flushRate times a second
         start = time.time()
         while config.model_ == '':
             if time.time() - start > 5:
@@ -80,6 +82,7 @@ class Calibrator:
             self.model = config.model_
 
         self.winCalib = Tk()
+        self.dispatcher = UIDispatcher(self.winCalib)    # the button commands, sent off the mainloop
         self.winCalib.title(txt('calibTitle'))
         self.winCalib.geometry('+200+100')
         self.winCalib.resizable(False, False)
@@ -96,8 +99,8 @@ class Calibrator:
         standButton = Button(self.frameCalibButtons, text=txt('Stand Up'), fg = 'blue', width=self.calibButtonW, command=lambda cmd='balance': self.calibFun(cmd))
         restButton = Button(self.frameCalibButtons, text=txt('Rest'),fg = 'blue', width=self.calibButtonW, command=lambda cmd='d': self.calibFun(cmd))
         walkButton = Button(self.frameCalibButtons, text=txt('Walk'),fg = 'blue', width=self.calibButtonW, command=lambda cmd='walk': self.calibFun(cmd))
-        saveButton = Button(self.frameCalibButtons, text=txt('Save'),fg = 'blue', width=self.calibButtonW, command=lambda: send(goodPorts, ['s', 0]))
-        abortButton = Button(self.frameCalibButtons, text=txt('Abort'),fg = 'blue', width=self.calibButtonW, command=lambda: send(goodPorts, ['a', 0]))
+        saveButton = Button(self.frameCalibButtons, text=txt('Save'),fg = 'blue', width=self.calibButtonW, command=lambda: self.sendAfterSliders(['s', 0]))
+        abortButton = Button(self.frameCalibButtons, text=txt('Abort'),fg = 'blue', width=self.calibButtonW, command=lambda: self.sendAfterSliders(['a', 0]))
 #        quitButton = Button(self.frameCalibButtons, text=txt('Quit'),fg = 'blue', width=self.calibButtonW, command=self.closeCalib)
         calibButton.grid(row=6, column=0)
         restButton.grid(row=6, column=1)
@@ -208,6 +211,12 @@ class Calibrator:
             else:
                 label.grid(row=ROW, column=COL, columnspan=cSPAN, pady=2, sticky=ALIGN)
             sliderBar.grid(row=ROW + 1, column=COL, rowspan=rSPAN, columnspan=cSPAN, sticky=ALIGN)
+        if len(goodPorts):
+            offsets = cachedOffsets(list(goodPorts)[0].port)
+            if offsets is not None:    # shown while the robot reboots, until it answers 'c'
+                for i in range(16):
+                    self.calibSliders[i].set(offsets[i])
+                self.winCalib.update()
         time.sleep(3) # wait for the robot to reboot
         self.calibFun('c')
         self.winCalib.update()
@@ -218,73 +227,92 @@ class Calibrator:
 
     def calibFun(self, cmd):
 #        global ports
+        self.dispatcher.submit(self.channel.flush)
         imageW = self.parameterSet['imageW']
 
         self.imgPosture.destroy()
         if cmd == 'c' or cmd == 'c-2':
             self.imgPosture = createImage(self.frameCalibButtons, resourcePath + self.model + '_Ruler.jpeg', imageW)
             if cmd == 'c-2':
-                send(goodPorts, ['c', [-2], 0])
-                time.sleep(1)
-                result = send(goodPorts, ['c', 0])
-            else:
-                result = send(goodPorts, [cmd, 0])
-
-            if result != -1:
-                offsets = result[1]
-                # printH('re',result)
-                # printH('of',offsets)
-                idx = offsets.find(',')
-                l1 = offsets[:idx].split()[-1]
-                offsets = ''.join(offsets[idx + 1:].split()).split(',')[:15]
-                offsets.insert(0, l1)
-                print(offsets)
-                # print(len(offsets))
-            else:
-                offsets = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, ]
-
-            if cmd == 'c-2':
-                printH("offset2:", offsets[2])
-                if int(offsets[2]) > 25:
-                    tk.messagebox.showwarning(title=txt('Warning'), message=txt('AutoCali failed'))
-                else:
-                    self.calibSliders[2].set(offsets[2])
+                self.dispatcher.send(goodPorts, ['c', [-2], 0])
+                self.dispatcher.submit(time.sleep, 1)
+                self.dispatcher.send(goodPorts, ['c', 0], callback=lambda result: self.showOffsets(cmd, result))
             else:
-                for i in range(16):
-                    self.calibSliders[i].set(offsets[i])
+                self.dispatcher.send(goodPorts, [cmd, 0], callback=lambda result: self.showOffsets(cmd, result))
         elif cmd == 'd':
             self.imgPosture = createImage(self.frameCalibButtons, resourcePath + self.model + '_Rest.jpeg', imageW)
-            send(goodPorts, ['d', 0])
+            self.dispatcher.send(goodPorts, ['d', 0])
         elif cmd == 'balance':
             self.imgPosture = createImage(self.frameCalibButtons, resourcePath + self.model + '_Stand.jpeg', imageW)
-            send(goodPorts, ['kbalance', 0])
+            self.dispatcher.send(goodPorts, ['kbalance', 0])
         elif cmd == 'walk':
             self.imgPosture = createImage(self.frameCalibButtons, resourcePath + self.model + '_Walk.jpeg', imageW)
-            send(goodPorts, ['kwkF', 0])
+            self.dispatcher.send(goodPorts, ['kwkF', 0])
         self.imgPosture.grid(row=7, column=0, rowspan=3, columnspan=3)
         Hovertip(self.imgPosture, txt('tipImgPosture'))
         self.winCalib.update()
 
+    def showOffsets(self, cmd, result):
+        # the offsets printed by the robot after 'c' or 'c-2'
+        if not self.calibratorReady:    # the window is closed
+            return
+        if result != -1:
+            offsets = result[1]
+            # printH('re',result)
+            # printH('of',offsets)
+            idx = offsets.find(',')
+            l1 = offsets[:idx].split()[-1]
+            offsets = ''.join(offsets[idx + 1:].split()).split(',')[:15]
+            offsets.insert(0, l1)
+            print(offsets)
+            if cmd == 'c' and len(goodPorts):
+                try:
+                    rememberDevice(deviceKey(list(goodPorts)[0].port), offsets=list(map(int, offsets)))
+                except ValueError:
+                    pass
+            # print(len(offsets))
+        else:
+            offsets = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, ]
+
+        if cmd == 'c-2':
+            printH("offset2:", offsets[2])
+            if int(offsets[2]) > 25:
+                tk.messagebox.showwarning(title=txt('Warning'), message=txt('AutoCali failed'))
+            else:
+                self.calibSliders[2].set(offsets[2])
+        else:
+            for i in range(16):
+                self.calibSliders[i].set(offsets[i])
+
+    def sendAfterSliders(self, task):
+        self.dispatcher.submit(self.channel.flush)
+        self.dispatcher.send(goodPorts, task)
+
     def setCalib(self, idx, value):
         if self.calibratorReady:
             value = int(value)
-            send(goodPorts, ['c', [idx, value], 0])
+            self.channel.setParameter('c', idx, value)
 
     def closeCalib(self):
         confirm = messagebox.askyesnocancel(title=None, message=txt('Do you want to save the offsets?'),
                                             default=messagebox.YES)
         if confirm is not None:
 #            global ports
+            self.dispatcher.close(10)    # let the commands already given finish before 's' or 'a'
+            self.channel.close()
             if confirm:
                 send(goodPorts, ['s', 0])
+                if len(goodPorts):    # the offsets now stored on the board
+                    rememberDevice(deviceKey(list(goodPorts)[0].port),
+                                   offsets=[int(slider.get()) for slider in self.calibSliders])
             else:
                 send(goodPorts, ['a', 0])
             time.sleep(0.1)
             self.calibratorReady = False
             self.calibSliders.clear()
             self.winCalib.destroy()
-            closeAllSerial(goodPorts)
-            os._exit(0)
+            if releasePorts(goodPorts):
+                os._exit(0)
             
 if __name__ == '__main__':
     goodPorts = {}
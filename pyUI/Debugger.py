@@ -18,7 +18,7 @@ class Debugger:
         global language
         language = lan
 #        global goodPorts
-        connectPort(goodPorts)
+        acquirePorts(goodPorts)
         start = time.time()
         while config.model_ == '':
             if time.time() - start > 5:
@@ -28,6 +28,7 @@ class Debugger:
 
 
         self.winDebug = Tk()
+        self.dispatcher = UIDispatcher(self.winDebug)    # the commands, sent off the mainloop
         self.debuggerReady = False
 
         self.OSname = self.winDebug.call('tk', 'windowingsystem')
@@ -116,7 +117,7 @@ class Debugger:
     def resetVoice(self):
         if self.debuggerReady == 1:
             cmd = "XAc"
-            send(goodPorts, [cmd, 0])
+            self.dispatcher.send(goodPorts, [cmd, 0])
             self.showDialog()
 
     def showDialog(self):
@@ -160,20 +161,19 @@ class Debugger:
                 else:
                     cmdList = ["XAb", "XAa"]
 
-                for cmd in cmdList:
-                    send(goodPorts, [cmd, 0])
-                    if cmd == cmdList[0]:
-                        time.sleep(2)
-                    else:
-                        messagebox.showinfo(None, txt('Reset successfully'))
+                self.dispatcher.send(goodPorts, [cmdList[0], 0])
+                self.dispatcher.submit(time.sleep, 2)
+                self.dispatcher.send(goodPorts, [cmdList[1], 0],
+                                     callback=lambda result: messagebox.showinfo(None, txt('Reset successfully')))
 
 
     def on_closing(self):
         if messagebox.askokcancel(txt('Quit'), txt('Do you want to quit?')):
             self.debuggerReady = False
+            self.dispatcher.close()
             self.winDebug.destroy()
-            closeAllSerial(goodPorts)
-            os._exit(0)
+            if releasePorts(goodPorts):
+                os._exit(0)
 
 
 if __name__ == '__main__':
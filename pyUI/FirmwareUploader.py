@@ -1006,6 +1006,7 @@ class Uploader:
                     self.strMode.set(txt('Standard'))
                 self.currentSetting = [strProd, strDefaultPath, strSoftwareVersion, strBoardVersion, strMode]
                 logger.info(f"currentSetting: {self.currentSetting}.")
+                rememberDevice(deviceKey(port), boardVersion=strBoardVersion)    # '?' only tells NyBoard from BiBoard
             if self.lastSetting != self.currentSetting:
                 self.lastSetting = self.currentSetting
                 self.saveConfigToFile(defaultConfPath)
@@ -1110,6 +1111,7 @@ class Uploader:
             messagebox.showinfo(title=None, message=txt('msgFinish'))
             self.currentSetting = [strProd, strDefaultPath, strSoftwareVersion, strBoardVersion, strMode]
             logger.info(f"currentSetting: {self.currentSetting}.")
+            rememberDevice(deviceKey(port), boardVersion=strBoardVersion)
 
         # self.lastSetting = self.currentSetting
         # self.saveConfigToFile(defaultConfPath)
@@ -13,6 +13,9 @@ import threading
 from tkinter.filedialog import asksaveasfile, askopenfilename
 from tkinter.colorchooser import askcolor
 from commonVar import *
+from skillLibrary import library, parseSkillArrays
+from skillTransform import decimateSkill
+from kinematics import bodyPoseSolver
 import re
 from tkinter import ttk
 language = languageList['English']
@@ -143,7 +146,7 @@ class SkillComposer:
     def __init__(self,model, lan):
         global language
         language = lan
-        connectPort(goodPorts)
+        acquirePorts(goodPorts)
         start = time.time()
         while config.model_ == '':
             if time.time()-start > 5:
@@ -196,7 +199,9 @@ class SkillComposer:
         self.scaleNames = scaleNames[self.model]
 
         ports = goodPorts
+        self.channel = CommandChannel(ports)    # the slider targets, sent at most flushRate times a second
         self.window = Tk()
+        self.dispatcher = UIDispatcher(self.window)    # the other commands, sent off the mainloop
         self.sliders = list()
         self.values = list()
         self.dialValue = list()
@@ -294,12 +299,8 @@ class SkillComposer:
         t = threading.Thread(target=keepCheckingPort, args=(goodPorts,lambda:self.keepChecking,lambda:True,self.updatePortMenu,))
         t.daemon = True
         t.start()
-        time.sleep(2)
-        res = send(goodPorts, ['G', 0])
-        printH("gyro status:",res )
-        if res != -1 and res[0][0] == 'G':
-            res = send(goodPorts, ['G', 0])
-            printH("gyro status:",res )
+        self.dispatcher.submit(time.sleep, 2)
+        self.dispatcher.send(goodPorts, ['G', 0], callback=self.checkGyro)
         self.window.focus_force()    # force the main interface to get focus
         self.window.mainloop()
 
@@ -569,6 +570,8 @@ class SkillComposer:
         else:
             singlePort = inv_dict[self.port.get()]
             ports = [singlePort]
+        self.channel.flush()    # the targets set before go to the ports selected before
+        self.channel.ports = ports
 
     def createPosture(self):
         self.framePosture = Frame(self.window)
@@ -642,6 +645,14 @@ class SkillComposer:
 
         tip(self.GorB, txt('tipGorB'))
 
+        self.keyframeTolerance = IntVar(value=keyframeTolerance)    # degrees, as for send(). the export leaves out the frames the robot reproduces within it
+        labelTolerance = Label(self.frameSkillEditor, text=txt('Tolerance'))
+        labelTolerance.grid(row=3, column=0, columnspan=2, sticky='e', padx=pd)
+        spinTolerance = Spinbox(self.frameSkillEditor, from_=0, to=10, width=4, textvariable=self.keyframeTolerance)
+        spinTolerance.grid(row=3, column=2, sticky='w', padx=pd)
+
+        tip(spinTolerance, txt('tipTolerance'))
+
     def setMirror(self):
         self.mirror = not self.mirror
 
@@ -949,9 +960,9 @@ class SkillComposer:
         self.changeButtonState(f)
 
         if len(indexedList) > 10:
-            send(ports, ['L', self.frameData[4:20], 0.05])
+            self.channel.setPose(self.frameData[4:20])
         elif len(indexedList):
-            send(ports, ['I', indexedList, 0.05])
+            self.channel.setJoints(indexedList)
 
     def setFrame(self, currentRow):
         frame = self.frameList[currentRow]
@@ -1003,120 +1014,40 @@ class SkillComposer:
             print('Empty input!')
             top.after(1, lambda: top.focus_force())
             return
-        self.restartSkillEditor()
-        skillDataString = ''.join(skillDataString.split()).split('{')[1].split('}')[0].split(',')
-        if skillDataString[-1] == '':
-            skillDataString = skillDataString[:-1]
-        skillData = list(map(int, skillDataString))
-        print(skillData)
-
-        if skillData[0] < 0:
-            header = 7
-            frameSize = 20
-            loopFrom, loopTo, repeat = skillData[4:7]
-            self.vRepeat.set(repeat)
-            copyFrom = 4
-            self.gaitOrBehavior.set(txt('Behavior'))
-        else:
-            header = 4
-            if skillData[0] == 1:  # posture
-                frameSize = 16
-                copyFrom = 4
-            else:  # gait
-                if self.model == 'DoF16':
-                    frameSize = 12
-                    copyFrom = 8
-                else:
-                    frameSize = 8
-                    copyFrom = 12
-            self.gaitOrBehavior.set(txt('Gait'))
-        if (len(skillData) - header) % abs(skillData[0]) != 0 or frameSize != (len(skillData) - header) // abs(
-                skillData[0]):
+        try:
+            skill = Skill.parse(skillDataString)
+        except ValueError as e:
             messagebox.showwarning(title='Warning', message='Wrong format!')
-            print('Wrong format!')
+            print('Wrong format!', e)
             top.after(1, lambda: top.focus_force())
             return
         top.destroy()
-
-        for f in range(abs(skillData[0])):
-            if f != 0:
-                self.addFrame(f)
-            frame = self.frameList[f]
-            frame[2][copyFrom:copyFrom + frameSize] = copy.deepcopy(
-                skillData[header + frameSize * f:header + frameSize * (f + 1)])
-            if skillData[3] > 1:
-                frame[2][4:20] = list(map(lambda x: x * 2, frame[2][4:20]))
-                print(frame[2][4:24])
-
-            if skillData[0] < 0:
-                if f == loopFrom or f == loopTo:
-                    self.getWidget(f, cLoop).select()
-                    frame[2][3] = 1
-                else:
-                    frame[2][3] = 0
-                #                    print(self.getWidget(f, cLoop).get())
-                self.getWidget(f, cStep).delete(0, END)
-                if frame[2][20] == 0:
-                    self.getWidget(f, cStep).insert(0, txt('max'))
-                else:
-                    self.getWidget(f, cStep).insert(0, frame[2][20])
-                self.getWidget(f, cDelay).delete(0, END)
-                self.getWidget(f, cDelay).insert(0, frame[2][21] * 50)
-
-                self.getWidget(f, cTrig).delete(0, END)
-                self.getWidget(f, cAngle).delete(0, END)
-                self.getWidget(f, cTrig).insert(0, triggerAxis[frame[2][22]])
-                self.getWidget(f, cAngle).insert(0, frame[2][23])
-
-            else:
-                self.getWidget(f, cStep).delete(0, END)
-                self.getWidget(f, cStep).insert(0, txt('max'))
-            self.activeFrame = f
-        if self.totalFrame == 1:
-            self.activeFrame = -1
-        self.setFrame(0)
+        self.loadSkill(skill)
 
     def loadSkill(self,skillData):
         print(skillData)
+        try:
+            skill = skillData if isinstance(skillData, Skill) else Skill(skillData)
+        except ValueError as e:
+            messagebox.showwarning(title='Warning', message='Wrong format!')
+            print('Wrong format!', e)
+            return
         self.restartSkillEditor()
-        if skillData[0] < 0:
-            header = 7
-            frameSize = 20
-            loopFrom, loopTo, repeat = skillData[4:7]
+        if skill.kind == 'behavior':
+            loopFrom, loopTo, repeat = skill.loop
             self.vRepeat.set(repeat)
-            copyFrom = 4
             self.gaitOrBehavior.set(txt('Behavior'))
         else:
-            header = 4
-            if skillData[0] == 1:  # posture
-                frameSize = 16
-                copyFrom = 4
-            else:  # gait
-                if self.model == 'DoF16':
-                    frameSize = 12
-                    copyFrom = 8
-                else:
-                    frameSize = 8
-                    copyFrom = 12
             self.gaitOrBehavior.set(txt('Gait'))
-        if (len(skillData) - header) % abs(skillData[0]) != 0 or frameSize != (len(skillData) - header) // abs(
-                skillData[0]):
-            messagebox.showwarning(title='Warning', message='Wrong format!')
-            print('Wrong format!')
-            
-            return
-        
-        for f in range(abs(skillData[0])):
+        copyFrom = 4 + skill.firstJoint    # the columns of the frame in the editor are all the 16 joints
+
+        for f in range(skill.frameCount):
             if f != 0:
                 self.addFrame(f)
             frame = self.frameList[f]
-            frame[2][copyFrom:copyFrom + frameSize] = copy.deepcopy(
-                skillData[header + frameSize * f:header + frameSize * (f + 1)])
-            if skillData[3] > 1:
-                frame[2][4:20] = list(map(lambda x: x * 2, frame[2][4:20]))
-                print(frame[2][4:24])
+            frame[2][copyFrom:copyFrom + skill.frameSize] = skill.frameValues(f)
 
-            if skillData[0] < 0:
+            if skill.kind == 'behavior':
                 if f == loopFrom or f == loopTo:
                     self.getWidget(f, cLoop).select()
                     frame[2][3] = 1
@@ -1151,70 +1082,83 @@ class SkillComposer:
             print('Empty input!')
             top.after(1, lambda: top.focus_force())
             return
-        self.restartSkillEditor()
-        skillNames = re.findall(r"int8_t\ .*\[\]",skillDataString)
-        skillNames = [st[7:-2] for st in skillNames]
-        skills = re.findall(r"\{[-\s\d\W,]+\}",skillDataString)
-        def processing(st):
-            lst = st[1:-1].split(',')
-            if lst[-1] == '' or lst[-1].isspace():
-                lst = lst[:-1]
-            lst = list(map(int, [l.strip() for l in lst]))
-            return lst
-        self.skills = list(map(processing, skills))
-        if len(self.skills) ==1:
-            top.destroy()
-            self.loadSkill(self.skills[0])
+        namedSkills = []
+        for n, [name, values] in enumerate(parseSkillArrays(skillDataString)):
+            try:
+                namedSkills.append([name or 'skill' + str(n + 1), Skill(values)])
+            except ValueError as e:
+                print('Wrong format!', name, e)
+        if len(namedSkills) == 0:
+            messagebox.showwarning(title='Warning', message='Wrong format!')
+            top.after(1, lambda: top.focus_force())
+            return
+        top.destroy()
+        if len(namedSkills) == 1:
+            self.loadSkill(namedSkills[0][1])
         else:
-            assert len(skillNames) == len(self.skills)
-            self.skillDic = dict(zip(skillNames,range(len(skillNames))))
-            self.skillN = ([],[],[])
-            for (n,s) in zip(skillNames,range(len(skillNames))):
-                if self.skills[s][0] < 0:
-                    self.skillN[2].append(n)
-                elif self.skills[s][0] > 1:
-                    self.skillN[1].append(n)
-                else:
-                    self.skillN[0].append(n)
-            print(self.skillN)
-            top.destroy()
-            self.comboTop = Toplevel(self.window)
-            self.comboTop.title(txt("Skill List"))
-            typeLabel = Label(self.comboTop,text = txt("Type of skill"))
-            typeLabel.grid(row=1,column=0)
-            nameLabel = Label(self.comboTop,text = txt("Name of skill"))
-            nameLabel.grid(row=1,column=1)
-            values = []
-            if len(self.skillN[0]):
-                values.append(txt("Posture"))
-            if len(self.skillN[1]):
-                values.append(txt("Gait"))
-            if len(self.skillN[2]):
-                values.append(txt("Behavior"))
-            self.typeComb = ttk.Combobox(self.comboTop,values=values,state='readonly')
-            self.typeComb.grid(row=2, column=0)
-            self.nameComb = ttk.Combobox(self.comboTop,values=[])
-            self.nameComb.grid(row=2, column=1)
-            def selectTy(event):
-                V = self.typeComb.get()
-                self.nameComb.set('')
-                if V==txt("Posture"):
-                    self.nameComb['values'] = self.skillN[0]
-                elif V==txt("Gait"):
-                    self.nameComb['values'] = self.skillN[1]
-                else:
-                    self.nameComb['values'] = self.skillN[2]
-            def select():
-                v = self.nameComb.get()
-                print(v)
-                if v=='':
-                    print("No option selected")
-                    return
-                self.loadSkill(self.skills[self.skillDic[v]])
-            
-            self.typeComb.bind('<<ComboboxSelected>>',selectTy)
-            Button(self.comboTop, text=txt('Cancel'), width=10, command=lambda: self.closePop(self.comboTop)).grid(row=3, column=1)
-            Button(self.comboTop, text=txt('OK'), width=10, command=select).grid(row=3, column=0)
+            self.chooseSkill(namedSkills)
+
+    def loadLibrary(self, top):
+        # the skills of this model in the SkillLibrary folders, the Instinct headers and the example scripts
+        entries = library().entries(model=self.model)
+        if len(entries) == 0:
+            messagebox.showwarning(title='Warning', message='No skill for ' + self.model)
+            top.after(1, lambda: top.focus_force())
+            return
+        top.destroy()
+        self.chooseSkill([[entry.name, entry] for entry in entries])
+
+    def chooseSkill(self, namedSkills):
+        # namedSkills: [[name, Skill or LibrarySkill]]. the library entries are read when chosen
+        self.skillDic = dict(namedSkills)
+        self.skillN = ([],[],[])
+        for name, skill in namedSkills:
+            if skill.kind == 'behavior':
+                self.skillN[2].append(name)
+            elif skill.kind == 'gait':
+                self.skillN[1].append(name)
+            else:
+                self.skillN[0].append(name)
+        print(self.skillN)
+        self.comboTop = Toplevel(self.window)
+        self.comboTop.title(txt("Skill List"))
+        typeLabel = Label(self.comboTop,text = txt("Type of skill"))
+        typeLabel.grid(row=1,column=0)
+        nameLabel = Label(self.comboTop,text = txt("Name of skill"))
+        nameLabel.grid(row=1,column=1)
+        values = []
+        if len(self.skillN[0]):
+            values.append(txt("Posture"))
+        if len(self.skillN[1]):
+            values.append(txt("Gait"))
+        if len(self.skillN[2]):
+            values.append(txt("Behavior"))
+        self.typeComb = ttk.Combobox(self.comboTop,values=values,state='readonly')
+        self.typeComb.grid(row=2, column=0)
+        self.nameComb = ttk.Combobox(self.comboTop,values=[])
+        self.nameComb.grid(row=2, column=1)
+        def selectTy(event):
+            V = self.typeComb.get()
+            self.nameComb.set('')
+            if V==txt("Posture"):
+                self.nameComb['values'] = self.skillN[0]
+            elif V==txt("Gait"):
+                self.nameComb['values'] = self.skillN[1]
+            else:
+                self.nameComb['values'] = self.skillN[2]
+        def select():
+            v = self.nameComb.get()
+            print(v)
+            if v not in self.skillDic:
+                print("No option selected")
+                return
+            skill = self.skillDic[v]
+            self.loadSkill(skill if isinstance(skill, Skill) else skill.skill)
+
+        self.typeComb.bind('<<ComboboxSelected>>',selectTy)
+        Button(self.comboTop, text=txt('Cancel'), width=10, command=lambda: self.closePop(self.comboTop)).grid(row=3, column=1)
+        Button(self.comboTop, text=txt('OK'), width=10, command=select).grid(row=3, column=0)
+
     def popImport(self):
         # Create a Toplevel window
         top = Toplevel(self.window)
@@ -1241,6 +1185,7 @@ class SkillComposer:
         Button(top, text=txt('Cancel'), width=10, command=lambda: self.closePop(top)).grid(row=0, column=2)
 #        Button(top, text=txt('OK'), width=10, command=lambda: self.loadSkillDataText(top)).grid(row=0, column=3)
         Button(top, text=txt('OK'), width=10, command=lambda: self.loadSkillDataTextMul(top)).grid(row=0, column=3)
+        Button(top, text=txt('Library'), width=10, command=lambda: self.loadLibrary(top)).grid(row=2, column=0)
         scrollY = Scrollbar(entryFrame, width=20, orient=VERTICAL)
         scrollY.grid(row=0, column=1, sticky='ns')
         scrollY.config(command=self.skillText.yview)
@@ -1271,13 +1216,13 @@ class SkillComposer:
                     self.canvasFace.itemconfig(self.eyes[c], fill=self.colorHex)
                     self.eyeColors[c+1] = colors
                     self.eyeBtn[c].config(text = str(colors))
-                send(ports, ['C', colors+[0,3], 0])
+                self.dispatcher.send(ports, ['C', colors+[0,3], 0])
             else:
                 self.activeEye = i
                 self.canvasFace.itemconfig(self.eyes[i], fill=self.colorHex)
                 self.eyeColors[i+1] = colors
                 self.eyeBtn[i].config(text = str(colors))
-                send(ports, ['C', colors+[i+1,3], 0])
+                self.dispatcher.send(ports, ['C', colors+[i+1,3], 0])
 
     def changeEffect(self,e):
         if self.colorBinderValue.get():
@@ -1288,11 +1233,11 @@ class SkillComposer:
                 self.canvasFace.itemconfig(self.eyes[c], fill=self.colorHex)
                 self.eyeColors[c+1] = colors
                 self.eyeBtn[c].config(text = str(colors))
-            send(ports, ['C', colors+[0, e], 0])
+            self.dispatcher.send(ports, ['C', colors+[0, e], 0])
         else:
             colors = self.eyeColors[self.activeEye+1]
             self.eyeBtn[self.activeEye].config(text = str(colors))
-            send(ports, ['C', colors+[self.activeEye+1, e], 0])
+            self.dispatcher.send(ports, ['C', colors+[self.activeEye+1, e], 0])
         
     def popEyeColor(self):
         #E_RGB_ALL = 0
@@ -1346,7 +1291,7 @@ class SkillComposer:
             wValue = 3
         for e in range(len(effectDictionary)):
             Button(btnsEff,text=txt(list(effectDictionary.keys())[e]),width = wValue,command = lambda eff=list(effectDictionary.values())[e]:self.changeEffect(eff)).grid(row = 0,column = e)
-        Button(btnsEff,text=txt('Meow'),width = wValue,command = lambda :send(ports, ['u', 0])).grid(row = 0,column = 3)
+        Button(btnsEff,text=txt('Meow'),width = wValue,command = lambda :self.dispatcher.send(ports, ['u', 0])).grid(row = 0,column = 3)
         self.topEye.focus_force()  # the eye color edit window gets focus
         self.topEye.mainloop()
 
@@ -1392,7 +1337,7 @@ class SkillComposer:
         self.updateSliders(self.frameData)
         self.indicateEdit()
         self.frameController.update()
-        send(ports, ['L', self.frameData[4:20], 0.05])
+        self.channel.setPose(self.frameData[4:20])
         
     def popCreator(self):
         self.creatorWin = Toplevel(self.window)
@@ -1545,14 +1490,11 @@ class SkillComposer:
             period = 1
             copyFrom = 4
             frameSize = 16
-        angleRatio = 1
         startFrame = self.activeFrame
         inv_triggerAxis = {txt(v): k for k, v in triggerAxis.items()}
         for f in range(0, self.totalFrame):
             frame = self.frameList[f]
             self.frameData = copy.deepcopy(frame[2])
-            if max(self.frameData[4:20]) > 125 or min(self.frameData[4:20]) < -125:
-                angleRatio = 2
             if self.frameData[3] == 1:
                 loopStructure.append(f - startFrame)
             if self.getWidget(f, cStep).get() == txt('max') or int(self.getWidget(f, cStep).get())>127:
@@ -1571,14 +1513,14 @@ class SkillComposer:
         print(skillData)
         if period == 1:
             print(self.frameData[4:20])
-            send(ports, ['L', self.frameData[4:20], 0.05])
+            self.channel.setPose(self.frameData[4:20])
             return
-        if angleRatio == 2:
-            for r in skillData:
-                if frameSize == 8 or frameSize == 12:
-                    r = list(map(lambda x: x // angleRatio, r))
-                elif frameSize == 20:
-                    r[:16] = list(map(lambda x: x // angleRatio, r[:16]))
+        # the same halving as Skill and rescaleSkill(): only the angle columns, and only if one is beyond 125
+        flatData = [value for row in skillData for value in row]
+        angleRatio = 1
+        if halveLargeAngles(flatData, 0, frameSize):
+            angleRatio = 2
+            skillData = [flatData[r * frameSize:(r + 1) * frameSize] for r in range(len(skillData))]
         if len(loopStructure) < 2:
             loopStructure = [0,0]
         if len(loopStructure) > 2:
@@ -1588,6 +1530,19 @@ class SkillComposer:
                 frame[2][3] = 0
                 self.getWidget(f, cLoop).deselect()
             self.frameRowScheduler.update()
+        try:
+            tolerance = self.keyframeTolerance.get()
+        except TclError:
+            tolerance = 0
+        if period < 0 and tolerance > 0:
+            skill = Skill([period, 0, 0, angleRatio, loopStructure[0], loopStructure[-1], int(self.loopRepeat.get())]
+                          + [value for row in skillData for value in row])
+            decimated = decimateSkill(skill, tolerance)
+            if decimated.frameCount < skill.frameCount:
+                print(f'{skill.frameCount} frames -> {decimated.frameCount} within {tolerance} degrees')
+                period = decimated.period
+                loopStructure = decimated.loop[:2]
+                skillData = decimated.frames().tolist()
 
         print('{')
         print('{:>4},{:>4},{:>4},{:>4},'.format(*[period, 0, 0, angleRatio]))
@@ -1644,9 +1599,9 @@ class SkillComposer:
         flat_list = [item for sublist in skillData for item in sublist]
         print(flat_list)
 
-        send(ports, ['i', 0.1])
-        res = send(ports, ['K', flat_list, 0], 0)
-        print(res)
+        self.dispatcher.submit(self.channel.flush)
+        self.dispatcher.send(ports, ['i', 0.1])
+        self.dispatcher.send(ports, ['K', flat_list, 0], 0, callback=print)
 
     def restartSkillEditor(self):
         for f in self.frameList:
@@ -1712,10 +1667,7 @@ class SkillComposer:
             value = int(value)
             if self.binderValue[idx].get() == 0:
                 self.frameData[4 + idx] = value
-                if -126 < value < 126:
-                    send(ports, ['I', [idx, value], 0.05])
-                else:
-                    send(ports, ['i', [idx, value], 0.05])
+                self.channel.setJoint(idx, value)
             else:
                 diff = value - self.frameData[4 + idx]
                 indexedList = list()
@@ -1725,20 +1677,33 @@ class SkillComposer:
                         indexedList += [i, self.frameData[4 + i]]
                         
                 if len(indexedList) > 10:
-                    send(ports, ['L', self.frameData[4:20], 0.05])
+                    self.channel.setPose(self.frameData[4:20])
                 elif len(indexedList):
-                    send(ports, ['I', indexedList, 0.05])
+                    self.channel.setJoints(indexedList)
 
             self.indicateEdit()
             self.updateSliders(self.frameData)
 
-    def set6Axis(self, i, value):  # a more precise function should be based on inverse kinematics
+    def set6Axis(self, i, value):
         value = int(value)
         if self.ready == 1:
             #            send(ports, ['t', [i, value], 0.0])
             if self.originalAngle[0] == 0:
                 self.originalAngle[4:20] = copy.deepcopy(self.frameData[4:20])
                 self.originalAngle[0] = 1
+            solver = bodyPoseSolver(self.model)
+            if solver is not None:
+                # the legs solved for all six dials, the range of the dragged one at once
+                pose = [int(self.values[16 + a].get()) for a in range(6)]
+                pose[i] = value
+                dial = self.sliders[16 + i]
+                self.frameData[12:20] = solver.angles(self.originalAngle[4:20], pose, i,
+                                                      range(int(dial.cget('from')), int(dial.cget('to')) + 1))
+                self.channel.setPose(self.frameData[4:20])
+                self.updateSliders(self.frameData)
+                self.indicateEdit()
+                return
+            # the former multipliers, for the models without a leg model or without NumPy
             positiveGroup = []
             negativeGroup = []
             if 'Bittle' in self.model:
@@ -1813,7 +1778,7 @@ class SkillComposer:
                 if j in negativeGroup:
                     self.frameData[4 + j] = self.originalAngle[4 + j] - int(value * factor)
 
-            send(ports, ['L', self.frameData[4:20], 0.05])
+            self.channel.setPose(self.frameData[4:20])
             self.updateSliders(self.frameData)
             self.indicateEdit()
 
@@ -1823,17 +1788,18 @@ class SkillComposer:
             serialCmd = self.newCmd.get()
             logger.debug(f'serialCmd={serialCmd}')
             if serialCmd != '':
+                self.dispatcher.submit(self.channel.flush)
                 try:
                     token = serialCmd[0]
                     if token == 'S': #send everything as a string
-                        send(ports, [serialCmd[1:], 1])
+                        self.dispatcher.send(ports, [serialCmd[1:], 1])
                     else:
                         cmdList = serialCmd[1:].replace(',',' ').split()
                         if len(cmdList) <= 1:
-                            send(ports, [serialCmd, 1])
+                            self.dispatcher.send(ports, [serialCmd, 1])
                         else:
                             cmdList = list(map(lambda x:int(x),cmdList))
-                            send(ports, [token, cmdList, 1])
+                            self.dispatcher.send(ports, [token, cmdList, 1])
                         self.newCmd.set('')
                 except Exception as e:
                     logger.info("Exception")
@@ -1850,8 +1816,9 @@ class SkillComposer:
             self.indicateEdit()
             for i in range(6):
                 self.values[16 + i].set(0)
-            send(ports,['i',0])
-            send(ports, ['k' + pose, 0])
+            self.dispatcher.submit(self.channel.flush)
+            self.dispatcher.send(ports,['i',0])
+            self.dispatcher.send(ports, ['k' + pose, 0])
 #            if pose == 'rest':
 #                send(ports, ['d', 0])
 
@@ -1907,7 +1874,7 @@ class SkillComposer:
                 else:
                     self.dialValue[0].set(True)
                     self.frameDial.winfo_children()[1].update()
-                    goodPorts = {}
+                    goodPorts.clear()    # the dictionary is shared with the other tools
                     connectPort(goodPorts)
                     
                     printH('***@@@ good ports', goodPorts)
@@ -1928,41 +1895,51 @@ class SkillComposer:
                 # self.frameDial.winfo_children()[1].update()
                 self.updatePortMenu()
             elif len(goodPorts) > 0:
-                result = send(ports, [dialTable[key], 0])
-                if result != -1:
-                    state = result[0].replace('\r', '').replace('\n', '')
-                    if state == 'k':
-                        self.dialValue[i].set(True)
-                        self.frameDial.winfo_children()[2].config(fg='green')
-                        self.frameDial.winfo_children()[2].select()
-                    elif state == 'P':
-                        self.dialValue[i].set(False)
-                        self.frameDial.winfo_children()[2].config(fg='red')
-                        self.frameDial.winfo_children()[2].deselect()
-                    elif state == 'g':
-                        self.dialValue[i].set(False)
-                        self.frameDial.winfo_children()[3].config(fg='red')
-                        self.frameDial.winfo_children()[3].deselect()
-                    elif state == 'G':
-                        self.dialValue[i].set(True)
-                        self.frameDial.winfo_children()[3].config(fg='green')
-                        self.frameDial.winfo_children()[3].select()
-                    elif state == 'z':
-                        self.dialValue[i].set(False)
-                        self.frameDial.winfo_children()[4].config(fg='red')
-                        self.frameDial.winfo_children()[4].deselect()
-                    elif state == 'Z':
-                        self.dialValue[i].set(True)
-                        self.frameDial.winfo_children()[4].config(fg='green')
-                        self.frameDial.winfo_children()[4].select()
+                self.dispatcher.send(ports, [dialTable[key], 0], callback=lambda result, i=i: self.showDialState(i, result))
+
+    def checkGyro(self, res):
+        printH("gyro status:",res )
+        if res != -1 and res[0][0] == 'G':
+            self.dispatcher.send(goodPorts, ['G', 0], callback=lambda res: printH("gyro status:",res ))
+
+    def showDialState(self, i, result):
+        # the state echoed by the robot after a dial button
+        if result != -1:
+            state = result[0].replace('\r', '').replace('\n', '')
+            if state == 'k':
+                self.dialValue[i].set(True)
+                self.frameDial.winfo_children()[2].config(fg='green')
+                self.frameDial.winfo_children()[2].select()
+            elif state == 'P':
+                self.dialValue[i].set(False)
+                self.frameDial.winfo_children()[2].config(fg='red')
+                self.frameDial.winfo_children()[2].deselect()
+            elif state == 'g':
+                self.dialValue[i].set(False)
+                self.frameDial.winfo_children()[3].config(fg='red')
+                self.frameDial.winfo_children()[3].deselect()
+            elif state == 'G':
+                self.dialValue[i].set(True)
+                self.frameDial.winfo_children()[3].config(fg='green')
+                self.frameDial.winfo_children()[3].select()
+            elif state == 'z':
+                self.dialValue[i].set(False)
+                self.frameDial.winfo_children()[4].config(fg='red')
+                self.frameDial.winfo_children()[4].deselect()
+            elif state == 'Z':
+                self.dialValue[i].set(True)
+                self.frameDial.winfo_children()[4].config(fg='green')
+                self.frameDial.winfo_children()[4].select()
 
     def on_closing(self):
         if messagebox.askokcancel(txt('Quit'), txt('Do you want to quit?')):
             self.saveConfigToFile(defaultConfPath)
             self.keepChecking = False  # close the background thread for checking serial port
+            self.dispatcher.close()
+            self.channel.close()
             self.window.destroy()
-            closeAllSerial(goodPorts)
-            os._exit(0)
+            if releasePorts(goodPorts):
+                os._exit(0)
            
 if __name__ == '__main__':
     goodPorts = {}
@@ -13,13 +13,15 @@ class Tuner:
     def __init__(self,model,lan):
         self.calibratorReady = False
         # global ports
-        connectPort(goodPorts)
+        acquirePorts(goodPorts)
+        self.channel = CommandChannel(goodPorts)    # the values of the sliders, sent at most flushRate times a second
         # ports = goodPorts
         self.model = config.model_
         logger.info(f"The model is: {self.model}")
         global language
         language = lan
         self.winTuner = Tk()
+        self.dispatcher = UIDispatcher(self.winTuner)    # the commands, sent off the mainloop
         self.winTuner.title('Petoi R&D Tuner')
         self.winTuner.geometry('+200+30')
         self.winTuner.resizable(False, False)
@@ -85,7 +87,7 @@ class Tuner:
         buttonC = tk.Button(self.winTuner, text=txt('Confirm'), command=self.showPara)
         buttonC.grid(row=i+1, columnspan=2, padx=10, pady=10, sticky=W + E)
 
-        send(goodPorts, ['ksit', 0])
+        self.dispatcher.send(goodPorts, ['ksit', 0])
         self.winTuner.update()
         self.winTuner.protocol('WM_DELETE_WINDOW', self.closeTuner)
         self.winTuner.mainloop()
@@ -104,17 +106,19 @@ class Tuner:
     def setTuner(self, idx, value):
         if self.calibratorReady:
             value = int(value)
-            self.result = send(goodPorts, ['}', [idx, value], 0])
-            logger.debug(f"The result list is: {self.result}")
+            self.channel.setParameter('}', idx, value)
 
     def closeTuner(self):
         confirm = messagebox.askyesnocancel(title=None, message='Quit?',
                                             default=messagebox.YES)
         if confirm is not None:
+            self.dispatcher.close()
+            self.channel.close()
             time.sleep(0.1)
             self.calibratorReady = False
             self.calibSliders.clear()
             self.winTuner.destroy()
+            releasePorts(goodPorts)
             
 if __name__ == '__main__':
     goodPorts = {}
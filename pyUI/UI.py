@@ -63,6 +63,7 @@ class UI:
 
         self.window = Tk()
         self.ready = False
+        self.app = None    # the tool chosen, started by runTool() once this window is gone
 
         self.OSname = self.window.call('tk', 'windowingsystem')
         if self.OSname == 'win32':
@@ -155,19 +156,27 @@ class UI:
         f.close()
 
     def utility(self, app):
-        global language
-
         self.saveConfigToFile(defaultConfPath)
         logger.info(f"{self.configuration}")
-        self.window.destroy()
+        self.app = app
+        self.window.destroy()    # ends the mainloop of the launcher. the loop at the bottom starts the tool
+
+    def runTool(self):
+        global language
+        app = self.app
 
+        # the tools share the ports opened by the first one. closing a tool brings back the launcher
+        keepPortsOpen()
         if app == 'Firmware Uploader':
+            closePorts(goodPorts)    # the uploader needs the port for itself
             Uploader(self.configName, language)
         elif app == 'Joint Calibrator':
-            self.showBootPrompt("cali")
+            if not portsOpen(goodPorts):
+                self.showBootPrompt("cali")
             Calibrator(self.configName, language)
         elif app == 'Skill Composer':
-            self.showBootPrompt("skil")
+            if not portsOpen(goodPorts):
+                self.showBootPrompt("skil")
             SkillComposer(self.configName, language)
         elif app == 'Debugger':
             Debugger(self.configName, language)
@@ -203,7 +212,12 @@ class UI:
             self.saveConfigToFile(defaultConfPath)
             logger.info(f"{self.configuration}")
             self.window.destroy()
+            closePorts(goodPorts)
 
 
 if __name__ == '__main__':
-    UI()
+    while True:    # one launcher and one tool at a time, so no mainloop runs inside another
+        ui = UI()
+        if ui.app is None:    # the launcher was closed
+            break
+        ui.runTool()
@@ -16,6 +16,9 @@ else:
 sys.path.append(resourcePath)
 
 from ardSerial import *
+from portRegistry import *
+from commandChannel import CommandChannel, flushRate
+from uiDispatcher import UIDispatcher
 from tkinter import *
 from tkinter import messagebox
 from PIL import ImageTk, Image
@@ -113,14 +116,9 @@ def makeDirectory(path):
 
 if platform.system() == "Windows":    # for Windows
     separation = '\\'
-    homeDri = os.getenv('HOMEDRIVE') 
-    homePath = os.getenv('HomePath') 
-    configDir = homeDri + homePath
 else:  # for Linux & macOS
     separation = '/'
-    home = os.getenv('HOME') 
-    configDir = home 
-configDir = configDir + separation +'.config' + separation +'Petoi'
+from deviceCache import configDir    # ~/.config/Petoi, shared with the device cache and the skill index of serialMaster
 makeDirectory(configDir)
 defaultConfPath = configDir + separation + 'defaultConfig.txt'
 print(defaultConfPath)
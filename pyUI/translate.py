@@ -97,6 +97,9 @@ textEN = {
     'Undo':'Undo',
     'Redo':'Redo',
     'Open File':'Open File',
+    'Library':'Library',
+    'Tolerance':'Tolerance',
+    'tipTolerance':'The export leaves out the frames of a behavior\nthat the robot reproduces within these degrees.\n0 exports every frame',
     'Cancel':'Cancel',
     'OK':'OK',
     'Refresh':'Refresh',
@@ -385,6 +388,9 @@ textCN = {
     'Undo':'撤消',
     'Redo':'重复',
     'Open File':'打开文件',
+    'Library':'技能库',
+    'Tolerance':'容差',
+    'tipTolerance':'导出时省略机器人能在此角度内重现的行为帧。\n0 导出所有帧',
     'Cancel':'取消',
     'OK':'确认',
     'Multiple':'载入多个',
@@ -662,6 +668,9 @@ textCN_TW = {
     'Undo':'撤消',
     'Redo':'重複',
     'Open File':'打開文件',
+    'Library':'技能庫',
+    'Tolerance':'容差',
+    'tipTolerance':'導出時省略機器人能在此角度內重現的行為幀。\n0 導出所有幀',
     'Cancel':'取消',
     'OK':'確認',
     'Multiple':'載入多個',
@@ -940,6 +949,9 @@ textDE = {
     'Undo':'Rückgängig',
     'Redo':'Wiederholen',
     'Open File':'Datei öffnen',
+    'Library':'Bibliothek',
+    'Tolerance':'Toleranz',
+    'tipTolerance':'Der Export lässt die Frames eines Verhaltens weg,\ndie der Roboter innerhalb dieser Grad nachbildet.\n0 exportiert alle Frames',
     'Cancel':'Abbrechen',
     'OK':'OK',
     'Refresh':'Aktualisieren',
@@ -1223,6 +1235,9 @@ textTH = {
     'Undo':'ยกเลิก',
     'Redo':'ทำซ้ำ',
     'Open File':'เปิดไฟล์',
+    'Library':'คลังสกิล',
+    'Tolerance':'ค่าความคลาดเคลื่อน',
+    'tipTolerance':'การส่งออกจะข้ามเฟรมของท่าทางที่หุ่นยนต์ทำซ้ำได้\nภายในองศานี้\n0 ส่งออกทุกเฟรม',
     'Cancel':'ยกเลิก',
     'OK':'ตกลง',
     'Refresh':'รีเฟรช',
@@ -1505,6 +1520,9 @@ textFR={
     'Undo':'Annuler',
     'Redo':'Rétablir',
     'Open File':'Ouvrir un fichier',
+    'Library':'Bibliothèque',
+    'Tolerance':'Tolérance',
+    'tipTolerance':'L\'export omet les images d\'un comportement\nque le robot reproduit à ces degrés près.\n0 exporte toutes les images',
     'Cancel':'Annuler',
     'OK':'OK',
     'Refresh':'Actualiser',
@@ -1786,6 +1804,9 @@ textJP={
     'Undo':'元に戻す',
     'Redo':'やり直し',
     'Open File':'ファイルを開く',
+    'Library':'ライブラリ',
+    'Tolerance':'許容誤差',
+    'tipTolerance':'エクスポート時に、ロボットがこの角度以内で再現できる\n動作のフレームを省きます。\n0 ですべてのフレームをエクスポート',
     'Cancel':'キャンセル',
     'OK':'OK',
     'Refresh':'更新',
@@ -2061,6 +2082,9 @@ textIT = {
     'Undo':'Undo',
     'Redo':'Redo',
     'Open File':'Apri File',
+    'Library':'Libreria',
+    'Tolerance':'Tolleranza',
+    'tipTolerance':'L\'esportazione omette i fotogrammi di un comportamento\nche il robot riproduce entro questi gradi.\n0 esporta tutti i fotogrammi',
     'Cancel':'Cancella',
     'OK':'OK',
     'exampleFormat':'Importa da file o copia e incolla i dati delle abilità da instinct.h nel seguente formato.\n* Mantieni le parentesi graffe!',
@@ -4,9 +4,15 @@
 # modified from https://blog.csdn.net/u013541325/article/details/113062191
 
 import binascii
+import logging
+import os
+import threading
+import time
 import serial  # need to install pyserial first
 import serial.tools.list_ports
 
+logger = logging.getLogger(__name__)
+
 # global variables
 # whether the serial port is created successfully or not
 Ret = False
@@ -15,6 +21,36 @@ port_list_number = []
 # list of serial port names
 port_list_name = []
 
+# how long a timed-out request keeps absorbing its late echo
+LATE_RESPONSE_GRACE = 10
+# how many unclaimed lines to keep when nobody is waiting
+UNCLAIMED_LINES = 200
+# the echoes of the tokens that the firmware answers with another token
+echoTokens = {'K': ['k'], 'T': ['T', 'k'], 'p': ['p', 'P', 'k'], 'g': ['g', 'G'], 'G': ['g', 'G'],
+              'v': ['v', 'V'], 'V': ['v', 'V'], 'z': ['z', 'Z']}
+
+
+class PendingResponse(object):
+    """
+    A command waiting for its echoed token from the robot
+    """
+    def __init__(self, token):
+        if 'X' in token:
+            token = 'X'
+        self.token = token
+        self.prints = ''
+        self.response = None
+        self.expired = None  # time.monotonic() when the waiter gave up
+        self.event = threading.Event()
+
+    def matches(self, line):
+        lineTrim = line.split('\r')[0]
+        if self.expired is not None:
+            # only the exact echo, so a late 'i' does not take the 'I' of a later command
+            return lineTrim in echoTokens.get(self.token, [self.token])
+        return lineTrim.lower() == self.token.lower() or (self.token == 'p' and lineTrim == 'k')
+
+
 class Communication(object):
     """
     Python serial communication package class
@@ -29,6 +65,12 @@ class Communication(object):
         Ret = False
         self.data = None
         self.b_c_text = None
+        self.readerThread = None
+        self.readerRunning = False
+        self.responseLock = threading.Lock()
+        self.waiters = []  # PendingResponse objects in the order the commands were sent
+        self.unclaimed = []  # lines received while no command was waiting
+        self.lateResponses = []  # echoes that arrived after their command timed out
 
         try:
             # open the serial port and get the serial port object
@@ -75,6 +117,7 @@ class Communication(object):
         close serial port
         """
         global Ret
+        self.Stop_Reader()
         # print(self.main_engine.is_open)  # check if the serial port is open
         # determine whether to open
         if self.main_engine.is_open:
@@ -82,6 +125,143 @@ class Communication(object):
             Ret = False
 
 
+    def Start_Reader(self):
+        """
+        start the background thread that reads the serial port continuously
+        and hands every line to the command waiting for it
+        """
+        if self.main_engine is None or not self.main_engine.is_open:
+            return
+        if self.readerThread is not None and self.readerThread.is_alive():
+            return
+        self.readerRunning = True
+        self.readerThread = threading.Thread(target=self.Read_Loop, name='reader-' + str(self.port))
+        self.readerThread.daemon = True
+        self.readerThread.start()
+
+
+    def Stop_Reader(self):
+        """
+        stop the background reader thread
+        """
+        self.readerRunning = False
+        if self.readerThread is not None and self.readerThread is not threading.current_thread():
+            try:
+                self.main_engine.cancel_read()  # return from a blocking read() right away
+            except Exception:
+                pass
+            self.readerThread.join(2 * (self.timeout or 0) + 0.1)
+        self.readerThread = None
+
+
+    def Read_Loop(self):
+        """
+        the body of the reader thread.
+        read() blocks until data arrives or the port timeout passes, so an idle port costs no CPU.
+        """
+        buffer = b''
+        while self.readerRunning:
+            try:
+                data = self.main_engine.read(max(1, self.main_engine.in_waiting))
+            except Exception as e:  # the port is closed or unplugged
+                logger.debug(f"Reader of {self.port} stopped: {e}")
+                break
+            if not data:
+                continue
+            buffer += data
+            lines = buffer.split(b'\n')
+            buffer = lines.pop()
+            for line in lines:
+                self.Dispatch_Line((line + b'\n').decode('ISO-8859-1'))
+        self.readerRunning = False
+        # wake up the commands that are still waiting so they fail right away
+        with self.responseLock:
+            for waiter in self.waiters:
+                waiter.event.set()
+            self.waiters.clear()
+
+
+    def Dispatch_Line(self, line):
+        """
+        give a received line to the oldest command whose token it echoes,
+        otherwise add it to the prints of the oldest command still waiting
+        """
+        logger.debug(f"response is: {line}")
+        with self.responseLock:
+            for waiter in self.waiters:
+                if waiter.matches(line):
+                    self.waiters.remove(waiter)
+                    waiter.response = line
+                    if waiter.expired is not None:
+                        logger.info(f"Late response on {self.port} for {waiter.token}: {line.strip()}")
+                        self.lateResponses = (self.lateResponses + [[line, waiter.prints]])[-UNCLAIMED_LINES:]
+                    waiter.event.set()
+                    return
+            for waiter in self.waiters:
+                if waiter.expired is None:
+                    waiter.prints += line
+                    return
+            self.unclaimed = (self.unclaimed + [line])[-UNCLAIMED_LINES:]
+
+
+    def Flush_Input(self):
+        """
+        drop the lines nobody has claimed yet and return them as one string
+        """
+        with self.responseLock:
+            text = ''.join(self.unclaimed)
+            self.unclaimed = []
+        return text
+
+
+    def Expect(self, token):
+        """
+        register a command that waits for its echoed token.
+        lines that arrived after the last Flush_Input() are claimed first.
+        :return: a PendingResponse to pass to Wait_Response()
+        """
+        waiter = PendingResponse(token)
+        with self.responseLock:
+            now = time.monotonic()
+            self.waiters = [w for w in self.waiters
+                            if w.expired is None or now - w.expired < LATE_RESPONSE_GRACE]
+            while self.unclaimed and waiter.response is None:
+                line = self.unclaimed.pop(0)
+                if waiter.matches(line):
+                    waiter.response = line
+                    waiter.event.set()
+                else:
+                    waiter.prints += line
+            if waiter.response is None:
+                self.waiters.append(waiter)
+        return waiter
+
+
+    def Wait_Response(self, waiter, timeout):
+        """
+        wait for the echo registered by Expect()
+        :return: [response, allPrints], or -1 if it timed out or the reader stopped
+        """
+        waiter.event.wait(timeout)
+        with self.responseLock:
+            if waiter.response is not None:
+                return [waiter.response, waiter.prints]
+            if waiter in self.waiters:
+                # keep it queued for a while so a late echo is not mistaken for the next command's
+                waiter.expired = time.monotonic()
+        return -1
+
+
+    def Cancel(self, waiter):
+        """
+        stop waiting for the echo registered by Expect() without keeping it for a late echo,
+        so the echo goes to the next command with the same token
+        """
+        with self.responseLock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+
     @staticmethod
     def Print_Used_Com():
         """
@@ -97,6 +277,12 @@ class Communication(object):
                 port_list_number.append(each_port[0])
                 port_list_name.append(each_port[1])
 
+        # ports that are not USB or Bluetooth devices, e.g. the pseudo terminal of emulator.py
+        for extraPort in os.environ.get('OPENCAT_EXTRA_PORTS', '').split(os.pathsep):
+            if extraPort and os.path.exists(extraPort) and extraPort not in port_list_number:
+                port_list_number.append(extraPort)
+                port_list_name.append(extraPort)
+
 #        print(port_list_number)
 #        print(port_list_name)
         return port_list_number
@@ -1,17 +1,28 @@
 #!/usr/bin/python3
 # -*- coding: UTF-8 -*-
 
-import struct
 import sys
 import time
 import logging
 from SerialCommunication import *  # module SerialCommunication.py
+import serial.tools.list_ports
+from commandEncoder import encodeCommand, encodeStrings, rescaleSkill
+from portMonitor import PortMonitor, pollInterval
+from portWorker import PortWorker
+from robotProbe import bootTimeout, waitForRobot
+from deviceCache import deviceKey, lookupDevice, rememberDevice, forgetDevice
+from skill import Skill, halveLargeAngles, splitLargeAngles
+from skillLibrary import library
+from scheduleCompiler import compileSchedule
+from skillTransform import decimateSkill
 import platform
 import copy
 import threading
 import os
 import config
 import glob
+import queue
+from concurrent.futures import Future
 
 FORMAT = '%(asctime)-15s %(name)s - %(levelname)s - %(message)s'
 '''
@@ -62,91 +73,135 @@ def encode(in_str, encoding='utf-8'):
         return in_str.encode(encoding)
 
 delayBetweenSlice = 0.001
+sliceSize = 20
+pacedChunk = 64
+defaultBytesPerSecond = 10000    # a little below the 11520 bytes/s of 115200 baud
+# How a port takes a long binary frame:
+# 'single' - one write. USB CDC boards (usbmodem, ttyACM) buffer it on their own.
+# 'paced'  - pacedChunk-byte writes kept under a bytes-per-second budget, for USB-UART bridges.
+#            A budget of 0 waits for the output buffer to drain (out_waiting) after each chunk instead.
+# 'sliced' - sliceSize-byte writes with delayBetweenSlice, the original behavior, kept for Bluetooth.
+writePolicies = {}    # {SerialPort Object: [policy, bytesPerSecond]}
+bridgeVendorIDs = [0x1A86, 0x10C4, 0x0403]    # WCH CH34x/CH9102, Silicon Labs CP210x, FTDI
+
+
+def defaultWritePolicy(portName):
+    if 'usbmodem' in portName or 'ttyACM' in portName:
+        return 'single'
+    if 'usbserial' in portName or 'ttyUSB' in portName or 'SLAB' in portName:
+        return 'paced'
+    try:
+        for info in serial.tools.list_ports.comports():
+            if info.device == portName and info.vid is not None:
+                if info.vid in bridgeVendorIDs:
+                    return 'paced'
+                return 'single'
+    except Exception as e:
+        logger.debug(f"Fail to look up {portName}: {e}")
+    return 'sliced'
+
+
+def setWritePolicy(port, policy, bytesPerSecond=defaultBytesPerSecond):
+    if policy not in ['single', 'paced', 'sliced']:
+        raise ValueError(f"Unknown write policy: {policy}")
+    writePolicies[port] = [policy, bytesPerSecond]
+
+
+def getWritePolicy(port):
+    if port not in writePolicies:
+        setWritePolicy(port, defaultWritePolicy(str(port.port)))
+        logger.info(f"Write policy of {port.port}: {writePolicies[port][0]}")
+    return writePolicies[port]
+
+
+keyframeTolerance = 1    # degrees. a K behavior is sent without the frames decimateSkill() finds within it. 0 sends all.
+# 1, the resolution of the angles of a frame, only leaves out frames that lie on the eased move between their neighbours
+
+
+def setKeyframeTolerance(degrees):
+    global keyframeTolerance
+    keyframeTolerance = degrees
+
+
+def decimatedSkill(var):
+    # the Skill of a K task without the frames the robot reproduces within keyframeTolerance
+    skill = decimateSkill(var if isinstance(var, Skill) else Skill(var), keyframeTolerance)
+    if skill.frameCount < abs(var[0]):
+        logger.info(f"Decimated the skill from {abs(var[0])} to {skill.frameCount} frames")
+    return skill
+
+
+waitMode = 'fixed'    # 'fixed' waits the last element of a task after its echo. 'auto' as long as the robot is busy
+timingModels = {}    # {SerialPort Object: skillTiming.TimingModel}
+
+
+def setWaitMode(mode):
+    global waitMode
+    if mode not in ['fixed', 'auto']:
+        raise ValueError(f"Unknown wait mode: {mode}")
+    waitMode = mode
+
+
+def timingModel(port):
+    if port not in timingModels:
+        from skillTiming import TimingModel, deviceTiming    # skillTiming imports this module
+        timingModels[port] = TimingModel(model, deviceTiming(port))
+    return timingModels[port]
+
+
+def taskWait(port, task, elapsed):
+    # seconds to wait after the echo of task, elapsed seconds after it was written. 'auto' waits until the end of
+    # the move predicted by the timing model of the port, and the seconds of the task for a gait
+    if waitMode == 'fixed':
+        return task[-1]
+    return max(0, timingModel(port).taskSeconds(task) - elapsed)
+
+
+def writeBytes(port, in_str):
+    policy, bytesPerSecond = getWritePolicy(port)
+    if policy == 'single':
+        port.Send_data(in_str)
+    elif policy == 'paced':
+        startTime = time.monotonic()
+        for start in range(0, len(in_str), pacedChunk):
+            if start > 0:
+                if bytesPerSecond > 0:
+                    ahead = start / bytesPerSecond - (time.monotonic() - startTime)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                else:
+                    port.main_engine.flush()    # blocks until the output buffer is empty
+            port.Send_data(in_str[start:start + pacedChunk])
+    else:
+        for start in range(0, len(in_str), sliceSize):
+            port.Send_data(in_str[start:start + sliceSize])
+            time.sleep(delayBetweenSlice)
 
 def serialWriteNumToByte(port, token, var=None):  # Only to be used for c m u b I K L o within Python
     # print("Num Token "); print(token);print(" var ");print(var);print("\n\n");
-    logger.debug(f'serialWriteNumToByte, token={token}, var={var}')
-    in_str = ""
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug(f'serialWriteNumToByte, token={token}, var={var}')
     if var is None:
         var = []
-    if token == 'K':
-        period = var[0]
-        #        print(encode(in_str))
-        if period > 0:
-            skillHeader = 4
+    if token == 'K' or isinstance(var, Skill):
+        if token == 'K' and keyframeTolerance > 0 and var[0] < 0:    # only behaviors can be decimated
+            var = decimatedSkill(var)
+        if isinstance(var, Skill):    # already rescaled, and its bytes are kept
+            in_str = var.encode()
         else:
-            skillHeader = 7
-            
-        if period > 1:
-            frameSize = 8  # gait
-        elif period == 1:
-            frameSize = 16  # posture
-        else:
-            frameSize = 20  # behavior
-    # divide large angles by 2
-        angleRatio = 1
-        for row in range(abs(period)):
-            for angle in var[skillHeader + row * frameSize:skillHeader + row * frameSize + min(16,frameSize)]:
-                if angle > 125 or angle < -125:
-                    angleRatio = 2
-                    break
-            if angleRatio ==2:
-                break
-        
-        if angleRatio == 2:
-            var[3] = 2
-            for row in range(abs(period)):
-                for i in range(skillHeader + row * frameSize,skillHeader + row * frameSize + min(16,frameSize)):
-                    var[i] //=2
-            printH('rescaled:\n',var)
-            
-        var = list(map(int, var))
-        in_str = token.encode() + struct.pack('b' * len(var), *var) + '~'.encode()
-
+            if rescaleSkill(var):
+                printH('rescaled:\n',var)
+            in_str = encodeCommand(token, var)
     else:
-        if token.isupper():# == 'L' or token == 'I' or token == 'B' or token == 'C':
-#            if token == 'C':
-#                packType = 'B'
-#            else:
-#                packType = 'b'
-#            port.Send_data(token.encode())
-            if len(var)>0:
-                message = list(map(int, var))
-                if token == 'B':
-                    for l in range(len(message)//2):
-                        message[l*2+1]*= 8  #change 1 to 8 to save time for tests
-                        # print(message[l*2],end=",")
-                        # print(message[l*2+1],end=",")
-                        logger.debug(f"{message[l*2]},{message[l*2+1]}")
-            if token == 'W' or token == 'C':
-                in_str = struct.pack('B' * len(message), *message)    # B - unsigned char, e.g. 'B'*3 means 'BBB'
-            else:
-                in_str = struct.pack('b' * len(message), *message)    # b - signed char, e.g. 'b'*3 means 'bbb'
-            in_str = token.encode() + in_str + '~'.encode()
-
-        else:#if token == 'c' or token == 'm' or token == 'i' or token == 'b' or token == 'u' or token == 't':
-            message = ""
-            for element in var:
-                message +=  (str(round(element))+" ")
-            in_str = token.encode()+encode(message) +'\n'.encode()
-
-    slice = 0
-    while len(in_str) > slice:
-        if len(in_str) - slice >= 20:
-            port.Send_data(in_str[slice:slice+20])
-        else:
-            port.Send_data(in_str[slice:])
-        slice+=20
-        time.sleep(delayBetweenSlice)
-    logger.debug(f"!!!! {in_str}")
-            #print(encode(in_str))
-#            port.Send_data(encode(message))
+        in_str = encodeCommand(token, var)
+    writeBytes(port, in_str)
+    if debug:
+        logger.debug(f"!!!! {in_str}")
 
 
-def serialWriteByte(port, var=None):
-    logger.debug(f'serial_write_byte, var={var}')
-    if var is None:
-        var = []
+def encodeByteCommand(var):
+    # the bytes serialWriteByte() sends for a command given as strings, e.g. ['ksit'] or ['m', '0', '30']
     token = var[0][0]
     # printH("token:",token)
     # print var
@@ -158,15 +213,21 @@ def serialWriteByte(port, var=None):
     elif token == 'L' or token == 'I':
         if len(var[0]) > 1:
             var.insert(1, var[0][1:])
-        var[1:] = list(map(int, var[1:]))
-        in_str = token.encode() + struct.pack('b' * (len(var) - 1), *var[1:]) + '~'.encode()
+        in_str = encodeStrings(token, var[1:])
     elif token == 'w' or token == 'k' or token == 'X':
         in_str = var[0] + '\n'
     else:
         in_str = token + '\n'
     logger.debug(f"!!!!!!! {in_str}")
     # printH("in_str:", in_str)
-    port.Send_data(encode(in_str))
+    return encode(in_str)
+
+
+def serialWriteByte(port, var=None):
+    logger.debug(f'serial_write_byte, var={var}')
+    if var is None:
+        var = []
+    port.Send_data(encodeByteCommand(var))
     time.sleep(0.01)
 
 
@@ -174,37 +235,42 @@ def printSerialMessage(port, token, timeout=0):
     if token == 'k' or token == 'K':
         threshold = 8
     else:
-        threshold = 3
-    if 'X' in token:
-        token = 'X'
-    startTime = time.time()
-    allPrints = ''
-    while True:
-        time.sleep(0.001)
-        #            return 'err'
-        if port:
-            response = port.main_engine.readline().decode('ISO-8859-1')
-            if response != '':
-                logger.debug(f"response is: {response}")
-                responseTrim = response.split('\r')[0]
-                logger.debug(f"responseTrim is: {responseTrim}")
-                if responseTrim.lower() == token.lower(): 
-                    return [response, allPrints]
-                elif token == 'p' and responseTrim == 'k':
-                    return [response, allPrints]
-                else:
-                    # print(response, flush=True)
-                    allPrints += response
-        now = time.time()
-        if (now - startTime) > threshold:
-            # print('Elapsed time: ', end='')
-            # print(threshold, end=' seconds\n', flush=True)
-            logger.debug(f"Elapsed time: {threshold} seconds")
-            threshold += 2
-            if threshold > 5:
-                return -1
-        if 0 < timeout < now - startTime:
-            return -1
+        threshold = 5
+    if 0 < timeout < threshold:
+        threshold = timeout
+    if not port:
+        return -1
+    # the reader thread of the port collects the lines and wakes us up on the echoed token
+    port.Start_Reader()
+    result = port.Wait_Response(port.Expect(token), threshold)
+    if result == -1:
+        logger.debug(f"Elapsed time: {threshold} seconds")
+    return result
+
+
+def encodeTask(task):
+    # the bytes writeTask() sends for a task
+    if len(task) == 2:
+        return encodeByteCommand([task[0]])
+    elif task[0] == 'K' and keyframeTolerance > 0 and task[1][0] < 0:
+        return decimatedSkill(task[1]).encode()
+    elif isinstance(task[1], Skill):
+        return task[1].encode()
+    elif isinstance(task[1][0], int):
+        if task[0] == 'K':
+            rescaleSkill(task[1])
+        return encodeCommand(task[0], task[1])
+    else:
+        return encodeByteCommand(task[1])
+
+
+def writeTask(port, task):
+    if len(task) == 2:
+        serialWriteByte(port, [task[0]])
+    elif isinstance(task[1][0], int):
+        serialWriteNumToByte(port, task[0], task[1])
+    else:
+        serialWriteByte(port, task[1])
 
 
 def sendTask(PortList, port, task, timeout=0):  # task Structure is [token, var=[], time]
@@ -215,26 +281,19 @@ def sendTask(PortList, port, task, timeout=0):  # task Structure is [token, var=
     #    print(task)
     if port:
         try:
-            previousBuffer = port.main_engine.read_all().decode('ISO-8859-1')
+            port.Start_Reader()
+            previousBuffer = port.Flush_Input()
             if previousBuffer:
                 logger.debug(f"Previous buffer: {previousBuffer}")
                 pass
-            if len(task) == 2:
-                #        print('a')
-                #        print(task[0])
-                serialWriteByte(port, [task[0]])
-            elif isinstance(task[1][0], int):
-                #        print('b')
-                serialWriteNumToByte(port, task[0], task[1])
-            else:
-                #        print('c') #which case
-                serialWriteByte(port, task[1])
+            writeTime = time.monotonic()
+            writeTask(port, task)
             token = task[0][0]
 #            printH("token",token)
             if token == 'I' or token =='L':
                 timeout = 1 # in case the UI gets stuck
             lastMessage = printSerialMessage(port, token, timeout)
-            time.sleep(task[-1])
+            time.sleep(taskWait(port, task, time.monotonic() - writeTime))
         #    with lock:
         #        sync += 1
         #        printH('sync',sync)
@@ -251,20 +310,30 @@ def sendTask(PortList, port, task, timeout=0):  # task Structure is [token, var=
     return lastMessage
 
 
+portWorkers = {}    # {SerialPort Object: PortWorker}
+portWorkersLock = threading.Lock()    # two threads sending to a new port must get the same worker
+
+
+def portWorker(port):
+    with portWorkersLock:
+        if port not in portWorkers:
+            portWorkers[port] = PortWorker(port, lambda port, task, timeout: sendTask(goodPorts, port, task, timeout))
+        return portWorkers[port]
+
+
 def sendTaskParallel(ports, task, timeout=0):
-    global returnValue
-    #    global sync
-    #    sync = 0
-    threads = list()
+    # returns {SerialPort Object: [response, allPrints] or -1}
+    futures = {}
     for p in ports:
-        t = threading.Thread(target=sendTask, args=(goodPorts, p, task, timeout))
-        threads.append(t)
-        t.daemon = True
-        t.start()
-    for t in threads:
-        if t.is_alive():
-            t.join()
-    return returnValue
+        futures[p] = portWorker(p).submit(task, timeout)
+    return {p: future.result() for p, future in futures.items()}
+
+
+def closePortWorker(port):
+    with portWorkersLock:
+        worker = portWorkers.pop(port, None)
+    if worker is not None:
+        worker.close()
 
 
 def splitTaskForLargeAngles(task):
@@ -272,14 +341,8 @@ def splitTaskForLargeAngles(task):
     queue = list()
     if len(task)>2 and (token == 'L' or token == 'I'):
         var = task[1]
-        indexedList = list()
         if token == 'L':
-            for i in range(4):
-                for j in range(4):
-                    angle = var[4 * j + i]
-                    if angle < -125 or angle > 125:
-                        indexedList += [4 * j + i, angle]
-                        var[4 * j + i] = max(min(angle, 125), -125)
+            var, indexedList = splitLargeAngles(var)
             if len(var):
                 queue.append(['L', var, task[-1]])
             if len(indexedList):
@@ -295,23 +358,157 @@ def splitTaskForLargeAngles(task):
     return queue
 
 
-def send(port, task, timeout=0):
+def send(port, task, timeout=0, perPort=False):
+    # returns what sendTask returned for the first port,
+    # or {SerialPort Object: [response, allPrints] or -1} for every port if perPort is True
 #    printH('*** @@@ open port ',port) #debug
     if isinstance(port, dict):
         p = list(port.keys())
     elif isinstance(port, list):
         p = port
+    if len(p) == 0:
+        # print('no ports')
+        if perPort:
+            return {}
+        return -1
     queue = splitTaskForLargeAngles(task)
     for task in queue:
         # printH("task",task)
-        if len(port) > 1:
-            returnResult = sendTaskParallel(p, task, timeout)
-        elif len(port) == 1:
-            returnResult = sendTask(goodPorts, p[0], task, timeout)
+        # even for one port, on the worker of the port, so the tasks of different threads (the UI dispatcher,
+        # the slider channel) never read the same port at once
+        results = sendTaskParallel(p, task, timeout)
+    if perPort:
+        return results
+    return results[p[0]]
+
+
+pipelineGap = 0.01    # seconds. read_serial() waits 1 ms after the token and 5 ms for more bytes
+# commands a CommandPipeline keeps in flight. read_serial() merges every command waiting in the receive buffer into one,
+# so 2 (one command running, the next one on the wire) is the most the firmware of the robots here takes without losing
+# commands. benchmark.py serial measures 1, 2 and 3
+defaultPipelineWindow = 2
+pipelineWindows = {}    # {SerialPort Object: commands in flight}
+
+
+class CommandPipeline:
+    # Keeps up to `window` commands in flight on one port instead of waiting for each echo.
+    # The firmware answers in order, so the echoes are matched to the commands in order.
+    # See defaultPipelineWindow for the window. Back to back writes can still land in the same read, so a write is at
+    # least pipelineGap after the previous write and after the last echo (when the firmware starts reading the command
+    # queued behind it).
+    # The last element of a task is the minimum gap before the next command is written, or in the 'auto' wait mode
+    # the time the move takes.
+    def __init__(self, port, window=defaultPipelineWindow):
+        self.port = port
+        self.window = threading.Semaphore(window)
+        self.inFlight = queue.Queue()
+        self.lastWrite = 0
+        self.lastAck = 0
+        self.writeLock = threading.Lock()
+        port.Start_Reader()
+        self.ackThread = threading.Thread(target=self.collectAcks)
+        self.ackThread.daemon = True
+        self.ackThread.start()
+
+    def submit(self, task, timeout=0):
+        # returns a Future whose result is what sendTask would return: [response, allPrints] or -1
+        future = Future()
+        token = task[0][0]
+        if token == 'k' or token == 'K':
+            threshold = 8
         else:
-            # print('no ports')
-            return -1
-    return returnResult
+            threshold = 5
+        if token == 'I' or token == 'L':
+            threshold = 1
+        if 0 < timeout < threshold:
+            threshold = timeout
+        self.window.acquire()
+        with self.writeLock:
+            gap = max(self.lastWrite, self.lastAck + pipelineGap) - time.monotonic()
+            if gap > 0:
+                time.sleep(gap)
+            waiter = self.port.Expect(token)    # register before writing so a fast echo is not missed
+            try:
+                writeTask(self.port, task)
+            except Exception as e:
+                logger.info(f"Fail to write {task}: {e}")
+                self.port.Wait_Response(waiter, 0)
+                self.window.release()
+                future.set_result(-1)
+                return future
+            self.lastWrite = time.monotonic() + max(taskWait(self.port, task, 0), pipelineGap)
+            self.inFlight.put([waiter, future, time.monotonic() + threshold])
+        return future
+
+    def collectAcks(self):
+        while True:
+            item = self.inFlight.get()
+            if item is None:
+                break
+            waiter, future, deadline = item
+            if waiter is None:    # marker queued by drain()
+                future.set_result(None)
+                continue
+            result = self.port.Wait_Response(waiter, max(0, deadline - time.monotonic()))
+            if result == -1:
+                logger.debug(f"No echo for {waiter.token} in the pipeline")
+            self.lastAck = time.monotonic()
+            self.window.release()
+            future.set_result(result)
+
+    def drain(self):
+        # block until every submitted command is acknowledged or timed out
+        done = Future()
+        self.inFlight.put([None, done, 0])
+        done.result()
+
+    def close(self):
+        self.inFlight.put(None)
+        self.ackThread.join(10)
+
+
+pipelines = {}    # {SerialPort Object: CommandPipeline}
+
+
+def setPipelineWindow(port, window):
+    # for a firmware that queues whole commands. the pipeline of the port starts again with the new window
+    if window < 1:
+        raise ValueError(f"A pipeline window must be at least 1: {window}")
+    pipelineWindows[port] = window
+    if port in pipelines:
+        pipelines[port].drain()
+        closePipeline(port)
+
+
+def getPipelineWindow(port):
+    return pipelineWindows.get(port, defaultPipelineWindow)
+
+
+def sendPipelined(port, task, timeout=0):
+    # like send(), but returns right after writing with {SerialPort Object: Future} for the last piece of the task
+    if isinstance(port, dict):
+        p = list(port.keys())
+    else:
+        p = port
+    futures = {}
+    for task in splitTaskForLargeAngles(task):
+        for serialObject in p:
+            if serialObject not in pipelines:
+                pipelines[serialObject] = CommandPipeline(serialObject, getPipelineWindow(serialObject))
+            futures[serialObject] = pipelines[serialObject].submit(task, timeout)
+    return futures
+
+
+def drainPipelines(ports=None):
+    for serialObject, pipeline in list(pipelines.items()):
+        if ports is None or serialObject in ports:
+            pipeline.drain()
+
+
+def closePipeline(port):
+    pipeline = pipelines.pop(port, None)
+    if pipeline is not None:
+        pipeline.close()
 
 
 def keepReadingInput(ports):
@@ -331,6 +528,8 @@ def keepReadingInput(ports):
 
 
 def closeSerialBehavior(port):
+    closePipeline(port)
+    closePortWorker(port)
     try:
         port.Close_Engine()
     except Exception as e:
@@ -513,69 +712,52 @@ model = 'Bittle'
 postureTable = postureDict[model]
 
 
-def schedulerToSkill(ports, testSchedule):
-    compactSkillData = []
-    newSkill = []
-    outputStr = ""
+def postureAngles(name):
+    # the 16 angles of the posture the robot takes on 'k' + name: from the skill library, which reads them from the
+    # Instinct header of the firmware, or from postureTable
+    posture = library().skill(name, model)
+    if posture is not None and posture.kind == 'posture':
+        return posture.frameValues(0)
+    if name in postureTable:
+        return postureTable[name][-16:]
+    return None
 
-    for task in testSchedule:  # execute the tasks in the testSchedule
-        print(task)
-        token = task[0][0]
-        if token == 'k' and task[0][1:] in postureTable:
-            currentRow = postureTable[task[0][1:]][-16:]
-            skillRow = copy.deepcopy(currentRow)
-            compactSkillData.append(skillRow + [8, int(task[1] * 1000 / 500), 0, 0])
-            newSkill = newSkill + skillRow + [8, int(task[1] * 1000 / 500), 0, 0]
-
-        elif token == 'i' or token == 'I':
-            currentRow = copy.deepcopy(skillRow)
-            for e in range(0, len(task[1]), 2):
-                #                    print(task[1][e],task[1][e+1])
-                currentRow[task[1][e]] = task[1][e + 1]
-            skillRow = copy.deepcopy(currentRow)
-            compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
-            newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
-        elif token == 'L':
-            skillRow = copy.deepcopy(task[1][:16])
-            compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
-            newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
-
-        elif token == 'm':
-            currentRow = copy.deepcopy(skillRow)
-            for e in range(0, len(task[1]), 2):
-                currentRow[task[1][e]] = task[1][e + 1]
-                skillRow = copy.deepcopy(currentRow)
-                compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
-                newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
-    if len(compactSkillData) > 0:
-        print('{')
-        print('{:>4},{:>4},{:>4},{:>4},'.format(*[-len(compactSkillData), 0, 0, 1]))
-        print('{:>4},{:>4},{:>4},'.format(*[0, 0, 0]))
-    else:
-        return
-    angleRatio = 1
-    for row in compactSkillData:
-        if min(row) < -125 or max(row) > 125:
-            angleRatio = 2
-        print(('{:>4},' * 20).format(*row))
-    print('};')
-    newSkill = list(map(lambda x: x // angleRatio, newSkill))
-    newSkill = [-len(compactSkillData), 0, 0, angleRatio, 0, 0, 0] + newSkill
-    print(newSkill)
+
+def schedulerToSkill(ports, testSchedule):
+    # compile the motion tasks of testSchedule into one behavior, print it and send it. returns the Skill, or None
+    newSkill = compileSchedule(testSchedule, postureAngles)
+    if newSkill is None:
+        return None
+    print(newSkill.text())
+    print(newSkill.toList())
     #    sendTaskParallel(['K', newSkill, 1])
     send(ports, ['K', newSkill, 1])
+    return newSkill
 
-def getModelAndVersion(result):
+
+def setModelAndVersion(model, version):
+    config.model_ = model
+    config.version_ = version
+    config.modelList += [config.model_]
+    print(config.model_)
+    print(config.version_)
+
+
+def parseModelAndVersion(result):
+    # returns [model, version] from the answer to '?', or None
     if result != -1:
         parse = result[1].replace('\r','').split('\n')
-        for l in range(len(parse)):
+        for l in range(len(parse) - 1):
             if 'Nybble' in parse[l] or 'Bittle' in parse[l] or 'DoF16' in parse[l]:
-                config.model_ = parse[l]
-                config.version_ = parse [l+1]
-                config.modelList += [config.model_]
-                print(config.model_)
-                print(config.version_)
-                return
+                return [parse[l], parse[l+1]]
+    return None
+
+
+def getModelAndVersion(result):
+    modelAndVersion = parseModelAndVersion(result)
+    if modelAndVersion is not None:
+        setModelAndVersion(*modelAndVersion)
+        return
     config.model_ = 'Bittle'
     config.version_ = 'Unknown'
     
@@ -595,27 +777,57 @@ def deleteDuplicatedUsbSerial(list):
             list.remove(item)
     return list
     
+def writeProbe(serialObject):
+    writeTask(serialObject, ['?', 0])
+
+
+def confirmDevice(PortList, serialObject, p, key):
+    # the '?' handshake of a robot that was added from the device cache
+    result = waitForRobot(serialObject, writeProbe)
+    if result == -1:
+        logger.info(f"{p} is not the robot in the device cache")
+        forgetDevice(key)
+        if serialObject in PortList:
+            PortList.pop(serialObject)
+        closePortWorker(serialObject)    # the commands already waiting behind the handshake fail with the port
+        serialObject.Close_Engine()
+        print('* Port ' + p + ' is not connected to a Petoi device!')
+        return
+    known = lookupDevice(key) or {}
+    modelAndVersion = parseModelAndVersion(result)
+    if modelAndVersion is not None and modelAndVersion != [known.get('model'), known.get('version')]:
+        logger.info(f"{p} now runs {modelAndVersion}")    # e.g. new firmware was uploaded
+        setModelAndVersion(*modelAndVersion)
+        rememberDevice(key, model=modelAndVersion[0], version=modelAndVersion[1])
+
+
 def testPort(PortList, serialObject, p):
     global goodPortCount
     #    global sync
     try:
-        time.sleep(3)
-        waitTime = 0
+        serialObject.Start_Reader()    # buffer the boot messages while waiting
         result = serialObject.main_engine
         if result != None:
-            result = result.read_all().decode('ISO-8859-1')
-            if result != '':
-                print('Waiting for the robot to boot up')
-                time.sleep(2)
-                waitTime = 3
-            else:
-                waitTime = 2
-            result = sendTask(PortList, serialObject, ['?', 0], waitTime)
+            key = deviceKey(serialObject.port)
+            known = lookupDevice(key)
+            if known is not None and known.get('model') and known.get('version'):
+                # a robot connected before. use it now and do the handshake in the background, on the worker of
+                # the port: the commands sent to it wait behind the handshake, so the '?' probe doesn't take their
+                # prints and they aren't written while the board restarts after the port opened
+                logger.debug(f"Adding from the device cache: {p}")
+                portWorker(serialObject).call(confirmDevice, PortList, serialObject, p, key)
+                PortList.update({serialObject: p})
+                goodPortCount += 1
+                setModelAndVersion(known['model'], known['version'])
+                return
+            result = waitForRobot(serialObject, writeProbe)
             if result != -1:
                 logger.debug(f"Adding in testPort: {p}")
                 PortList.update({serialObject: p})
                 goodPortCount += 1
                 getModelAndVersion(result)
+                if config.version_ != 'Unknown':
+                    rememberDevice(key, model=config.model_, version=config.version_)
             else:
                 serialObject.Close_Engine()
                 print('* Port ' + p + ' is not connected to a Petoi device!')
@@ -627,14 +839,25 @@ def testPort(PortList, serialObject, p):
 def checkPortList(PortList, allPorts, needTesting=True):
     threads = list()
     global goodPortCount
+    serialObjects = []
+    tested = threading.Condition()    # notified as each port is tested
+    testedCount = [0]
+
+    def probe(serialObject, p):
+        try:
+            testPort(PortList, serialObject, p)
+        finally:
+            with tested:
+                testedCount[0] += 1
+                tested.notify_all()
 
     for p in reversed(allPorts):  # assuming the last one is the most possible port
         # if p == '/dev/ttyAMA0':
         #     continue
         serialObject = Communication(p, 115200, 1)
         if needTesting is True:
-            t = threading.Thread(target=testPort,
-                                 args=(PortList, serialObject, p.split('/')[-1]))    # remove '/dev/' in the port name
+            serialObjects.append(serialObject)
+            t = threading.Thread(target=probe, args=(serialObject, p.split('/')[-1]))    # remove '/dev/' in the port name
             threads.append(t)
             t.daemon = True
             t.start()
@@ -644,9 +867,11 @@ def checkPortList(PortList, allPorts, needTesting=True):
             goodPortCount += 1
             logger.info(f"Connected to serial port: {p}")
     if needTesting is True:
-        for t in threads:
-            if t.is_alive():
-                t.join(8)
+        # return as soon as a robot answers. the other ports go on probing in the background, e.g. a ttyS0 that
+        # stays silent for silentTimeout, and a robot that answers on one of them later is added to PortList then
+        with tested:
+            tested.wait_for(lambda: testedCount[0] == len(threads) or any(s in PortList for s in serialObjects),
+                            bootTimeout)
 
 
 def keepCheckingPort(portList, cond1=None, check=True, updateFunc = lambda:None):
@@ -654,23 +879,28 @@ def keepCheckingPort(portList, cond1=None, check=True, updateFunc = lambda:None)
     # allPorts is a string list which delete the duplicated port(Reserve the name of the serial port that contains the usbmodem)
     # portStrList is the serial port string list
     global portStrList
-    allPorts = Communication.Print_Used_Com()
+    allPorts = copy.deepcopy(Communication.Print_Used_Com())    # Print_Used_Com() refills the same list every time
     logger.debug(f"allPorts is {allPorts}")
     if cond1 is None:
         cond1 = lambda: len(portList) > 0
 
+    monitor = PortMonitor()    # wakes up on plug and unplug events instead of listing the ports every 0.5 s
+
     while cond1():
-        time.sleep(0.5)
+        if not monitor.wait(pollInterval):
+            continue
         currentPorts = Communication.Print_Used_Com()    # string list
         # logger.debug(f"currentPorts is {currentPorts}")
         
         if set(currentPorts) - set(allPorts):
-            time.sleep(1) #usbmodem is slower in detection
-            currentPorts = Communication.Print_Used_Com()
+            if monitor.kind == 'poll':
+                time.sleep(1) #usbmodem is slower in detection
+                currentPorts = Communication.Print_Used_Com()
             # newPort = deleteDuplicatedUsbSerial(list(set(currentPorts) - set(allPorts)))
             newPort = list(set(currentPorts) - set(allPorts))
             if check:
-                time.sleep(0.5)
+                if monitor.kind == 'poll':
+                    time.sleep(0.5)    # udev and inotify report the port once it is there. testPort() then probes it
                 checkPortList(portList, newPort)
             else:
                 for p in newPort:
@@ -680,11 +910,12 @@ def keepCheckingPort(portList, cond1=None, check=True, updateFunc = lambda:None)
                     tk.messagebox.showinfo(title=txt('Info'), message=txt('New port prompt') + portName)
             updateFunc()
         elif set(allPorts) - set(currentPorts):
-            time.sleep(1) #usbmodem is slower in detection
-            currentPorts = Communication.Print_Used_Com()
+            if monitor.kind == 'poll':
+                time.sleep(1) #usbmodem is slower in detection
+                currentPorts = Communication.Print_Used_Com()
             closedPort = list(set(allPorts) - set(currentPorts))
             if check:
-                inv_dict = {v: k for k, v in portList.items()}
+                inv_dict = {v: k for k, v in list(portList.items())}
                 for p in closedPort:
                     if inv_dict.get(p.split('/')[-1], -1) != -1:
                         logger.info(f"Removing {p.split('/')[-1]}")
@@ -697,6 +928,7 @@ def keepCheckingPort(portList, cond1=None, check=True, updateFunc = lambda:None)
                         portStrList.remove(portName)
             updateFunc()
         allPorts = copy.deepcopy(currentPorts)
+    monitor.close()
 
 def showSerialPorts(allPorts):
     # currently an issue in pyserial where for newer raspiberry pi os
@@ -749,7 +981,7 @@ def connectPort(PortList, needTesting=True, needSendTask=True, needOpenPort=True
                 replug(PortList, needSendTask, needOpenPort)
         else:
             logger.info(f"Connect to serial port list:")
-            for p in PortList:
+            for p in list(PortList):    # the ports still being probed may add to it
                 logger.debug(f"datatype of p : {type(p)}")
                 logger.info(f"{PortList[p]}")
                 portStrList.append(PortList[p])
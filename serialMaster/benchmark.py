@@ -0,0 +1,1178 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Benchmarks for the serial path. They only time: tests/ checks what the code they time gives (python3 -m pytest tests).
+# e.g.
+# python3 benchmark.py upload                      # write to a local pseudo terminal, no robot needed
+# python3 benchmark.py upload --port /dev/ttyACM0  # upload to a connected robot
+# python3 benchmark.py upload --json upload.json
+# python3 benchmark.py encode                      # encoder micro-benchmark
+# python3 benchmark.py serial --json serial.json   # round trips against emulator.py
+# python3 benchmark.py choreography --robots 10    # start skew of playChoreography() across emulators
+# python3 benchmark.py startup                     # time for testPort() and checkPortList() to find an emulated robot
+# python3 benchmark.py ui                          # how long the Tk mainloop stalls while handlers send commands
+# python3 benchmark.py rescale                     # time the large angle rescaling and splitting
+# python3 benchmark.py schedule                    # compile testSchedules into skills against the legacy loop
+# python3 benchmark.py library                     # time the skill index against parsing the skill files
+# python3 benchmark.py decimate                    # time the keyframe decimation of the library behaviors
+# python3 benchmark.py resample                    # time the resampling of every library gait and behavior
+# python3 benchmark.py kinematics                  # time the foot positions of every gait of Bittle
+# python3 benchmark.py ik                          # time the leg angles of the Skill Composer dials
+# python3 benchmark.py virtual                     # replay testSchedules on the virtual robot faster than real time
+# python3 benchmark.py physics                     # time the fall screen of skillPhysics.py
+# python3 benchmark.py timing                      # calibrate the timing model on the emulator, fixed against auto waits
+
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import contextlib
+import io
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+from ardSerial import *
+from robotProbe import silentTimeout
+from scheduleCompiler import compileSchedule
+from skillLibrary import SkillLibrary, configDir, library, parseSource
+import skillTransform
+from skillTransform import decimateSkill, limitsOf, scaleLibrary
+
+serialMasterDir = os.path.dirname(os.path.abspath(__file__))
+bittyGPTDir = os.path.join(serialMasterDir, '..', 'BittyGPT')
+skillLibraryDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'SkillLibrary')
+lineBytesPerSecond = 11520    # 115200 baud, 8N1
+
+
+def loadSkillFile(fileName):
+    # returns [token, data] from a SkillLibrary markdown file
+    with open(fileName, encoding='utf-8') as f:
+        text = f.read()
+    token = re.search(r'# Token\s*\n\s*(\S)', text).group(1)
+    data = text[text.index('# Data'):]
+    data = data[data.index('{') + 1:data.index('}')]
+    return [token, [int(n) for n in re.findall(r'-?\d+', data)]]
+
+
+def skillLibraryFiles():
+    return sorted(glob.glob(os.path.join(skillLibraryDir, '*', '*.md')))
+
+
+class CountingCommunication(Communication):
+    def __init__(self, com, bps, timeout):
+        Communication.__init__(self, com, bps, timeout)
+        self.bytesSent = 0
+
+    def Send_data(self, data):
+        self.bytesSent += len(data)
+        Communication.Send_data(self, data)
+
+
+def openSink():
+    # a pseudo terminal whose far end throws away everything it receives
+    import pty
+    import tty
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+
+    def drain():
+        while True:
+            try:
+                os.read(master, 4096)
+            except OSError:
+                break
+
+    t = threading.Thread(target=drain)
+    t.daemon = True
+    t.start()
+    return CountingCommunication(os.ttyname(slave), 115200, 1)
+
+
+def benchUpload(args):
+    if args.port:
+        port = CountingCommunication(args.port, 115200, 1)
+        time.sleep(3)    # the board may reboot when the port opens
+    else:
+        port = openSink()
+    results = []
+    for fileName in skillLibraryFiles():
+        token, data = loadSkillFile(fileName)
+        for policy in args.policy:
+            setWritePolicy(port, policy, args.rate)
+            seconds = []
+            for r in range(args.repeat):
+                if args.port:
+                    port.Start_Reader()
+                    port.Flush_Input()
+                port.bytesSent = 0
+                startTime = time.perf_counter()
+                serialWriteNumToByte(port, token, list(data))
+                port.main_engine.flush()    # count the time until the bytes have left the host
+                seconds.append(time.perf_counter() - startTime)
+                if args.port:
+                    printSerialMessage(port, token)    # let the robot finish before the next upload
+            size = port.bytesSent
+            results.append({
+                'skill': os.path.basename(fileName)[:-3],
+                'token': token,
+                'bytes': size,
+                'policy': policy,
+                'seconds': min(seconds),
+                'lineSeconds': size / lineBytesPerSecond,
+            })
+            print(f"{results[-1]['skill']:32} {policy:7} {size:6} bytes {min(seconds) * 1000:9.2f} ms")
+    port.Close_Engine()
+    return {'benchmark': 'upload', 'port': args.port or 'pty', 'rate': args.rate, 'results': results}
+
+
+def legacyWriteNumToByte(port, token, var=None):
+    # serialWriteNumToByte() before commandEncoder, without the write, kept as the baseline
+    logger.debug(f'serialWriteNumToByte, token={token}, var={var}')
+    in_str = ""
+    if var is None:
+        var = []
+    if token == 'K':
+        period = var[0]
+        if period > 0:
+            skillHeader = 4
+        else:
+            skillHeader = 7
+        if period > 1:
+            frameSize = 8  # gait
+        elif period == 1:
+            frameSize = 16  # posture
+        else:
+            frameSize = 20  # behavior
+        angleRatio = 1
+        for row in range(abs(period)):
+            for angle in var[skillHeader + row * frameSize:skillHeader + row * frameSize + min(16, frameSize)]:
+                if angle > 125 or angle < -125:
+                    angleRatio = 2
+                    break
+            if angleRatio == 2:
+                break
+        if angleRatio == 2:
+            var[3] = 2
+            for row in range(abs(period)):
+                for i in range(skillHeader + row * frameSize, skillHeader + row * frameSize + min(16, frameSize)):
+                    var[i] //= 2
+        var = list(map(int, var))
+        in_str = token.encode() + struct.pack('b' * len(var), *var) + '~'.encode()
+    elif token.isupper():
+        message = list(map(int, var))
+        if token == 'B':
+            for l in range(len(message) // 2):
+                message[l * 2 + 1] *= 8
+                logger.debug(f"{message[l * 2]},{message[l * 2 + 1]}")
+        if token == 'W' or token == 'C':
+            in_str = struct.pack('B' * len(message), *message)
+        else:
+            in_str = struct.pack('b' * len(message), *message)
+        in_str = token.encode() + in_str + '~'.encode()
+    else:
+        message = ""
+        for element in var:
+            message += (str(round(element)) + " ")
+        in_str = token.encode() + encode(message) + '\n'.encode()
+    logger.debug(f"!!!! {in_str}")
+    return in_str
+
+
+class NullPort:
+    # takes the bytes and throws them away, so only the encoding is timed
+    port = 'null'
+
+    def Send_data(self, data):
+        self.data = data
+
+
+def encodeCases():
+    cases = [
+        ['L', [30] * 16],
+        ['I', [0, 45, 1, -30, 2, 60]],
+        ['i', [0, 45, 1, -30, 2, 60]],
+        ['m', [0, -20]],
+        ['C', [0, 255, 0, 1, 0]],
+        ['W', [100, 9, 1, 100, 8, 0]],
+        ['B', [14, 4, 14, 4, 21, 4, 21, 4]],
+    ]
+    for fileName in skillLibraryFiles():
+        token, data = loadSkillFile(fileName)
+        if token == 'K':
+            cases.append([token, data])
+    return cases
+
+
+encodeTarget = 10    # the speedup over the legacy encoding that was asked for
+
+
+def benchEncode(args):
+    port = NullPort()
+    setWritePolicy(port, 'single')
+    setKeyframeTolerance(0)    # the encoding alone, as the legacy code did. benchmark.py decimate times the decimation
+    results = []
+    for token, var in encodeCases():
+        if token == 'K':
+            rescaleSkill(var)
+        timing = {}
+        encoder = (lambda port, token, var: rescaleSkill(var) or encodeCommand(token, var)) if token == 'K' else \
+            (lambda port, token, var: encodeCommand(token, var))
+        for name, function in [['legacy', legacyWriteNumToByte], ['cached', serialWriteNumToByte], ['encoder', encoder]]:
+            best = float('inf')
+            for r in range(args.repeat):
+                startTime = time.perf_counter()
+                for n in range(args.number):
+                    function(port, token, var)
+                best = min(best, (time.perf_counter() - startTime) / args.number)
+            timing[name] = best
+        results.append({
+            'token': token,
+            'length': len(var),
+            'legacySeconds': timing['legacy'],
+            'cachedSeconds': timing['cached'],
+            'encoderSeconds': timing['encoder'],
+            'speedup': timing['legacy'] / timing['cached'],
+            'encoderSpeedup': timing['legacy'] / timing['encoder'],
+        })
+        print(f"{token} {len(var):5} values  legacy {timing['legacy'] * 1e6:8.2f} us  "
+              f"cached {timing['cached'] * 1e6:8.2f} us  x{results[-1]['speedup']:.1f}  "
+              f"encoder alone {timing['encoder'] * 1e6:8.2f} us  x{results[-1]['encoderSpeedup']:.1f}")
+    met = sum(1 for result in results if result['speedup'] >= encodeTarget)
+    metAlone = sum(1 for result in results if result['encoderSpeedup'] >= encodeTarget)
+    print(f"x{encodeTarget} target: met by {met} of {len(results)} commands through serialWriteNumToByte, "
+          f"{metAlone} with the encoder alone")
+    return {'benchmark': 'encode', 'target': encodeTarget, 'results': results}
+
+
+def legacyRescaleSkill(var):
+    # the angle ratio check of serialWriteNumToByte() before halveLargeAngles(), one value at a time
+    period = var[0]
+    skillHeader = 4 if period > 0 else 7
+    if period > 1:
+        frameSize = 8
+    elif period == 1:
+        frameSize = 16
+    else:
+        frameSize = 20
+    angleRatio = 1
+    for row in range(abs(period)):
+        for angle in var[skillHeader + row * frameSize:skillHeader + row * frameSize + min(16, frameSize)]:
+            if angle > 125 or angle < -125:
+                angleRatio = 2
+                break
+        if angleRatio == 2:
+            break
+    if angleRatio == 2:
+        var[3] = 2
+        for row in range(abs(period)):
+            for i in range(skillHeader + row * frameSize, skillHeader + row * frameSize + min(16, frameSize)):
+                var[i] //= 2
+    return angleRatio == 2
+
+
+def legacySplitTaskForLargeAngles(task):
+    # splitTaskForLargeAngles() before splitLargeAngles(), joint by joint
+    queue = []
+    var = task[1]
+    indexedList = []
+    for i in range(4):
+        for j in range(4):
+            angle = var[4 * j + i]
+            if angle < -125 or angle > 125:
+                indexedList += [4 * j + i, angle]
+                var[4 * j + i] = max(min(angle, 125), -125)
+    queue.append(['L', var, task[-1]])
+    if len(indexedList):
+        queue[0][-1] = 0.01
+        queue.append(['i', indexedList, task[-1]])
+    return queue
+
+
+def timeBest(function, makeArgument, repeat):
+    best = float('inf')
+    for r in range(repeat):
+        argument = makeArgument()
+        startTime = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - startTime)
+    return best
+
+
+def benchRescale(args):
+    # rescaleSkill() and splitTaskForLargeAngles() against the legacy loops. tests/test_skill.py checks what they give
+    import random
+    generator = random.Random(args.seed)
+    longFile = os.path.join(skillLibraryDir, 'Bittle', 'longPushUps_125frames.md')
+    longSkill = loadSkillFile(longFile)[1] if os.path.exists(longFile) else \
+        max((entry.skill.toList() for entry in library().entries(kind='behavior')), key=len)
+    timings = []
+    bigAngles = longSkill[:7] + [v * 2 if (n % 20) < 16 else v for n, v in enumerate(longSkill[7:])]
+    largeL = [generator.randint(-200, 200) for j in range(16)]
+    for name, legacyFunction, function, makeArgument in [
+        ['rescale, no halving', legacyRescaleSkill, rescaleSkill, lambda: list(longSkill)],
+        ['rescale, halving', legacyRescaleSkill, rescaleSkill, lambda: list(bigAngles)],
+        ['split L', lambda task: legacySplitTaskForLargeAngles(task), splitTaskForLargeAngles,
+         lambda: ['L', list(largeL), 0]],
+    ]:
+        legacySeconds = timeBest(legacyFunction, makeArgument, args.repeat)
+        seconds = timeBest(function, makeArgument, args.repeat)
+        timings.append({'case': name, 'legacySeconds': legacySeconds, 'seconds': seconds})
+        print(f"{name:20} legacy {legacySeconds * 1e6:8.1f} us  now {seconds * 1e6:8.1f} us  "
+              f"x{legacySeconds / seconds:.1f}")
+    return {'benchmark': 'rescale', 'timings': timings}
+
+
+def startEmulator(model='Bittle', options=()):
+    # run emulator.py in its own process so its CPU time is not counted here
+    emulator = subprocess.Popen([sys.executable, os.path.join(serialMasterDir, 'emulator.py'), '--model', model]
+                                + list(options), stdout=subprocess.PIPE, text=True)
+    portName = emulator.stdout.readline().split()[-1]
+    return emulator, portName
+
+
+def openEmulatorPort(portName):
+    port = Communication(portName, 115200, 1)
+    port.Start_Reader()
+    time.sleep(1)    # let the boot messages arrive
+    port.Flush_Input()
+    return port
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def tokenClassTasks(count):
+    # [token class, tasks]. the angles change so every command moves the joints
+    return [
+        ['k', [['kbalance', 0], ['ksit', 0]] * (count // 4)],
+        ['i', [['i', [0, 30 * (n % 2), 1, -20 * (n % 2)], 0] for n in range(count)]],
+        ['I', [['I', [8, 30 + 10 * (n % 2), 9, 30 + 10 * (n % 2)], 0] for n in range(count)]],
+        ['m', [['m', [0, 30 * (n % 2)], 0] for n in range(count)]],
+        ['L', [['L', [30 * (n % 2)] * 8 + [30 + 10 * (n % 2)] * 8, 0] for n in range(count)]],
+        ['?', [['?', 0]] * count],
+    ]
+
+
+def measure(function, tasks):
+    latencies = []
+    failures = 0
+    cpuStart = time.process_time()
+    wallStart = time.perf_counter()
+    for task in tasks:
+        startTime = time.perf_counter()
+        result = function(copy.deepcopy(task))
+        latencies.append(time.perf_counter() - startTime)
+        if isinstance(result, dict):
+            failures += list(result.values()).count(-1)
+        elif result == -1:
+            failures += 1
+    cpuTime = time.process_time() - cpuStart
+    seconds = time.perf_counter() - wallStart
+    return {
+        'count': len(tasks),
+        'failures': failures,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'mean': sum(latencies) / len(latencies),
+        'cpuPerCommand': cpuTime / len(tasks),
+        'commandsPerSecond': len(tasks) / seconds,
+    }
+
+
+def measurePipelined(port, tasks):
+    # latency is from submitting a command to its echo
+    latencies = []
+    results = []
+    cpuStart = time.process_time()
+    startTime = time.perf_counter()
+    for task in tasks:
+        submitTime = time.perf_counter()
+        future = sendPipelined([port], copy.deepcopy(task))[port]
+        future.add_done_callback(lambda f, t=submitTime: latencies.append(time.perf_counter() - t))
+        results.append(future)
+    drainPipelines([port])
+    seconds = time.perf_counter() - startTime
+    cpuTime = time.process_time() - cpuStart
+    return {
+        'count': len(tasks),
+        'failures': sum(future.result() == -1 for future in results),
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'mean': sum(latencies) / len(latencies),
+        'cpuPerCommand': cpuTime / len(tasks),
+        'commandsPerSecond': len(tasks) / seconds,
+    }
+
+
+def report(results, name, token, stats):
+    stats.update({'function': name, 'token': token})
+    results.append(stats)
+    print(f"{name:18} {token:3} p50 {stats['p50'] * 1000:8.2f} ms  p99 {stats['p99'] * 1000:8.2f} ms  "
+          f"cpu {stats['cpuPerCommand'] * 1000:6.2f} ms/cmd  {stats['commandsPerSecond']:6.1f} cmd/s  "
+          f"failures {stats['failures']}")
+
+
+def instinctUploads():
+    # postures and gaits of the firmware, so the echo comes right after the data is taken
+    from emulator import loadInstinct
+    skills = loadInstinct('Bittle')
+    return [[name, skills[name]] for name in ['balance', 'sit', 'wkF', 'trF', 'crF', 'bk', 'bdF'] if name in skills]
+
+
+def benchSerial(args):
+    emulators = [startEmulator(), startEmulator()]
+    ports = [openEmulatorPort(portName) for emulator, portName in emulators]
+    results = []
+    uploads = []
+    try:
+        goodPorts.clear()
+        goodPorts[ports[0]] = 'emulator0'
+        for token, tasks in tokenClassTasks(args.count):
+            report(results, 'sendTask', token, measure(lambda task: sendTask(goodPorts, ports[0], task), tasks))
+            report(results, 'send', token, measure(lambda task: send(goodPorts, task), tasks))
+
+        goodPorts[ports[1]] = 'emulator1'
+        for token, tasks in tokenClassTasks(args.count):
+            if token != 'k':
+                report(results, 'sendTaskParallel', token,
+                       measure(lambda task: sendTaskParallel(list(goodPorts), task), tasks))
+        goodPorts.pop(ports[1])
+
+        # the window of the pipeline against sendTask on the same commands
+        for window in [1, 2, 3]:
+            setPipelineWindow(ports[0], window)
+            for token, tasks in tokenClassTasks(args.count):
+                if token in 'iI':
+                    report(results, f'sendPipelined/{window}', token, measurePipelined(ports[0], tasks))
+        setPipelineWindow(ports[0], defaultPipelineWindow)
+
+        schedule = [['kbalance', 1], ['i', [0, 30, 1, 20], 0.5], ['L', [0] * 16, 0.5], ['m', [0, -30, 0, 30], 0.5]]
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = measure(lambda task: schedulerToSkill(goodPorts, task), [schedule] * max(1, args.count // 10))
+        report(results, 'schedulerToSkill', 'K', stats)
+
+        for name, data in instinctUploads():
+            stats = measure(lambda task: sendTask(goodPorts, ports[0], task), [['K', data, 0]] * 3)
+            size = len(data) + 2
+            uploads.append({'skill': name, 'bytes': size, 'seconds': stats['p50'],
+                            'bytesPerSecond': size / stats['p50'], 'failures': stats['failures']})
+            print(f"K {name:10} {size:5} bytes {stats['p50'] * 1000:8.2f} ms {uploads[-1]['bytesPerSecond']:9.0f} bytes/s")
+    finally:
+        goodPorts.clear()
+        for port in ports:
+            closePipeline(port)
+            port.Close_Engine()
+
+    if not args.skip_bittygpt:
+        command = [sys.executable, os.path.abspath(__file__), 'robotcontroller', '--port', emulators[1][1],
+                   '--count', str(args.count)]
+        # ardSerial finds ../pyUI from the working directory, so run next to it
+        output = subprocess.run(command, cwd=bittyGPTDir, capture_output=True, text=True)
+        if output.returncode == 0:
+            for stats in json.loads(output.stdout.splitlines()[-1])['results']:
+                report(results, stats.pop('function'), stats.pop('token'), stats)
+        else:
+            print('RobotController.send failed:\n' + output.stderr)
+
+    for emulator, portName in emulators:
+        emulator.terminate()
+    return {'benchmark': 'serial', 'count': args.count, 'results': results, 'uploads': uploads}
+
+
+def choreographySchedule(rounds):
+    from emulator import loadInstinct
+    skills = loadInstinct('Bittle')
+    schedule = []
+    for n in range(rounds):
+        schedule += [
+            ['kbalance', 0.2],
+            ['i', [0, 30, 1, -20], 0.1],
+            ['m', [0, -30, 0, 30], 0.1],
+            ['L', [0, 0, 0, 0, 0, 0, 0, 0, 30, 30, 30, 30, 30, 30, 30, 30], 0.1],
+            ['I', [8, 40, 9, 40], 0.1],
+            ['K', copy.deepcopy(skills['wkF']), 0.5],
+            ['ksit', 0.2],
+        ]
+    return schedule
+
+
+def benchChoreography(args):
+    from choreography import playChoreography
+    emulators = [startEmulator() for n in range(args.robots)]
+    ports = [openEmulatorPort(portName) for emulator, portName in emulators]
+    try:
+        goodPorts.clear()
+        for n in range(len(ports)):
+            goodPorts[ports[n]] = 'emulator' + str(n)
+        schedule = choreographySchedule(args.rounds)
+        startTime = time.perf_counter()
+        played = playChoreography(goodPorts, schedule)
+        seconds = time.perf_counter() - startTime
+    finally:
+        goodPorts.clear()
+        for port in ports:
+            closePortWorker(port)
+            port.Close_Engine()
+        for emulator, portName in emulators:
+            emulator.terminate()
+    skews = played['skews']
+    result = {
+        'benchmark': 'choreography',
+        'robots': args.robots,
+        'steps': len(skews),
+        'seconds': seconds,
+        'skewP50': percentile(skews, 0.5),
+        'skewP99': percentile(skews, 0.99),
+        'skewMax': played['maxSkew'],
+        'failures': sum(played['failures'].values()),
+    }
+    print(f"{args.robots} robots, {len(skews)} steps in {seconds:.2f} s: skew p50 {result['skewP50'] * 1000:.2f} ms "
+          f"p99 {result['skewP99'] * 1000:.2f} ms max {result['skewMax'] * 1000:.2f} ms, failures {result['failures']}")
+    return result
+
+
+def legacyTestPort(PortList, serialObject, p):
+    # testPort() before the handshake: 3 s, and 2 s more if the robot prints anything, before asking '?'
+    serialObject.Start_Reader()
+    time.sleep(3)
+    if serialObject.Flush_Input() != '':
+        time.sleep(2)
+        waitTime = 3
+    else:
+        waitTime = 2
+    if sendTask(PortList, serialObject, ['?', 0], waitTime) != -1:
+        PortList.update({serialObject: p})
+
+
+startupCases = [
+    # [name, emulator.py options, seconds between starting the emulator and opening the port]
+    ['up', [], 1.5],    # running for a while. its boot messages wait in the port
+    ['booting', ['--boot-ms', '1000', '--setup-ms', '1500'], 0],    # powered on while the port is opened
+]
+
+
+def timeStartup(probe, options, settle):
+    emulator, portName = startEmulator(options=options)
+    try:
+        time.sleep(settle)
+        found = {}
+        startTime = time.perf_counter()
+        port = Communication(portName, 115200, 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            probe(found, port, portName)
+        seconds = time.perf_counter() - startTime
+        port.Close_Engine()
+    finally:
+        emulator.terminate()
+    return seconds, port in found
+
+
+def joinAllCheckPortList(PortList, allPorts):
+    # checkPortList() before it returned at the first robot: it waited for the test of every port
+    threads = []
+    for p in allPorts:
+        t = threading.Thread(target=testPort, args=(PortList, Communication(p, 115200, 1), p.split('/')[-1]))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join(8)
+
+
+def timeSilentStartup(check):
+    # a robot that is up and a port that never sends a byte, like the ttyS0 of most Linux PCs
+    import pty
+    emulator, portName = startEmulator()
+    master, slave = pty.openpty()
+    try:
+        time.sleep(1.5)
+        found = {}
+        startTime = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            check(found, [os.ttyname(slave), portName])
+        seconds = time.perf_counter() - startTime
+        robots = [port for port in found if port.port == portName]
+        with contextlib.redirect_stdout(io.StringIO()):
+            time.sleep(silentTimeout + 0.5)    # let the silent port give up before closing everything
+        for port in list(found):
+            closePortWorker(port)
+            port.Close_Engine()
+    finally:
+        emulator.terminate()
+        os.close(master)
+        os.close(slave)
+    return seconds, len(robots) == 1
+
+
+def benchStartup(args):
+    results = []
+    for name, options, settle in startupCases:
+        for function, probe in [['legacyTestPort', legacyTestPort], ['testPort', testPort]]:
+            times = []
+            failures = 0
+            for n in range(args.repeat):
+                seconds, found = timeStartup(probe, options, settle)
+                times.append(seconds)
+                if not found:
+                    failures += 1
+            results.append({'case': name, 'function': function, 'p50': percentile(times, 0.5),
+                            'max': max(times), 'failures': failures})
+            print(f"{name:8} {function:15} p50 {results[-1]['p50']:6.2f} s  max {results[-1]['max']:6.2f} s  "
+                  f"failures {failures}")
+    for function, check in [['joinAll', joinAllCheckPortList], ['checkPortList', checkPortList]]:
+        times = []
+        failures = 0
+        for n in range(args.repeat):
+            seconds, found = timeSilentStartup(check)
+            times.append(seconds)
+            if not found:
+                failures += 1
+        results.append({'case': 'silent', 'function': function, 'p50': percentile(times, 0.5), 'max': max(times),
+                        'failures': failures})
+        print(f"{'silent':8} {function:15} p50 {results[-1]['p50']:6.2f} s  max {results[-1]['max']:6.2f} s  "
+              f"failures {failures}")
+    return {'benchmark': 'startup', 'repeat': args.repeat, 'results': results}
+
+
+uiTick = 0.01    # seconds between the heartbeats on the mainloop of the ui benchmark
+uiTasks = [['kbalance', 0], ['ksit', 0], ['g', 0], ['g', 0]]
+
+
+def timeMainloop(root, handlers, interval):
+    # fires the handlers interval seconds apart on the Tcl event loop of root, like button clicks, and runs the loop
+    # until each has reported its result. returns [stalls, seconds]: how late each heartbeat was, and the total time
+    results = []
+    stalls = []
+    state = {'last': time.monotonic(), 'done': False}
+
+    def heartbeat():
+        now = time.monotonic()
+        stalls.append(max(0, now - state['last'] - uiTick))
+        state['last'] = now
+        if not state['done']:
+            root.after(int(uiTick * 1000), heartbeat)
+
+    for n in range(len(handlers)):
+        root.after(int(n * interval * 1000), handlers[n], results.append)
+    root.after(int(uiTick * 1000), heartbeat)
+    startTime = time.monotonic()
+    while len(results) < len(handlers):
+        root.tk.dooneevent()
+    state['done'] = True
+    stalls.append(max(0, time.monotonic() - state['last'] - uiTick))    # the last handler may have blocked
+    return stalls, time.monotonic() - startTime
+
+
+def benchUI(args):
+    import tkinter
+    from uiDispatcher import UIDispatcher
+    # a window if there is a display, otherwise only the Tcl event loop, which runs after() the same way
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        root = tkinter.Tcl()
+    emulator, portName = startEmulator()
+    cases = [
+        ['emulator', openEmulatorPort(portName), args.count],
+        ['unplugged', openSink(), args.unplugged],    # nothing answers, so every command waits for its timeout
+    ]
+    results = []
+    try:
+        for name, port, count in cases:
+            ports = {port: name}
+            tasks = [uiTasks[n % len(uiTasks)] for n in range(count)] if name == 'emulator' else [['g', 0]] * count
+            dispatcher = UIDispatcher(root)
+            ways = [
+                ['send', [lambda report, task=task: report(send(ports, task)) for task in tasks]],
+                ['UIDispatcher', [lambda report, task=task: dispatcher.send(ports, task, callback=report)
+                                  for task in tasks]],
+            ]
+            for way, handlers in ways:
+                stalls, seconds = timeMainloop(root, handlers, args.interval / 1000)
+                results.append({'case': name, 'way': way, 'commands': count, 'seconds': seconds,
+                                'stallMax': max(stalls), 'stallTotal': sum(stalls),
+                                'stallP99': percentile(stalls, 0.99)})
+                print(f"{name:9} {way:12} {count:3} commands in {seconds:6.2f} s: mainloop stalled "
+                      f"{results[-1]['stallTotal']:6.3f} s in total, max {results[-1]['stallMax'] * 1000:7.1f} ms, "
+                      f"p99 {results[-1]['stallP99'] * 1000:6.1f} ms")
+            dispatcher.close(10)
+            closePortWorker(port)
+            port.Close_Engine()
+    finally:
+        emulator.terminate()
+        if isinstance(root, tkinter.Tk) and root.tk.call('info', 'commands', 'destroy'):
+            root.destroy()
+    return {'benchmark': 'ui', 'interval': args.interval, 'results': results}
+
+
+def benchRobotController(args):
+    # BittyGPT has its own SerialCommunication module, so this runs in a process of its own
+    sys.modules.pop('SerialCommunication', None)
+    sys.path.insert(0, bittyGPTDir)
+    import SerialCommunication as bittyGPTSerial
+    from RobotController import RobotController
+    controller = RobotController()
+    port = bittyGPTSerial.Communication(args.port, 115200, 1)
+    port.start_reader()
+    time.sleep(1)
+    port.flush_input()
+    results = []
+    for token, tasks in tokenClassTasks(args.count):
+        stats = measure(lambda task: controller.send(port, task), tasks)
+        stats.update({'function': 'RobotController.send', 'token': token})
+        results.append(stats)
+    port.close_engine()
+    print(json.dumps({'results': results}))
+
+
+def legacySchedulerToSkill(testSchedule):
+    # the frames of schedulerToSkill() before scheduleCompiler, without the prints and the send
+    compactSkillData = []
+    newSkill = []
+    for task in testSchedule:
+        token = task[0][0]
+        if token == 'k' and postureAngles(task[0][1:]) is not None:
+            currentRow = postureAngles(task[0][1:])
+            skillRow = copy.deepcopy(currentRow)
+            compactSkillData.append(skillRow + [8, int(task[1] * 1000 / 500), 0, 0])
+            newSkill = newSkill + skillRow + [8, int(task[1] * 1000 / 500), 0, 0]
+        elif token == 'i' or token == 'I':
+            currentRow = copy.deepcopy(skillRow)
+            for e in range(0, len(task[1]), 2):
+                currentRow[task[1][e]] = task[1][e + 1]
+            skillRow = copy.deepcopy(currentRow)
+            compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
+            newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
+        elif token == 'L':
+            skillRow = copy.deepcopy(task[1][:16])
+            compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
+            newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
+        elif token == 'm':
+            currentRow = copy.deepcopy(skillRow)
+            for e in range(0, len(task[1]), 2):
+                currentRow[task[1][e]] = task[1][e + 1]
+                skillRow = copy.deepcopy(currentRow)
+                compactSkillData.append(skillRow + [8, int(task[2] * 1000 / 500), 0, 0])
+                newSkill = newSkill + skillRow + [8, int(task[2] * 1000 / 500), 0, 0]
+    return Skill.fromFrames(compactSkillData, loop=[0, 0, 0])
+
+
+def demoSchedule(fileName):
+    # the testSchedule list of a demo script
+    import ast
+    with open(fileName, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and any(getattr(t, 'id', '') == 'testSchedule' for t in node.targets):
+            return ast.literal_eval(node.value)
+    return []
+
+
+def randomSchedule(generator, length):
+    tokens = ['kbalance', 'ksit', 'kstr', 'i', 'I', 'm', 'L']
+    schedule = [['kbalance', 1]]
+    for n in range(length):
+        token = generator.choice(tokens)
+        delay = generator.choice([0, 0, 0.1, 0.5, 1, 2])
+        if token[0] == 'k':
+            schedule.append([token, delay])
+        elif token == 'L':
+            schedule.append(['L', [generator.randint(-90, 90) for j in range(16)], delay])
+        else:
+            joints = generator.sample(range(16), generator.randint(1, 3))
+            schedule.append([token, [v for j in joints for v in [j, generator.randint(-90, 90)]], delay])
+    return schedule
+
+
+def benchSchedule(args):
+    # compileSchedule() against the legacy loop on the demo and a random schedule. tests/test_scheduleCompiler.py
+    # checks where the skills end
+    import random
+    generator = random.Random(args.seed)
+    cases = [['climbCeiling', demoSchedule(os.path.join(serialMasterDir, 'demos', 'climbCeiling.py'))],
+             [f'random {args.length} tasks', randomSchedule(generator, args.length)]]
+    results = []
+    for name, schedule in cases:
+        skill = compileSchedule(schedule, postureAngles)
+        legacy = legacySchedulerToSkill(schedule)
+        legacySeconds = timeBest(legacySchedulerToSkill, lambda: schedule, args.repeat)
+        seconds = timeBest(lambda schedule: compileSchedule(schedule, postureAngles), lambda: schedule, args.repeat)
+        results.append({'case': name, 'legacyFrames': legacy.frameCount, 'frames': skill.frameCount,
+                        'legacyBytes': len(legacy.encode()), 'bytes': len(skill.encode()),
+                        'legacySeconds': legacySeconds, 'seconds': seconds})
+        print(f"{name:20} frames {legacy.frameCount:3} -> {skill.frameCount:3}  bytes {len(legacy.encode()):5} -> "
+              f"{len(skill.encode()):5}  legacy {legacySeconds * 1e6:8.1f} us  now {seconds * 1e6:8.1f} us  "
+              f"x{legacySeconds / seconds:.1f}")
+    return results
+
+
+def benchLibrary(args):
+    import tempfile
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        startTime = time.perf_counter()
+        lib = SkillLibrary(directory=directory)
+        lib.refresh()
+        results.append(['build the index', time.perf_counter() - startTime])
+        count = len(lib.entries())
+
+        seconds = []
+        for r in range(args.repeat):
+            startTime = time.perf_counter()
+            parsed = [record for fileName in lib.sourceFiles() for record in parseSource(fileName)]
+            seconds.append(time.perf_counter() - startTime)
+        results.append(['parse every file', min(seconds)])
+
+        seconds = []
+        for r in range(args.repeat):
+            startTime = time.perf_counter()
+            warm = SkillLibrary(directory=directory)    # a new process: map the index and check the file times
+            warm.entries()
+            seconds.append(time.perf_counter() - startTime)
+        results.append(['open the index', min(seconds)])
+
+        names = [[entry.name, entry.model] for entry in lib.entries()]
+        startTime = time.perf_counter()
+        for r in range(args.repeat):
+            for name, model in names:
+                lib.skill(name, model)
+        results.append(['look up a skill', (time.perf_counter() - startTime) / args.repeat / len(names)])
+
+        fileName = lib.sourceFiles()[-1]
+        os.utime(fileName)
+        startTime = time.perf_counter()
+        reparsed = lib.refresh()
+        results.append([f'refresh after {reparsed} file changed', time.perf_counter() - startTime])
+    print(f"{count} skills in {len(lib.sourceFiles())} files, {len(parsed)} arrays parsed")
+    for name, second in results:
+        print(f"{name:30} {second * 1000:8.3f} ms")
+    return [{'case': name, 'seconds': second} for name, second in results]
+
+
+def benchDecimate(args):
+    # the behaviors of the SkillLibrary files, the Instinct headers and the example scripts, not the exported ones.
+    # tests/test_skillTransform.py checks them against the steps of the firmware
+    skills = [[entry.model + '/' + entry.name, entry.skill] for entry in library().entries(kind='behavior')
+              if not entry.source.startswith(configDir)]
+    frames = sum(skill.frameCount for name, skill in skills)
+    size = sum(len(skill.encode()) for name, skill in skills)
+    results = []
+    for tolerance in args.tolerance:
+        decimated = [[name, skill, decimateSkill(skill, tolerance)] for name, skill in skills]
+        seconds = timeBest(lambda skills: [decimateSkill(skill, tolerance) for name, skill in skills],
+                           lambda: skills, args.repeat)
+        keptFrames = sum(smaller.frameCount for name, skill, smaller in decimated)
+        keptSize = sum(len(smaller.encode()) for name, skill, smaller in decimated)
+        changed = [f"{name} {skill.frameCount}->{smaller.frameCount}" for name, skill, smaller in decimated
+                   if smaller.frameCount < skill.frameCount]
+        results.append({'tolerance': tolerance, 'behaviors': len(skills), 'frames': frames, 'keptFrames': keptFrames,
+                        'bytes': size, 'keptBytes': keptSize, 'seconds': seconds})
+        print(f"within {tolerance:2} degrees: frames {frames} -> {keptFrames}  bytes {size} -> {keptSize}  "
+              f"{seconds * 1000:.1f} ms")
+        if args.verbose:
+            print('    ' + ', '.join(changed))
+    return results
+
+
+def legacyResample(skill, newFrames, model):
+    # the angles of resampleSkill() one frame and one joint at a time, to time it against.
+    # tests/test_skillTransform.py checks it against them
+    periodic = skill.kind == 'gait'
+    rows = [skill.frameValues(f)[:skill.angleColumns] for f in range(skill.frameCount)]
+    n = skill.frameCount
+    limits = limitsOf(model)[skill.firstJoint:]
+    resampled = []
+    for i in range(newFrames):
+        t = i * n / newFrames if periodic else i * (n - 1) / (newFrames - 1)
+        k = min(int(t), n - 1)
+        u = t - k
+        row = []
+        for c in range(skill.angleColumns):
+            def angle(f):
+                return rows[f % n][c] if periodic else rows[max(0, min(n - 1, f))][c]
+            p0, p1, p2, p3 = angle(k - 1), angle(k), angle(k + 1), angle(k + 2)
+            value = p1 + u * (p2 - p0) / 2 + u ** 2 * (2 * p0 - 5 * p1 + 4 * p2 - p3) / 2 + \
+                u ** 3 * (3 * p1 - p0 - 3 * p2 + p3) / 2
+            row.append(max(limits[c][0], min(limits[c][1], int(math.floor(value + 0.5)))))
+        resampled.append(row)
+    return resampled
+
+
+def benchResample(args):
+    # the gaits and behaviors of the SkillLibrary files, the Instinct headers and the example scripts
+    entries = [entry for kind in ['gait', 'behavior'] for entry in library().entries(kind=kind)
+               if not entry.source.startswith(configDir)]
+    skills = [[entry.model + '/' + entry.name, entry.model, entry.skill] for entry in entries]
+    seconds = timeBest(lambda factors: scaleLibrary(factors, kinds=('gait', 'behavior')), lambda: args.factors,
+                       args.repeat)
+    stdlibSeconds = None
+    if skillTransform.numpy is not None:    # the same library without NumPy, one joint column at a time
+        numpyModule, skillTransform.numpy = skillTransform.numpy, None
+        try:
+            stdlibSeconds = timeBest(lambda factors: scaleLibrary(factors, kinds=('gait', 'behavior')),
+                                     lambda: args.factors, args.repeat)
+        finally:
+            skillTransform.numpy = numpyModule
+    legacySeconds = timeBest(lambda factors: [legacyResample(skill, max(2, min(127, int(skill.frameCount * factor + 0.5))),
+                                                             model) for name, model, skill in skills for factor in factors],
+                             lambda: args.factors, args.repeat)
+    count = len(skills) * len(args.factors)
+    print(f"{count} variants of {len(skills)} gaits and behaviors: frame by frame {legacySeconds * 1000:.1f} ms  "
+          f"scaleLibrary {seconds * 1000:.1f} ms  x{legacySeconds / seconds:.1f}")
+    if stdlibSeconds is not None:
+        print(f"scaleLibrary without NumPy {stdlibSeconds * 1000:.1f} ms, with it x{stdlibSeconds / seconds:.1f}")
+    return [{'variants': count, 'seconds': seconds, 'legacySeconds': legacySeconds, 'stdlibSeconds': stdlibSeconds}]
+
+
+def planarFoot(model, leg, angles):
+    # a foot of the URDF worked out in the plane of its leg, one joint at a time, to time kinematics.py against.
+    # tests/test_kinematics.py checks it against them:
+    # from the shoulder the upper leg points down at 0 and turns to the tail, the lower leg to the head at 0
+    import kinematics
+    [shoulderIndex, shoulderName], [kneeIndex, kneeName] = kinematics.legJoints[leg]
+    upper = abs(model.knees[leg][1, 3])
+    lower = abs(model.tips[leg][1])
+    theta = math.radians(angles[shoulderIndex])
+    phi = theta + math.radians(angles[kneeIndex])
+    x, y, z = model.shoulders[leg][:3, 3]
+    return [x + model.knees[leg][0, 3], y - upper * math.sin(theta) + lower * math.cos(phi),
+            z - upper * math.cos(theta) - lower * math.sin(phi)]
+
+
+def benchKinematics(args):
+    import kinematics
+    model = kinematics.LegModel()
+    skills = [[entry.model + '/' + entry.name, entry.skill] for entry in library().entries(args.model, 'gait')]
+    angles = [kinematics.skillAngles(skill) for name, skill in skills]
+    count = sum(skill.frameCount for name, skill in skills)
+    legacySeconds = timeBest(lambda angles: [planarFoot(model, leg, frame) for frames in angles for frame in frames
+                                             for leg in range(4)], lambda: angles, args.repeat)
+    seconds = timeBest(lambda angles: kinematics.libraryMetrics(args.model, 'gait', model), lambda: angles,
+                       args.repeat)
+    print(f"{len(skills)} gaits, {count} frames: foot by foot {legacySeconds * 1000:.1f} ms  "
+          f"libraryMetrics() with the lookups and the metrics {seconds * 1000:.1f} ms  x{legacySeconds / seconds:.1f}")
+    return [{'gaits': len(skills), 'frames': count, 'seconds': seconds, 'legacySeconds': legacySeconds}]
+
+
+def benchIK(args):
+    # tests/test_kinematics.py checks the solved legs against the feet they should reach
+    import kinematics
+    results = []
+    for model in ['Bittle', 'Nybble']:
+        solver = kinematics.BodyPoseSolver(model)
+        posture = library().skill('balance', model).frameValues(0)
+        dial = list(range(-40, 41))
+        oneByOne = timeBest(lambda poses: [solver.solve(posture, [pose]) for pose in poses],
+                            lambda: [[0, p, 0, 0, 0, 0] for p in dial], args.repeat)
+        batch = timeBest(lambda poses: solver.solve(posture, poses), lambda: [[0, p, 0, 0, 0, 0] for p in dial],
+                         args.repeat)
+        solver.cache.clear()
+        startTime = time.perf_counter()
+        solver.angles(posture, [0, 0, 0, 0, 0, 0], 1, dial)    # the first event of a drag
+        miss = time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        for p in dial:
+            solver.angles(posture, [0, p, 0, 0, 0, 0], 1, dial)
+        hit = (time.perf_counter() - startTime) / len(dial)
+        results.append({'model': model, 'oneByOne': oneByOne, 'batch': batch, 'miss': miss, 'hit': hit})
+        print(f"{model}: the {len(dial)} values of a dial one by one {oneByOne * 1000:.2f} ms, in one batch {batch * 1000:.2f} ms; "
+              f"a slider event {miss * 1000:.2f} ms on a miss, {hit * 1e6:.1f} us from the cache")
+    return results
+
+
+def benchVirtual(args):
+    # how much faster than the robot testSchedules play. tests/test_virtualRobot.py checks where they end
+    import random
+    from virtualRobot import VirtualRobot
+    generator = random.Random(args.seed)
+    cases = [['climbCeiling', demoSchedule(os.path.join(serialMasterDir, 'demos', 'climbCeiling.py'))]]
+    cases += [[f'random {args.length} tasks', randomSchedule(generator, args.length)] for n in range(args.random)]
+    wall = virtual = steps = 0
+    for name, schedule in cases:
+        startTime = time.perf_counter()
+        robot = VirtualRobot('Bittle')
+        robot.playSchedule(schedule)
+        wall += time.perf_counter() - startTime
+        virtual += robot.clock
+        steps += len(robot.times)
+    print(f"{len(cases)} schedules, {virtual:.1f} s of the robot and {steps} steps recorded in {wall * 1000:.0f} ms, "
+          f"x{virtual / wall:.0f} real time")
+    return [{'schedules': len(cases), 'robotSeconds': virtual, 'steps': steps, 'seconds': wall}]
+
+
+def benchPhysics(args):
+    # the fall screen of skillPhysics.py in one process and in a pool. tests/test_skillPhysics.py checks the model and
+    # the results
+    import skillPhysics
+    skillPhysics.requireMujoco()
+    jobs = skillPhysics.libraryJobs(args.model, ['gait', 'behavior', 'posture'])
+    startTime = time.perf_counter()
+    serial = skillPhysics.evaluateSkills(jobs, 1)
+    serialSeconds = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    skillPhysics.evaluateSkills(jobs, args.processes)
+    poolSeconds = time.perf_counter() - startTime
+    robotSeconds = sum(r['seconds'] for r in serial)
+    print(f"{len(jobs)} skills, {robotSeconds:.1f} s of the robot: in this process {serialSeconds:.1f} s "
+          f"x{robotSeconds / serialSeconds:.0f} real time, in a pool of {args.processes or os.cpu_count()} "
+          f"{poolSeconds:.1f} s x{robotSeconds / poolSeconds:.0f} real time")
+    print(f"{len([r for r in serial if r['fell']])} fell: " + ', '.join(r['name'] for r in serial if r['fell']))
+    return [{'skills': len(jobs), 'robotSeconds': robotSeconds, 'serialSeconds': serialSeconds,
+             'poolSeconds': poolSeconds}]
+
+
+def benchTiming(args):
+    # calibrate the timing model and time a demo with fixed and auto waits. tests/test_skillTiming.py checks the
+    # calibration and the predictions
+    import skillTiming
+    emulator, portName = startEmulator('Bittle', ['--step-ms', str(args.step_ms)])
+    port = openEmulatorPort(portName)
+    walls = {}
+    try:
+        goodPorts.clear()
+        goodPorts[port] = 'emulator'
+        calibration = skillTiming.calibrate(port)
+        schedule = demoSchedule(os.path.join(serialMasterDir, 'demos', 'climbCeiling.py'))
+        for mode in ['fixed', 'auto']:
+            setWaitMode(mode)
+            send(goodPorts, ['kbalance', 0.5])
+            startTime = time.perf_counter()
+            for task in schedule:
+                send(goodPorts, copy.deepcopy(task))
+            walls[mode] = time.perf_counter() - startTime
+    finally:
+        setWaitMode('fixed')
+        goodPorts.clear()
+        closePortWorker(port)
+        port.Close_Engine()
+        emulator.terminate()
+    print(f"calibrated step {calibration['stepSeconds'] * 1000:.3f} ms (emulator {args.step_ms} ms), command "
+          f"{calibration['commandSeconds'] * 1000:.2f} ms, largest error of the fit {calibration['residual'] * 1000:.1f} ms")
+    print(f"demos/climbCeiling.py: fixed waits {walls['fixed']:.2f} s, auto {walls['auto']:.2f} s, "
+          f"{(1 - walls['auto'] / walls['fixed']) * 100:.0f}% shorter")
+    return [{'stepSeconds': calibration['stepSeconds'], 'commandSeconds': calibration['commandSeconds'],
+             'fixedSeconds': walls['fixed'], 'autoSeconds': walls['auto']}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the serial path')
+    parser.add_argument('--json', help='write the results to this file')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    upload = subparsers.add_parser('upload', help='time to upload the SkillLibrary skills under each write policy')
+    upload.add_argument('--port', help='serial port of a robot. a local pseudo terminal is used if omitted')
+    upload.add_argument('--policy', nargs='+', default=['single', 'paced', 'sliced'],
+                        choices=['single', 'paced', 'sliced'])
+    upload.add_argument('--rate', type=int, default=defaultBytesPerSecond,
+                        help='bytes per second of the paced policy. 0 waits for out_waiting to drain instead')
+    upload.add_argument('--repeat', type=int, default=3)
+    upload.set_defaults(func=benchUpload)
+
+    encoder = subparsers.add_parser('encode', help='time to encode commands, before and after commandEncoder')
+    encoder.add_argument('--number', type=int, default=2000)
+    encoder.add_argument('--repeat', type=int, default=5)
+    encoder.set_defaults(func=benchEncode)
+
+    serialRoundTrip = subparsers.add_parser('serial', help='latency and CPU time of send, sendTask, sendTaskParallel, '
+                                                           'schedulerToSkill and RobotController.send against emulator.py')
+    serialRoundTrip.add_argument('--count', type=int, default=40, help='commands per token class')
+    serialRoundTrip.add_argument('--skip-bittygpt', action='store_true')
+    serialRoundTrip.set_defaults(func=benchSerial)
+
+    choreography = subparsers.add_parser('choreography', help='start skew of playChoreography() across emulators')
+    choreography.add_argument('--robots', type=int, default=10)
+    choreography.add_argument('--rounds', type=int, default=5, help='repeats of the 7 step schedule')
+    choreography.set_defaults(func=benchChoreography)
+
+    startup = subparsers.add_parser('startup', help='time for testPort() to find an emulated robot, and for checkPortList() '
+                                     'with a silent port present')
+    startup.add_argument('--repeat', type=int, default=3)
+    startup.set_defaults(func=benchStartup)
+
+    ui = subparsers.add_parser('ui', help='mainloop stall while Tk handlers send commands, with and without UIDispatcher')
+    ui.add_argument('--count', type=int, default=20, help='commands to the emulator')
+    ui.add_argument('--unplugged', type=int, default=2, help='commands to a port that never answers')
+    ui.add_argument('--interval', type=int, default=100, help='milliseconds between the handlers')
+    ui.set_defaults(func=benchUI)
+
+    rescale = subparsers.add_parser('rescale', help='time rescaleSkill() and splitTaskForLargeAngles() against the '
+                                                    'legacy loops')
+    rescale.add_argument('--seed', type=int, default=1)
+    rescale.add_argument('--repeat', type=int, default=200)
+    rescale.set_defaults(func=benchRescale)
+
+    schedule = subparsers.add_parser('schedule', help='compile testSchedules with scheduleCompiler against the legacy '
+                                                     'schedulerToSkill loop')
+    schedule.add_argument('--length', type=int, default=40, help='tasks of a random schedule')
+    schedule.add_argument('--seed', type=int, default=1)
+    schedule.add_argument('--repeat', type=int, default=200)
+    schedule.set_defaults(func=benchSchedule)
+
+    skillIndex = subparsers.add_parser('library', help='time to build, open and query the skill index against parsing '
+                                                       'the skill files')
+    skillIndex.add_argument('--repeat', type=int, default=20)
+    skillIndex.set_defaults(func=benchLibrary)
+
+    decimate = subparsers.add_parser('decimate', help='time decimateSkill() on the library behaviors and count the frames '
+                                                     'and bytes it saves')
+    decimate.add_argument('--tolerance', type=int, nargs='+', default=[1, 2, 5])
+    decimate.add_argument('--verbose', action='store_true', help='list the behaviors that lost frames')
+    decimate.add_argument('--repeat', type=int, default=5)
+    decimate.set_defaults(func=benchDecimate)
+
+    resample = subparsers.add_parser('resample', help='time scaleLibrary() on every gait and behavior against a frame '
+                                                     'by frame interpolation, with and without NumPy')
+    resample.add_argument('--factors', type=float, nargs='+', default=[0.5, 2, 3])
+    resample.add_argument('--repeat', type=int, default=3)
+    resample.set_defaults(func=benchResample)
+
+    kinematic = subparsers.add_parser('kinematics', help='time the feet of kinematics.py for every gait against the legs '
+                                                         'worked out in their plane')
+    kinematic.add_argument('--model', default='Bittle')
+    kinematic.add_argument('--repeat', type=int, default=5)
+    kinematic.set_defaults(func=benchKinematics)
+
+    ik = subparsers.add_parser('ik', help='time the legs solved for the Skill Composer dials, one by one, in a batch '
+                                          'and from the cache')
+    ik.add_argument('--repeat', type=int, default=20)
+    ik.set_defaults(func=benchIK)
+
+    virtual = subparsers.add_parser('virtual', help='time testSchedules replayed on virtualRobot.py against the time '
+                                                   'of the robot')
+    virtual.add_argument('--random', type=int, default=50, help='random schedules to play')
+    virtual.add_argument('--length', type=int, default=40, help='tasks of a random schedule')
+    virtual.add_argument('--seed', type=int, default=1)
+    virtual.set_defaults(func=benchVirtual)
+
+    physics = subparsers.add_parser('physics', help='time the fall screen of skillPhysics.py in one process and in a '
+                                                    'pool')
+    physics.add_argument('--model', default='Bittle')
+    physics.add_argument('--processes', type=int, help='the size of the pool, the number of CPUs if omitted')
+    physics.set_defaults(func=benchPhysics)
+
+    timing = subparsers.add_parser('timing', help='calibrate the timing model of skillTiming.py on emulator.py and time '
+                                                  'a demo with fixed and auto waits')
+    timing.add_argument('--step-ms', type=float, default=4, help='the step of the emulator the calibration should find')
+    timing.set_defaults(func=benchTiming)
+
+    robotController = subparsers.add_parser('robotcontroller', help='BittyGPT RobotController.send on one port')
+    robotController.add_argument('--port', required=True)
+    robotController.add_argument('--count', type=int, default=40)
+    robotController.set_defaults(func=benchRobotController)
+
+    args = parser.parse_args()
+    result = args.func(args)
+    if args.json and result:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Plays a schedule (the testSchedule format of the demos) on several robots at the same time.
+# Every step is written to all ports against one deadline on the monotonic clock. Each port starts its
+# write earlier by how long the write will take (from its write policy, corrected by the writes it has done),
+# so the last bytes leave at the same time. A port worker gets its step well before the deadline, starts its reader
+# and registers the echo it expects, then sleeps and spins through the last millisecond, so it only writes at the
+# deadline.
+# The next deadline is the last echo of the step plus the delay of the step (in the 'auto' wait mode, until the
+# slowest robot is done with the move), so a slow robot holds the others back instead of the robots drifting apart.
+# e.g.
+# from choreography import playChoreography
+# report = playChoreography(goodPorts, testSchedule)
+# print(report['maxSkew'])
+
+import copy
+import time
+
+from ardSerial import *
+
+startMargin = 0.05    # seconds between handing the first step to the port workers and its deadline
+dispatchMargin = 0.005    # seconds for the port workers to pick up a step, on top of the longest write
+spinTime = 0.001    # seconds of polling the clock at the end of a wait, longer than a sleep oversleeps
+leadSmoothing = 0.3    # weight of the latest write in the correction of each port
+
+
+def waitUntil(deadline):
+    remaining = deadline - time.monotonic()
+    if remaining > spinTime:
+        time.sleep(remaining - spinTime)
+    # sleep(0) hands the GIL over between polls. a thread that polled with pass would keep it from the other workers
+    # for the switch interval (5 ms) when they wake up for the same deadline
+    while time.monotonic() < deadline:
+        time.sleep(0)
+
+
+def responseTimeout(token):
+    # the same thresholds as sendTask() and printSerialMessage()
+    if token == 'I' or token == 'L':
+        return 1
+    if token == 'k' or token == 'K':
+        return 8
+    return 5
+
+
+def writeTime(port, length):
+    # seconds writeBytes() takes to hand length bytes to the port, by its write policy
+    policy, bytesPerSecond = getWritePolicy(port)
+    if policy == 'sliced':
+        return (length + sliceSize - 1) // sliceSize * delayBetweenSlice
+    if policy == 'paced' and bytesPerSecond > 0:
+        return max(0, length - pacedChunk) / bytesPerSecond
+    return 0
+
+
+def playStep(port, token, data, writeAt):
+    # runs on the worker of the port.
+    # returns [write start, write end, echo time, [response, allPrints] or -1], or None if the port is gone
+    try:
+        port.Start_Reader()
+        previousBuffer = port.Flush_Input()
+        if previousBuffer:
+            logger.debug(f"Previous buffer: {previousBuffer}")
+        waiter = port.Expect(token)
+        waitUntil(writeAt)
+        writeStart = time.monotonic()
+        writeBytes(port, data)
+        writeEnd = time.monotonic()
+    except Exception as e:
+        logger.info(f"Fail to send {token} to {port}: {e}")
+        return None
+    result = port.Wait_Response(waiter, responseTimeout(token))
+    return [writeStart, writeEnd, time.monotonic(), result]
+
+
+def playChoreography(ports, schedule):
+    # returns {'skews': [seconds between the first and the last port finishing the write of each step],
+    #          'maxSkew': seconds, 'meanSkew': seconds, 'failures': {SerialPort Object: steps without an echo}}
+    if isinstance(ports, dict):
+        ports = list(ports.keys())
+    else:
+        ports = list(ports)
+    corrections = {port: 0 for port in ports}    # {SerialPort Object: seconds a write takes over writeTime()}
+    failures = {port: 0 for port in ports}
+    skews = []
+    deadline = time.monotonic() + startMargin
+    for step in schedule:
+        for task in splitTaskForLargeAngles(copy.deepcopy(step)):
+            token = task[0][0]
+            data = encodeTask(task)
+            leads = {port: writeTime(port, len(data)) + corrections[port] for port in ports}
+            deadline = max(deadline, time.monotonic() + max(leads.values()) + dispatchMargin)
+            futures = {}
+            for port in ports:
+                futures[port] = portWorker(port).call(playStep, port, token, data, deadline - leads[port])
+            writeEnds = []
+            lastEcho = deadline
+            for port, future in futures.items():
+                played = future.result()
+                if played is None or played == -1:
+                    ports.remove(port)
+                    if port in goodPorts:
+                        goodPorts.pop(port)
+                    continue
+                writeStart, writeEnd, echoTime, result = played
+                corrections[port] += leadSmoothing * (writeEnd - writeStart - leads[port])
+                writeEnds.append(writeEnd)
+                lastEcho = max(lastEcho, echoTime)
+                if result == -1:
+                    failures[port] += 1
+            if len(writeEnds):
+                skews.append(max(writeEnds) - min(writeEnds))
+            if not ports:
+                logger.info("No port left for the choreography")
+                break
+            deadline = max(lastEcho + taskWait(port, task, lastEcho - deadline) for port in ports)
+        if not ports:
+            break
+    report = {
+        'skews': skews,
+        'maxSkew': max(skews) if skews else 0,
+        'meanSkew': sum(skews) / len(skews) if skews else 0,
+        'failures': failures,
+    }
+    logger.info(f"Choreography of {len(schedule)} steps: max skew {report['maxSkew'] * 1000:.2f} ms, "
+                f"mean skew {report['meanSkew'] * 1000:.2f} ms")
+    return report
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Coalesces the commands of a slider stream.
+# A Tk Scale calls back for every pixel it moves. Sending each value and waiting for its echo falls seconds behind
+# the hand and blocks the mainloop. A CommandChannel keeps only the newest target of each joint or parameter and
+# a background thread sends what is pending at most flushRate times a second. The joint targets are merged into
+# one 'I' packet (or 'L' for a whole pose).
+# e.g.
+# channel = CommandChannel(goodPorts)
+# channel.setJoint(8, 30)    # from the slider callbacks
+# channel.setParameter('c', 8, -3)
+# channel.flush()    # before a command that must come after the targets, e.g. ['s', 0]
+# channel.close()
+
+from ardSerial import *
+
+flushRate = 50    # flushes per second
+
+
+class CommandChannel:
+    def __init__(self, ports, rate=flushRate):
+        self.ports = ports    # the dictionary or list given to send(). it may change while the channel is open
+        self.period = 1 / rate
+        self.condition = threading.Condition()
+        self.sendLock = threading.Lock()    # one flush at a time, from the thread or from flush()
+        self.pose = None    # a pending list of all the joint angles
+        self.joints = {}    # {joint index: angle}
+        self.parameters = {}    # {(token, index): value}, sent in the order they were first set
+        self.lastResult = None
+        self.lastFlush = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def setJoint(self, idx, angle):
+        with self.condition:
+            if self.pose is not None:
+                self.pose[idx] = angle
+            else:
+                self.joints[idx] = angle
+            self.condition.notify()
+
+    def setJoints(self, indexedList):
+        # [index, angle, index, angle, ...]
+        with self.condition:
+            for i in range(0, len(indexedList) - 1, 2):
+                if self.pose is not None:
+                    self.pose[indexedList[i]] = indexedList[i + 1]
+                else:
+                    self.joints[indexedList[i]] = indexedList[i + 1]
+            self.condition.notify()
+
+    def setPose(self, angles):
+        # all the joint angles. replaces the pending joints
+        with self.condition:
+            self.pose = list(angles)
+            self.joints.clear()
+            self.condition.notify()
+
+    def setParameter(self, token, idx, value):
+        # e.g. ['c', [idx, value]] of the calibrator or ['}', [idx, value]] of the tuner
+        with self.condition:
+            self.parameters.pop((token, idx), None)    # move it behind the others
+            self.parameters[(token, idx)] = value
+            self.condition.notify()
+
+    def pending(self):
+        return self.pose is not None or len(self.joints) > 0 or len(self.parameters) > 0
+
+    def takeTasks(self):
+        # the tasks of the pending targets. call with the condition held
+        tasks = []
+        if self.pose is not None:
+            tasks.append(['L', self.pose, 0])
+        elif self.joints:
+            indexedList = []
+            for idx in sorted(self.joints):
+                indexedList += [idx, self.joints[idx]]
+            tasks.append(['I', indexedList, 0])
+        for (token, idx), value in self.parameters.items():
+            tasks.append([token, [idx, value], 0])
+        self.pose = None
+        self.joints = {}
+        self.parameters = {}
+        return tasks
+
+    def sendTasks(self, tasks):
+        for task in tasks:
+            # on the workers of the ports, so the tasks stay in order with the tasks sent by other threads
+            if isinstance(self.ports, dict):
+                ports = list(self.ports.keys())
+            else:
+                ports = list(self.ports)
+            for t in splitTaskForLargeAngles(task):
+                results = sendTaskParallel(ports, t)
+                if ports:
+                    self.lastResult = results[ports[0]]
+
+    def flush(self):
+        # send the pending targets now and return after their echoes
+        with self.sendLock:
+            with self.condition:
+                tasks = self.takeTasks()
+            self.sendTasks(tasks)
+            self.lastFlush = time.monotonic()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending():
+                    self.condition.wait()
+                if not self.running:
+                    break
+            # the first target after a pause goes out right away. later ones are collected for the rest of the period
+            wait = self.lastFlush + self.period - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.info(f"Fail to flush the commands: {e}")
+
+    def close(self):
+        # send what is pending and stop the thread
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not threading.current_thread():
+            self.thread.join(10)
+        self.flush()
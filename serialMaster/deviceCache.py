@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Remembers the robots connected before by the USB VID, PID and serial number of their port,
+# so a replugged robot can be added without waiting for the '?' handshake.
+# The cache is a JSON file in the Petoi config directory, configDir, which pyUI/commonVar.py also uses.
+# Besides the model and firmware version of the '?' answer it keeps the board revision the firmware was uploaded
+# for (FirmwareUploader) and the calibration offsets of the robot (Calibrator), which fill the sliders of the
+# Joint Calibrator before the robot has answered 'c'.
+
+import json
+import logging
+import os
+import platform
+import threading
+import time
+
+import serial.tools.list_ports
+
+logger = logging.getLogger(__name__)
+
+boardNames = {'N': 'NyBoard', 'B': 'BiBoard'}    # the first letter of the firmware version
+
+
+if platform.system() == "Windows":
+    configDir = (os.getenv('HOMEDRIVE') or '') + (os.getenv('HomePath') or '')
+else:  # for Linux & macOS
+    configDir = os.getenv('HOME') or ''
+configDir = os.path.join(configDir, '.config', 'Petoi')    # the config directory of the desktop app
+
+cacheFile = os.path.join(configDir, 'deviceCache.json')
+cacheLock = threading.Lock()
+devices = None    # {key: {'model': ..., 'version': ..., 'board': 'NyBoard', 'boardVersion': 'NyBoard_V1_2',
+                  #        'offsets': [16 int], 'timing': {...}, 'lastSeen': seconds}}
+
+
+def deviceKey(portName):
+    # 'VID:PID:serial number' of a USB serial port, or None if the port has no serial number
+    # (Bluetooth, pseudo terminals, the UART of a Raspberry Pi)
+    try:
+        for info in serial.tools.list_ports.comports():
+            if info.device == portName or info.name == portName.split('/')[-1]:
+                if info.vid is None or not info.serial_number:
+                    return None
+                return f"{info.vid:04X}:{info.pid:04X}:{info.serial_number}"
+    except Exception as e:
+        logger.debug(f"Fail to look up {portName}: {e}")
+    return None
+
+
+def loadDevices():
+    global devices
+    if devices is None:
+        try:
+            with open(cacheFile, 'r', encoding='utf-8') as f:
+                devices = json.load(f)
+        except (OSError, ValueError):
+            devices = {}
+    return devices
+
+
+def saveDevices():
+    try:
+        os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+        temporaryFile = cacheFile + '.tmp'
+        with open(temporaryFile, 'w', encoding='utf-8') as f:
+            json.dump(devices, f, indent=2)
+        os.replace(temporaryFile, cacheFile)
+    except OSError as e:
+        logger.info(f"Fail to save {cacheFile}: {e}")
+
+
+def lookupDevice(key):
+    # returns the remembered fields of the robot, or None
+    if key is None:
+        return None
+    with cacheLock:
+        device = loadDevices().get(key)
+        return dict(device) if device is not None else None
+
+
+def rememberDevice(key, **fields):
+    # e.g. rememberDevice(key, model='Bittle', version='N_240907'), rememberDevice(key, offsets=[...]) or
+    # rememberDevice(key, boardVersion='BiBoard_V1_0')
+    if key is None:
+        return
+    if 'version' in fields and fields['version']:
+        fields['board'] = boardNames.get(fields['version'][0], 'Unknown')
+    with cacheLock:
+        device = loadDevices().setdefault(key, {})
+        device.update(fields)
+        device['lastSeen'] = round(time.time())
+        saveDevices()
+
+
+def cachedOffsets(portName):
+    # the calibration offsets remembered for the robot on portName, or None
+    device = lookupDevice(deviceKey(portName))
+    if device is None or len(device.get('offsets') or []) != 16:
+        return None
+    return device['offsets']
+
+
+def forgetDevice(key):
+    if key is None:
+        return
+    with cacheLock:
+        if loadDevices().pop(key, None) is not None:
+            saveDevices()
@@ -0,0 +1,339 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# A stand-in for the NyBoard/BiBoard serial protocol on a Linux pseudo terminal.
+# It answers the tokens the way src/reaction.h does and takes the time a robot would:
+# the bytes travel at the baud rate, every transform() step and behavior delay is waited for.
+# e.g.
+# python3 emulator.py                  # prints the port to connect to
+# OPENCAT_EXTRA_PORTS=/dev/pts/5 python3 ardSerial.py
+#
+# or from Python:
+# emulator = FirmwareEmulator('Bittle')
+# port = Communication(emulator.start(), 115200, 1)
+
+import argparse
+import collections
+import os
+import re
+import select
+import threading
+import time
+
+from skill import Skill
+from skillLibrary import library
+
+DOF = 16
+WALKING_DOF = 8
+SERIAL_TIMEOUT = 0.005
+SERIAL_TIMEOUT_LONG = 0.2
+srcDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+versionPrefix = {'NyBoard': 'N_', 'BiBoard': 'B_'}
+
+
+def loadInstinct(model):
+    # {skillName: data} from the instinct header of the firmware, through the skill index
+    fileName = os.path.join(srcDir, 'Instinct' + model.split()[0] + '.h')
+    return {entry.name: entry.skill.toList() for entry in library().fileEntries(fileName)}
+
+
+class FirmwareEmulator:
+    def __init__(self, model='Bittle', board='NyBoard', baudRate=115200, stepSeconds=0.002, boot=True,
+                 bootDelay=0.5, setupSeconds=0):
+        self.model = model
+        self.version = versionPrefix.get(board, 'N_') + '240907'
+        self.byteSeconds = 10.0 / baudRate    # start bit, 8 data bits, stop bit
+        self.stepSeconds = stepSeconds    # one step of transform(), 16 servo updates
+        self.boot = boot
+        self.bootDelay = bootDelay    # seconds before initRobot() starts printing
+        self.setupSeconds = setupSeconds    # seconds of IMU and servo setup between the version and 'Ready!'
+        self.skills = loadInstinct(model)
+        self.currentAng = list(self.skills.get('rest', [1, 0, 0, 1] + [0] * DOF)[4:4 + DOF])
+        self.servoCalib = [0] * DOF
+        self.skill = Skill([1, 0, 0, 1] + self.currentAng)
+        self.lastK = None
+        self.lastToken = 'd'
+        self.tStep = 1
+        self.fineAdjust = True
+        self.gyroBalance = True
+        self.received = collections.deque()    # [byte, arrival time]
+        self.lineFreeAt = 0
+        self.commandCount = 0
+        self.running = False
+        self.master = None
+        self.slave = None
+        self.thread = None
+
+    def start(self):
+        # open the pseudo terminal and return the device name to connect to
+        import pty
+        import tty
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)    # the slave stays open here, so the master survives the host closing the port
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='emulator')
+        self.thread.daemon = True
+        self.thread.start()
+        return os.ttyname(self.slave)
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(1)
+        for fd in [self.master, self.slave]:
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    # serial line
+    def pump(self, timeout):
+        # take what the host has written. each byte arrives one byte time after the previous one
+        ready = select.select([self.master], [], [], max(0, timeout))[0]
+        if ready:
+            data = os.read(self.master, 4096)
+            arrival = max(self.lineFreeAt, time.monotonic())
+            for b in data:
+                arrival += self.byteSeconds
+                self.received.append([b, arrival])
+            self.lineFreeAt = arrival
+
+    def wait(self, seconds):
+        # keep receiving while the robot is busy, like the UART does
+        deadline = time.monotonic() + seconds
+        while self.running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            self.pump(deadline - now)
+
+    def available(self):
+        self.pump(0)
+        return len(self.received) > 0 and self.received[0][1] <= time.monotonic()
+
+    def println(self, text=''):
+        data = (str(text) + '\r\n').encode('ISO-8859-1')
+        self.wait(len(data) * self.byteSeconds)
+        try:
+            os.write(self.master, data)
+        except OSError:
+            pass
+
+    def readCommand(self):
+        # read_serial() in io.h. it reads everything that has arrived, so commands queued up
+        # while the robot was busy are merged into one, as on the real board.
+        while self.running and not self.available():
+            if self.received:
+                self.wait(self.received[0][1] - time.monotonic())
+            else:
+                self.pump(0.1)
+        if not self.running:
+            return None, []
+        token = chr(self.received.popleft()[0])
+        self.wait(0.001)
+        terminator = ord('~') if 'A' <= token <= 'Z' else ord('\n')
+        timeout = SERIAL_TIMEOUT_LONG if token == 'K' or token.lower() == 'b' else SERIAL_TIMEOUT
+        cmd = []
+        lastSerialTime = time.monotonic()
+        while True:
+            if self.available():
+                now = time.monotonic()
+                while self.received and self.received[0][1] <= now:
+                    cmd.append(self.received.popleft()[0])
+                lastSerialTime = now
+            if cmd and cmd[-1] == terminator or time.monotonic() - lastSerialTime >= timeout:
+                break
+            self.wait(min(self.byteSeconds, 0.001))
+        if cmd and cmd[-1] == terminator:
+            cmd.pop()
+        return token, cmd
+
+    # motion
+    def transform(self, target, angleRatio=1, speedRatio=2, offset=0):
+        # transform() in motion.h. one step per degree / speedRatio of the largest joint difference
+        maxDiff = 0
+        for i in range(offset, DOF):
+            angle = target[i - offset] * angleRatio
+            maxDiff = max(maxDiff, abs(self.currentAng[i] - angle))
+            self.currentAng[i] = angle
+        steps = int(round(maxDiff / speedRatio)) if speedRatio > 0 else 0
+        if speedRatio > 0:
+            self.wait((steps + 1) * self.stepSeconds)
+
+    def loadSkill(self, data):
+        try:
+            skill = Skill(data)
+        except ValueError:    # the frames don't fit the period, e.g. a K cut short
+            return
+        self.skill = skill
+        self.transform(skill.frame(0), skill.angleRatio or 1, 2, skill.firstJoint)
+
+    def perform(self):
+        # the behavior part of Skill::perform(). returns False if the behavior was interrupted
+        skill = self.skill
+        loopStart, loopEnd, loopRepeat = skill.loop
+        repeat = 0 if 0 <= loopRepeat < 2 else loopRepeat - 1
+        c = 0
+        while c < skill.frameCount:
+            if self.available():
+                self.loadSkill(self.skills.get('up', [1, 0, 0, 1] + self.currentAng))
+                return False
+            frame = skill.frame(c)
+            self.transform(frame, skill.angleRatio or 1, frame[DOF] / 4.0)
+            self.wait(abs(frame[DOF + 1]) * 0.05)
+            if repeat != 0 and c != 0 and c == loopEnd:
+                c = loopStart - 1
+                if repeat > 0:
+                    repeat -= 1
+            c += 1
+        self.skill = Skill([1, 0, 0, 1] + self.currentAng)    # convertTargetToPosture()
+        return True
+
+    def lookup(self, name):
+        # Skill::lookupAddressByName(). L, R and X share the data of the L skill
+        if name in self.skills:
+            return self.skills[name]
+        if name and name[-1] in 'LRX' and name[:-1] + 'L' in self.skills and name[:-1] != 'bk':
+            return self.skills[name[:-1] + 'L']
+        return None
+
+    def printTable(self, values):
+        self.println(''.join(str(i) + '\t' for i in range(DOF)))
+        self.println(''.join(str(v) + ',\t' for v in values))
+
+    # reaction.h
+    def react(self, token, cmd):
+        if token != 'c' and self.lastToken in 'cd':
+            self.gyroBalance = True
+            self.println('G')
+        if token != 'p' and not self.tStep:
+            self.tStep = 1
+            self.println('p')
+        text = bytes(cmd).decode('ISO-8859-1')
+        signed = [b - 256 if b > 127 else b for b in cmd]
+        if token == '?':
+            self.println(self.model)
+            self.println(self.version)
+        elif token == 'g':
+            self.fineAdjust = not self.fineAdjust
+            token = 'G' if self.fineAdjust else 'g'
+        elif token == 'G':
+            self.gyroBalance = not self.gyroBalance
+            token = 'G' if self.gyroBalance else 'g'
+        elif token == 'p':
+            self.tStep = 0 if self.tStep else 1
+            token = 'k' if self.tStep else 'P'
+        elif token == 'j':
+            self.println('=')
+            self.printTable(self.currentAng)
+        elif token == 's':
+            self.println('saved')
+        elif token == 'a':
+            self.println('aborted')
+        elif token in 'cmib':
+            values = [int(v) for v in re.findall(r'-?\d+', text)]
+            if token == 'i' and not values:
+                pass
+            elif token == 'b':
+                for b in range(1, len(values), 2):
+                    if values[b]:
+                        self.wait(1.0 / abs(values[b]))
+            elif token == 'c':
+                self.gyroBalance = False
+                if self.lastToken != 'c':
+                    self.loadSkill(self.skills.get('calib', [1, 0, 0, 1] + [0] * DOF))
+                pairs = [values[p:p + 2] for p in range(0, len(values), 2)] or [[]]
+                for pair in pairs:
+                    if len(pair) == 2 and 0 <= pair[0] < DOF:
+                        self.servoCalib[pair[0]] = pair[1]
+                    self.printTable(self.servoCalib)
+            else:
+                self.moveJoints(token, values)
+        elif token in 'IM':
+            if len(signed) >= 2:
+                self.moveJoints(token.lower(), signed)
+        elif token == 'L':
+            self.transform(signed[:DOF])
+        elif token == 'B':
+            for b in range(len(signed) // 2):
+                if signed[2 * b + 1]:
+                    self.wait(1.0 / abs(signed[2 * b + 1]))
+        elif token == 'R':
+            for p in range(0, len(signed) - 1, 2):
+                self.println('=')
+                self.println(0)
+        elif token == 'K':
+            self.lastK = signed
+            self.loadSkill(signed)
+            token = 'k'
+        elif token == 'T':
+            if self.lastK:
+                self.loadSkill(self.lastK)
+            self.println(token)
+            token = 'k'
+        elif token == 'k':
+            data = self.lookup(text.strip())
+            if data is not None:
+                self.loadSkill(data)
+        elif token == 'd':
+            self.loadSkill(self.skills.get('rest', [1, 0, 0, 1] + self.currentAng))
+            self.gyroBalance = False
+            self.println('g')
+
+        if token != 'k' or self.skill.period > 0:
+            self.println(token)
+        if token == 'k' and self.skill.period < 0:
+            if self.perform():
+                self.println(token)
+        self.lastToken = token
+
+    def moveJoints(self, token, values):
+        # the indexed joint commands i, m, I and M
+        targetFrame = list(self.currentAng)
+        nonHeadJoint = False
+        for p in range(0, len(values) - 1, 2):
+            if 0 <= values[p] < DOF:
+                targetFrame[values[p]] = values[p + 1]
+                if values[p] >= 4:
+                    nonHeadJoint = True
+            if token == 'm':
+                self.transform(targetFrame, 1, 2)
+        if token in 'im' and (nonHeadJoint or self.lastToken != 'k'):
+            self.transform(targetFrame, 1, 4)
+
+    def run(self):
+        if self.boot:
+            self.wait(self.bootDelay)
+            for line in ['k', '\n* Start *', self.model, self.version]:
+                self.println(line)
+            self.wait(self.setupSeconds)    # commands sent meanwhile wait in the receive buffer
+            self.println('Ready!')
+        while self.running:
+            try:
+                token, cmd = self.readCommand()
+            except OSError:
+                break
+            if token is None:
+                break
+            self.commandCount += 1
+            self.react(token, cmd)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OpenCat firmware emulator on a pseudo terminal')
+    parser.add_argument('--model', default='Bittle', choices=['Bittle', 'Nybble'])
+    parser.add_argument('--board', default='NyBoard', choices=['NyBoard', 'BiBoard'])
+    parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--step-ms', type=float, default=2, help='time of one transform step in ms')
+    parser.add_argument('--boot-ms', type=float, default=500, help='time before the boot messages in ms')
+    parser.add_argument('--setup-ms', type=float, default=0, help='time between the version and Ready! in ms')
+    args = parser.parse_args()
+    emulator = FirmwareEmulator(args.model, args.board, args.baud, args.step_ms / 1000,
+                                bootDelay=args.boot_ms / 1000, setupSeconds=args.setup_ms / 1000)
+    portName = emulator.start()
+    print(f"{args.model} emulator on {portName}")
+    print(f"export OPENCAT_EXTRA_PORTS={portName}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulator.stop()
@@ -432,9 +432,10 @@ if __name__ == '__main__':
         send(goodPorts, ['kwkF',0])
         for i in range (3): # move head while walking
             for a in range(0,180,5): # allow controlling the head while walking
-                send(goodPorts,['i',[0,a-90,1,a//2-45,2,a-90],0.01])
+                sendPipelined(goodPorts,['i',[0,a-90,1,a//2-45,2,a-90],0.01])    # don't wait for each echo
             for a in range(0,180,5):
-                send(goodPorts,['i',[0,-(a-90),1,-(a//2-45),2,90-a],0.01])
+                sendPipelined(goodPorts,['i',[0,-(a-90),1,-(a//2-45),2,90-a],0.01])
+        drainPipelines()
         send(goodPorts, ['i',0])
         send(goodPorts, ['kwkF',2])
         for i in range (3): # move head while walking
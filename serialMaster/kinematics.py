@@ -0,0 +1,312 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Forward kinematics of Bittle's legs from Resources/SimulationModels/bittle_simple.urdf.
+# The URDF is parsed once into the fixed transforms of each leg: torso -> shoulder joint -> knee joint -> foot, the
+# foot being the far end of the lower leg capsule. The feet of whole skills are then computed at once, for every
+# frame and leg, with NumPy (pip3 install numpy).
+# The URDF frame of the torso: x to the right, y to the head, z up, in meters. With all its joints at 0 the legs lie
+# straight along the body. OpenCat's angle 0 (the calib posture) is the upper leg pointing down and the lower leg
+# pointing to the head, and its positive angles turn both toward the tail: a joint of the URDF is at
+# urdfOffsets[name] - the OpenCat angle of its joint.
+# BodyPoseSolver works the other way, in the plane of each leg: it moves the torso of a posture by the six dials of
+# the Skill Composer, keeps the feet where they were and solves the shoulder and knee angles that reach them.
+# Nybble has no simulation model: it uses Bittle's legs with its back legs mirrored, their knees to the head.
+# e.g.
+# legs = LegModel()
+# feet = legs.feet(library().skill('wkF', 'Bittle'))    # array of frames x 4 legs x [x, y, z]
+# gaitMetrics(feet)    # stride, lift and body clearance
+# python3 kinematics.py    # the metrics of every gait of Bittle
+# bodyPoseSolver('Bittle').angles(posture, [0, 10, 0, 0, -5, 0])    # joints 8 to 15 with the head 10 degrees down
+
+import collections
+import math
+import os
+import xml.etree.ElementTree as ElementTree
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from skill import DOF
+from skillTransform import limitsOf
+
+serialMasterDir = os.path.dirname(os.path.abspath(__file__))
+urdfFile = os.path.join(os.path.dirname(serialMasterDir), 'Resources', 'SimulationModels', 'bittle_simple.urdf')
+
+# [shoulder, knee] of each leg: the OpenCat joint and the joint of the URDF, in the order of the OpenCat indices
+legJoints = [
+    [[8, 'lfsj'], [12, 'lfkj']],    # left front
+    [[9, 'rfsj'], [13, 'rfkj']],    # right front
+    [[10, 'rbsj'], [14, 'rbkj']],    # right back
+    [[11, 'lbsj'], [15, 'lbkj']],    # left back
+]
+legNames = ['left front', 'right front', 'right back', 'left back']
+mirroredLegs = {'Nybble': [1, 1, -1, -1]}    # -1: the leg of Bittle mirrored front to back, with its angles negated
+poseAxes = ['yaw', 'pitch', 'roll', 'spinal', 'height', 'sideway']    # the dials of the Skill Composer
+urdfOffsets = {    # degrees of the URDF joint at OpenCat's 0
+    'lfsj': -90, 'rfsj': -90, 'rbsj': 90, 'lbsj': 90,
+    'lfkj': 90, 'rfkj': 90, 'rbkj': 90, 'lbkj': 90,
+}
+
+
+def requireNumpy():
+    if numpy is None:
+        raise ImportError("kinematics.py needs NumPy: pip3 install numpy")
+
+
+def vector(text):
+    return [float(v) for v in text.split()]
+
+
+def rotation(rpy):
+    # the rotation matrix of the roll, pitch, yaw of a URDF origin
+    r, p, y = rpy
+    rx = numpy.array([[1, 0, 0], [0, math.cos(r), -math.sin(r)], [0, math.sin(r), math.cos(r)]])
+    ry = numpy.array([[math.cos(p), 0, math.sin(p)], [0, 1, 0], [-math.sin(p), 0, math.cos(p)]])
+    rz = numpy.array([[math.cos(y), -math.sin(y), 0], [math.sin(y), math.cos(y), 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+
+def transform(rpy, xyz):
+    matrix = numpy.identity(4)
+    matrix[:3, :3] = rotation(rpy)
+    matrix[:3, 3] = xyz
+    return matrix
+
+
+def parseUrdf(fileName):
+    # {joint name: [parent, child, 4x4 origin, axis]}, {link name: the far end of its geometry in its frame or None}
+    root = ElementTree.parse(fileName).getroot()
+    joints = {}
+    for joint in root.iter('joint'):
+        origin = joint.find('origin')
+        axis = joint.find('axis')
+        joints[joint.get('name')] = [joint.find('parent').get('link'), joint.find('child').get('link'),
+                                     transform(vector(origin.get('rpy', '0 0 0')), vector(origin.get('xyz', '0 0 0'))),
+                                     vector(axis.get('xyz')) if axis is not None else [0, 0, 0]]
+    lengths = {}
+    for link in root.iter('link'):
+        capsule = link.find('visual/geometry/capsule')
+        if capsule is not None:
+            lengths[link.get('name')] = float(capsule.get('length')) / 2 + float(capsule.get('radius'))
+    return joints, lengths
+
+
+class LegModel:
+    def __init__(self, fileName=urdfFile):
+        requireNumpy()
+        joints, lengths = parseUrdf(fileName)
+        children = {joints[name][0]: name for name in joints if joints[name][3] == [0, 0, 0]}    # the fixed joints
+        shoulders, knees, tips, axes, offsets = [], [], [], [], []
+        for [shoulderIndex, shoulder], [kneeIndex, knee] in legJoints:
+            # the transform from the frame of a moving joint to the frame of the next one, through the fixed joints
+            fixedAfterShoulder = joints[children[joints[shoulder][1]]]
+            fixedAfterKnee = joints[children[joints[knee][1]]]
+            shoulders.append(joints[shoulder][2])
+            knees.append(fixedAfterShoulder[2] @ joints[knee][2])
+            # the lower leg continues the way its origin leads from the knee, to the end of its capsule
+            direction = fixedAfterKnee[2][:3, 3] / numpy.linalg.norm(fixedAfterKnee[2][:3, 3])
+            tip = fixedAfterKnee[2] @ numpy.append(direction * lengths[fixedAfterKnee[1]], 1)
+            tips.append(tip[:3])
+            axes.append([joints[shoulder][3], joints[knee][3]])
+            offsets.append([urdfOffsets[shoulder], urdfOffsets[knee]])
+        self.shoulders = numpy.array(shoulders)    # legs x 4 x 4, torso to the shoulder joint
+        self.knees = numpy.array(knees)    # legs x 4 x 4, shoulder joint to the knee joint
+        self.tips = numpy.array(tips)    # legs x 3, the foot in the frame of the knee joint
+        self.axes = numpy.array(axes, dtype=float)    # legs x 2 x 3
+        self.offsets = numpy.radians(numpy.array(offsets, dtype=float))    # legs x 2
+        self.columns = numpy.array([[shoulder[0], knee[0]] for shoulder, knee in legJoints])    # legs x 2
+        # the cross product matrices of the axes, for Rodrigues' formula
+        x, y, z = self.axes[..., 0], self.axes[..., 1], self.axes[..., 2]
+        zero = numpy.zeros_like(x)
+        self.crosses = numpy.stack([numpy.stack([zero, -z, y], -1), numpy.stack([z, zero, -x], -1),
+                                    numpy.stack([-y, x, zero], -1)], -2)    # legs x 2 x 3 x 3
+
+    def urdfAngles(self, angles):
+        # radians of the URDF joints, frames x legs x 2, from the OpenCat angles, frames x 16
+        return self.offsets - numpy.radians(numpy.asarray(angles, dtype=float)[:, self.columns])
+
+    def rotations(self, radians):
+        # frames x legs x 2 x 3 x 3
+        sin = numpy.sin(radians)[..., None, None]
+        cos = numpy.cos(radians)[..., None, None]
+        return numpy.identity(3) + sin * self.crosses + (1 - cos) * (self.crosses @ self.crosses)
+
+    def positions(self, angles):
+        # [knees, feet] in the torso frame, each frames x legs x 3, of the OpenCat angles, frames x 16
+        rotations = self.rotations(self.urdfAngles(angles))
+        shoulder = rotations[:, :, 0]
+        knee = rotations[:, :, 1]
+        # the foot in the frame of the shoulder joint, then in the torso frame
+        footInKnee = numpy.einsum('flij,lj->fli', knee, self.tips)
+        footInShoulder = numpy.einsum('lij,flj->fli', self.knees[:, :3, :3], footInKnee) + self.knees[:, :3, 3]
+        kneeInShoulder = numpy.broadcast_to(self.knees[:, :3, 3], footInShoulder.shape)
+        points = numpy.stack([kneeInShoulder, footInShoulder], 2)    # frames x legs x 2 x 3
+        points = numpy.einsum('flij,flpj->flpi', shoulder, points)
+        points = numpy.einsum('lij,flpj->flpi', self.shoulders[:, :3, :3], points) + self.shoulders[:, None, :3, 3]
+        return points[:, :, 0], points[:, :, 1]
+
+    def feet(self, skill):
+        return self.positions(skillAngles(skill))[1]
+
+
+def skillAngles(skill):
+    # the real angles of every frame of a Skill, frames x 16. a gait's missing joints are 0
+    requireNumpy()
+    frames = numpy.frombuffer(skill.data, dtype=numpy.int8, offset=skill.headerSize)
+    frames = frames.reshape(skill.frameCount, skill.frameSize)[:, :skill.angleColumns]
+    angles = numpy.zeros((skill.frameCount, DOF))
+    angles[:, skill.firstJoint:] = frames * skill.angleRatio
+    return angles
+
+
+def gaitMetrics(feet):
+    # of the feet of a skill, frames x legs x 3:
+    #   stride     how far each foot travels along the body, legs
+    #   lift       how high each foot rises above its lowest point, legs
+    #   clearance  the lowest the torso gets above the lowest foot of a frame, as if that foot were on the ground
+    lowest = feet[:, :, 2].min(axis=1)
+    return {'stride': numpy.ptp(feet[:, :, 1], axis=0), 'lift': numpy.ptp(feet[:, :, 2], axis=0),
+            'clearance': float((-torsoHalfHeight - lowest).min())}
+
+
+torsoHalfHeight = 0.0035    # meters, half the height of the torso box of the URDF
+
+
+def libraryMetrics(model='Bittle', kind='gait', legModel=None):
+    # [[name, frames, gaitMetrics()]] of the skills of the library, their frames computed in one batch
+    from skillLibrary import library
+    legModel = legModel or LegModel()
+    entries = library().entries(model, kind)
+    skills = [entry.skill for entry in entries]
+    if not skills:
+        return []
+    angles = numpy.concatenate([skillAngles(skill) for skill in skills])
+    feet = legModel.positions(angles)[1]
+    bounds = numpy.cumsum([0] + [skill.frameCount for skill in skills])
+    return [[entry.name, skill.frameCount, gaitMetrics(feet[bounds[n]:bounds[n + 1]])]
+            for n, [entry, skill] in enumerate(zip(entries, skills))]
+
+
+class BodyPoseSolver:
+    # the angles of joints 8 to 15 that keep the feet of a posture where they are while the torso moves by a pose:
+    #   yaw      degrees, the head to the left
+    #   pitch    degrees, the head down
+    #   roll     degrees, the left side down
+    #   spinal   mm, the torso forward over the feet
+    #   height   mm, the torso up
+    #   sideway  mm, the torso to the right
+    # The joints only turn the legs in their planes, so the feet are solved in the plane of each leg and a move
+    # across it is left out. A foot out of reach gets the leg stretched towards it; the angles are kept within the
+    # joint limits of the model. The results are cached per pose rounded to the degree and the mm
+    def __init__(self, model='Bittle', legModel=None, cacheSize=4096):
+        requireNumpy()
+        legModel = legModel or LegModel()
+        self.model = model
+        self.mirror = numpy.array(mirroredLegs.get(model, [1, 1, 1, 1]), dtype=float)
+        self.upper = numpy.abs(legModel.knees[:, 1, 3])    # legs, the shoulder to the knee
+        self.lower = numpy.abs(legModel.tips[:, 1])    # legs, the knee to the end of the foot
+        self.shoulders = legModel.shoulders[:, :3, 3]    # legs x 3
+        self.columns = legModel.columns
+        limits = numpy.array(limitsOf(model), dtype=float)[self.columns]    # legs x 2 x [lowest, highest]
+        self.lowest = limits[..., 0]
+        self.highest = limits[..., 1]
+        self.cache = collections.OrderedDict()
+        self.cacheSize = cacheSize
+
+    def feet(self, angles):
+        # [y, z] of the feet in the torso frame, frames x legs x 2, of the OpenCat angles, frames x 16
+        radians = numpy.radians(numpy.asarray(angles, dtype=float)[:, self.columns]) * self.mirror[:, None]
+        theta = radians[..., 0]
+        phi = theta + radians[..., 1]
+        y = -self.upper * numpy.sin(theta) + self.lower * numpy.cos(phi)
+        z = -self.upper * numpy.cos(theta) - self.lower * numpy.sin(phi)
+        return numpy.stack([self.shoulders[:, 1] + y * self.mirror, self.shoulders[:, 2] + z], -1)
+
+    def legAngles(self, feet):
+        # the degrees of [shoulder, knee] of each leg, frames x legs x 2, that reach the feet, frames x legs x [y, z]
+        y = (feet[..., 0] - self.shoulders[:, 1]) * self.mirror
+        z = feet[..., 1] - self.shoulders[:, 2]
+        a, b = self.upper, self.lower
+        cosine = numpy.clip((y * y + z * z - a * a - b * b) / (2 * a * b), -1, 1)
+        bend = -numpy.arccos(cosine)    # the knee on the side of the tail, '>' seen from the left
+        theta = numpy.arctan2(-y, -z) - numpy.arctan2(b * numpy.sin(bend), a + b * numpy.cos(bend))
+        theta = (theta + math.pi) % (2 * math.pi) - math.pi
+        angles = numpy.degrees(numpy.stack([theta, bend + math.pi / 2], -1)) * self.mirror[:, None]
+        return numpy.clip(angles, self.lowest, self.highest)
+
+    def solve(self, angles, poses):
+        # the angles of joints 8 to 15, poses x 8, of the posture angles (16) with the torso moved by each pose of
+        # poses x 6, in one batch
+        poses = numpy.atleast_2d(numpy.asarray(poses, dtype=float))
+        feet = self.feet([angles])[0]    # legs x [y, z], where the torso is at rest
+        points = numpy.zeros((4, 3))
+        points[:, 0] = self.shoulders[:, 0]
+        points[:, 1:] = feet
+        yaw, pitch, roll = [numpy.radians(poses[:, n]) for n in range(3)]
+        shift = poses[:, [5, 3, 4]] / 1000    # poses x [x, y, z] in meters
+        # the rotation of the torso: pitch turns the head down about x, roll the left side down about y, yaw about z
+        rotations = numpy.einsum('pij,pjk,pkl->pil', rotationsAbout(2, yaw), rotationsAbout(0, -pitch),
+                                 rotationsAbout(1, -roll))
+        # the feet in the frame of the moved torso: its rotation transposed, applied to the feet less its shift
+        moved = numpy.einsum('pji,plj->pli', rotations, points[None] - shift[:, None])
+        legs = self.legAngles(moved[..., 1:])    # poses x legs x 2
+        return numpy.rint(numpy.concatenate([legs[..., 0], legs[..., 1]], -1)).astype(int)
+
+    def angles(self, angles, pose, axis=None, values=()):
+        # the cached angles of joints 8 to 15 for one pose. on a miss, the poses with each of values on axis are
+        # solved in the same batch, e.g. the range of the dial being dragged
+        posture = tuple(int(v) for v in angles[:DOF])
+        pose = [int(round(v)) for v in pose]
+        key = (posture, tuple(pose))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        poses = [pose]
+        if axis is not None:
+            poses += [pose[:axis] + [int(v)] + pose[axis + 1:] for v in values if int(v) != pose[axis]]
+        for solved, p in zip(self.solve(posture, poses).tolist(), poses):
+            self.cache[(posture, tuple(p))] = solved
+        while len(self.cache) > self.cacheSize:
+            self.cache.popitem(last=False)
+        return self.cache[key]
+
+
+def rotationsAbout(axis, radians):
+    # poses x 3 x 3 rotations about the x (0), y (1) or z (2) axis
+    cos, sin = numpy.cos(radians), numpy.sin(radians)
+    matrices = numpy.zeros((len(radians), 3, 3))
+    i, j = (axis + 1) % 3, (axis + 2) % 3    # y turns z to x
+    matrices[:, axis, axis] = 1
+    matrices[:, i, i] = cos
+    matrices[:, i, j] = -sin
+    matrices[:, j, i] = sin
+    matrices[:, j, j] = cos
+    return matrices
+
+
+poseSolvers = {}
+
+
+def bodyPoseSolver(model):
+    # the shared solver of model, or None if NumPy is missing or the model doesn't have Bittle's or Nybble's legs
+    model = model.replace(' ', '')
+    if numpy is None or not (model.startswith('Bittle') or model == 'Nybble'):
+        return None
+    if model not in poseSolvers:
+        poseSolvers[model] = BodyPoseSolver(model)
+    return poseSolvers[model]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Foot trajectories of the library skills on Bittle's URDF")
+    parser.add_argument('--model', default='Bittle')
+    parser.add_argument('--kind', default='gait', choices=['gait', 'behavior', 'posture'])
+    args = parser.parse_args()
+    print(f"{'skill':16} frames  stride mm (" + ', '.join(legNames) + ")   lift mm   clearance mm")
+    for name, frames, metrics in libraryMetrics(args.model, args.kind):
+        print(f"{name:16} {frames:6}  " + ' '.join(f"{v * 1000:5.1f}" for v in metrics['stride']) + '   ' +
+              ' '.join(f"{v * 1000:4.1f}" for v in metrics['lift']) + f"   {metrics['clearance'] * 1000:6.1f}")
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Waits for serial ports to be plugged in or removed, so keepCheckingPort() lists the ports only when they change.
+# Linux: a udev monitor of the tty devices if pyudev is installed, otherwise inotify on /dev.
+# Other systems: a wake-up every pollInterval seconds, as before.
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+logger = logging.getLogger(__name__)
+
+pollInterval = 0.5    # seconds between scans when there is no event source
+settleTime = 0.05    # seconds without a new event before the ports are listed again
+settleLimit = 1    # seconds to wait for a burst of events to end
+serialPrefixes = ('tty', 'rfcomm')    # device names of serial ports in /dev
+IN_ATTRIB = 0x4    # udev gives a new port its group and mode after the kernel creates it
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+inotifyEvent = struct.Struct('iIII')    # wd, mask, cookie, len. the name follows
+
+
+class PortMonitor:
+    def __init__(self):
+        self.kind = 'poll'
+        self.fd = None
+        self.udevMonitor = None
+        self.watches = {}    # {inotify watch descriptor: directory}
+        if sys.platform.startswith('linux'):
+            if pyudev is not None:
+                try:
+                    self.openUdev()
+                except Exception as e:
+                    logger.info(f"Fail to monitor udev: {e}")
+            if self.kind == 'poll':
+                try:
+                    self.openInotify()
+                except Exception as e:
+                    logger.info(f"Fail to watch /dev: {e}")
+        logger.info(f"Port monitor: {self.kind}")
+
+    def openUdev(self):
+        self.udevMonitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        self.udevMonitor.filter_by(subsystem='tty')
+        self.udevMonitor.start()
+        self.fd = self.udevMonitor.fileno()
+        self.kind = 'udev'
+
+    def openInotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        # /dev, and the directories of the extra ports, e.g. /dev/pts for emulator.py
+        directories = ['/dev']
+        for extraPort in os.environ.get('OPENCAT_EXTRA_PORTS', '').split(os.pathsep):
+            if extraPort and os.path.dirname(extraPort) not in directories:
+                directories.append(os.path.dirname(extraPort))
+        for directory in directories:
+            wd = libc.inotify_add_watch(fd, directory.encode(), IN_CREATE | IN_DELETE | IN_ATTRIB)
+            if wd >= 0:
+                self.watches[wd] = directory
+        if not self.watches:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch')
+        self.fd = fd
+        self.kind = 'inotify'
+
+    def readable(self, timeout):
+        try:
+            return len(select.select([self.fd], [], [], max(0, timeout))[0]) > 0
+        except (OSError, ValueError):    # closed
+            return False
+
+    def drain(self):
+        # read the pending events. returns True if one of them is about a serial port
+        relevant = False
+        if self.kind == 'udev':
+            while self.udevMonitor.poll(0) is not None:
+                relevant = True
+            return relevant
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return False
+        offset = 0
+        while offset + inotifyEvent.size <= len(data):
+            wd, mask, cookie, length = inotifyEvent.unpack_from(data, offset)
+            name = data[offset + inotifyEvent.size:offset + inotifyEvent.size + length].rstrip(b'\0').decode(errors='replace')
+            offset += inotifyEvent.size + length
+            if self.watches.get(wd) != '/dev' or name.startswith(serialPrefixes):
+                relevant = True
+        return relevant
+
+    def wait(self, timeout=pollInterval):
+        # returns True when a serial port may have been added or removed, or False after timeout seconds without one
+        if self.kind == 'poll':
+            time.sleep(timeout)
+            return True
+        if not self.readable(timeout):
+            return False
+        relevant = self.drain()
+        # one device makes a few events, e.g. ttyACM0, its by-id links and the change of its group by udev. list the
+        # ports once they are done, so a new port can be opened right away
+        settled = time.monotonic() + settleLimit
+        while time.monotonic() < settled and self.readable(settleTime):
+            relevant = self.drain() or relevant
+        return relevant
+
+    def close(self):
+        if self.kind == 'inotify':
+            os.close(self.fd)
+        self.fd = None
+        self.udevMonitor = None
+        self.kind = 'poll'
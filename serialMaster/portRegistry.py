@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# One set of open, identified robot ports for the whole process.
+# A tool takes the ports with acquirePorts() and gives them back with releasePorts(). The first holder opens them
+# with connectPort() and the last one closes them with closeAllSerial(). A launcher like UI.py calls keepPortsOpen()
+# so the tools it starts one after another use the same ports and reader threads without probing the robot again.
+
+from ardSerial import *
+
+registryLock = threading.RLock()
+holders = 0
+keepOpen = False
+
+
+def portsOpen(PortList):
+    for port in PortList:
+        if port.main_engine is not None and port.main_engine.is_open:
+            return True
+    return False
+
+
+def acquirePorts(PortList, needTesting=True, needSendTask=True, needOpenPort=True):
+    # returns True if PortList already had open ports
+    global holders
+    with registryLock:
+        holders += 1
+        if needOpenPort and portsOpen(PortList):
+            logger.info(f"Reuse the open ports: {list(PortList.values())}")
+            return True
+        connectPort(PortList, needTesting, needSendTask, needOpenPort)
+        return False
+
+
+def releasePorts(PortList):
+    # returns True if the ports are closed, i.e. nobody else holds them and no launcher keeps them open
+    global holders
+    with registryLock:
+        holders = max(0, holders - 1)
+        if holders > 0 or keepOpen:
+            return False
+        closeAllSerial(PortList)
+        return True
+
+
+def keepPortsOpen(keep=True):
+    global keepOpen
+    keepOpen = keep
+
+
+def closePorts(PortList):
+    # close the ports whoever holds them, e.g. before the firmware uploader takes the port
+    global holders
+    with registryLock:
+        holders = 0
+        if len(PortList):
+            closeAllSerial(PortList)
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# A long-lived thread per port that runs the tasks sent to that port in order.
+# Broadcasting to several robots only puts the task on their queues instead of starting a thread per command.
+# Shared by ardSerial.py and BittyGPT/bitty_gpt.py, each with its own sendTask.
+# e.g.
+# worker = PortWorker(port, lambda port, task, timeout: sendTask(goodPorts, port, task, timeout))
+# worker.submit(['kbalance', 1]).result()    # what sendTask returned
+# worker.call(port.flush_input)    # any function, in order with the tasks
+
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class PortWorker:
+    def __init__(self, port, sendTask):
+        self.port = port
+        self.sendTask = sendTask    # sendTask(port, task, timeout), what submit() runs
+        self.tasks = queue.Queue()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, task, timeout=0):
+        # returns a Future whose result is what sendTask returns for this port
+        return self.call(self.sendTask, self.port, task, timeout)
+
+    def call(self, function, *args):
+        # run function(*args) on the worker thread after the tasks already queued. returns a Future
+        future = Future()
+        if threading.current_thread() is self.thread:    # a task of this worker sends another one
+            future.set_result(function(*args))
+            return future
+        self.tasks.put([function, args, future])
+        return future
+
+    def run(self):
+        while True:
+            item = self.tasks.get()
+            if item is None:
+                break
+            function, args, future = item
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                logger.info(f"Fail to run {function.__name__} on {self.port}: {e}")
+                future.set_result(-1)
+
+    def close(self):
+        self.tasks.put(None)
+        if self.thread is not threading.current_thread():
+            self.thread.join(10)
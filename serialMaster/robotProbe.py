@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# The '?' handshake that tells a robot from any other serial device, and waits for one that is still booting.
+# Shared by ardSerial.py, BittyGPT/bitty_gpt.py and BittyGPT/SerialManager.py, each with its own way to write.
+# The SerialCommunication of serialMaster names its methods Flush_Input, Expect..., the one of BittyGPT flush_input,
+# expect..., and both work.
+# e.g.
+# result = waitForRobot(port, lambda port: writeTask(port, ['?', 0]))
+# if result != -1:
+#     response, allPrints = result
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+probeInterval = 0.3    # seconds of silence before the '?' probe is sent again
+bootTimeout = 8    # seconds for a robot to boot and answer
+silentTimeout = 5    # seconds of probing a port that sends nothing at all before giving up on it
+
+
+def portMethods(serialObject):
+    # [flushInput, expect, waitResponse, cancel] of either SerialCommunication
+    if hasattr(serialObject, 'Expect'):
+        return [serialObject.Flush_Input, serialObject.Expect, serialObject.Wait_Response, serialObject.Cancel]
+    return [serialObject.flush_input, serialObject.expect, serialObject.wait_response, serialObject.cancel]
+
+
+def waitForRobot(serialObject, writeProbe, timeout=bootTimeout):
+    # returns [response, allPrints] of '?' as soon as the robot answers, or -1. writeProbe(serialObject) writes '?'.
+    # one '?' is kept outstanding. a robot that is up answers it at once, a booting one ('* Start *' of
+    # initRobot()) after 'Ready!'. it is sent again only while the port stays silent, e.g. when the bootloader took it.
+    flushInput, expect, waitResponse, cancel = portMethods(serialObject)
+    startTime = time.monotonic()
+    deadline = startTime + timeout
+    heard = flushInput()
+    lastOutput = startTime
+    waiter = None
+    booting = False
+    try:
+        while time.monotonic() < deadline:
+            if waiter is None:
+                waiter = expect('?')
+                writeProbe(serialObject)
+                probeTime = time.monotonic()
+            if waiter.event.wait(0.05):
+                response, allPrints = waitResponse(waiter, 0)
+                return [response, heard + allPrints]    # getModelAndVersion() looks for the model in the prints
+            now = time.monotonic()
+            if waiter.prints:
+                heard += waiter.prints
+                waiter.prints = ''
+                lastOutput = now
+            if not booting and '* Start *' in heard and 'Ready!' not in heard.split('* Start *')[-1]:
+                print('Waiting for the robot to boot up')
+                booting = True
+            if heard == '' and now - startTime > silentTimeout:
+                break
+            if now - lastOutput > probeInterval and now - probeTime > probeInterval:
+                cancel(waiter)    # an answer to it still reaches the next probe
+                waiter = None
+    except Exception as e:
+        logger.info(f"Fail to probe {serialObject.port}: {e}")
+    if waiter is not None:
+        cancel(waiter)
+    return -1
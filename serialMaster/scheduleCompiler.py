@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Compiles the motion tasks of a testSchedule into one K behavior, for schedulerToSkill().
+#   ['k' + posture, delay]        a frame of the posture
+#   ['i' or 'I', [j, a, ...], delay]    a frame of the previous pose with the joints moved together
+#   ['L', [16 angles], delay]     a frame of the angles
+#   ['m', [j, a, ...], delay]     a frame for each joint, moved one after another as the firmware does
+# The other tokens don't move the robot and are left out. The frames are written into one buffer allocated
+# for the most frames the schedule can make, then:
+#   a task that leaves the pose as it is only adds its delay to the frame before
+#   an 'i' or 'I' that follows a frame without delay shares it if they move different joints
+#   a delay longer than one frame can hold goes on copies of the frame
+# e.g.
+# skill = compileSchedule([['kbalance', 1], ['i', [8, -30, 12, 60], 0], ['i', [0, 30], 1]], postureAngles)
+
+from skill import DOF, Skill
+
+frameSize = 20    # the 16 angles, speed, delay, trigger axis, trigger angle of a behavior frame
+frameSpeed = 8    # the firmware transforms at speed / 4
+delayMilliseconds = 500    # milliseconds of a task for one unit of the delay column, as schedulerToSkill() converts them
+maxDelay = 127
+maxFrames = 128    # -period is a signed byte
+
+
+def delayUnits(seconds):
+    return int(seconds * 1000 / delayMilliseconds)
+
+
+def frameBound(schedule):
+    # the most frames the schedule can make
+    bound = 0
+    for task in schedule:
+        token = task[0][0]
+        if token == 'm':
+            bound += len(task[1]) // 2 + delayUnits(task[2]) // maxDelay
+        elif token == 'k':
+            bound += 1 + delayUnits(task[1]) // maxDelay
+        elif token in 'iIL':
+            bound += 1 + delayUnits(task[2]) // maxDelay
+    return bound
+
+
+def compileSchedule(schedule, postureAngles):
+    # returns the Skill of the schedule, or None if it doesn't move the robot.
+    # postureAngles(name) returns the 16 angles of a posture, or None
+    buffer = [0] * (frameBound(schedule) * frameSize)
+    frames = 0
+    pose = [0] * DOF    # the compiled skill can't know the pose of the robot before its first posture
+    shared = None    # the joints moved by the last frame while another 'i' may still share it
+
+    def addFrame(angles):
+        nonlocal frames
+        start = frames * frameSize
+        buffer[start:start + DOF] = angles
+        buffer[start + DOF] = frameSpeed
+        frames += 1
+
+    def addDelay(units):
+        nonlocal shared
+        delayIndex = (frames - 1) * frameSize + DOF + 1
+        while units > 0:
+            added = min(units, maxDelay - buffer[delayIndex])
+            buffer[delayIndex] += added
+            units -= added
+            if units > 0:
+                addFrame(pose)
+                delayIndex += frameSize
+        if buffer[delayIndex] > 0:
+            shared = None
+
+    def move(angles, moved, delay, share):
+        # moved: the joints that may share a frame with the next 'i', or None
+        nonlocal pose, shared
+        if frames > 0 and angles == pose:
+            addDelay(delay)
+            return
+        if share and shared is not None and shared.isdisjoint(moved):
+            buffer[(frames - 1) * frameSize:(frames - 1) * frameSize + DOF] = angles
+            shared.update(moved)
+        else:
+            addFrame(angles)
+            shared = set(moved) if share else None
+        pose = angles
+        addDelay(delay)
+
+    for task in schedule:
+        token = task[0][0]
+        if token == 'k':
+            angles = postureAngles(task[0][1:])
+            if angles is not None:
+                move(list(angles), None, delayUnits(task[1]), False)
+        elif token == 'L':
+            move(list(task[1][:DOF]), None, delayUnits(task[2]), False)
+        elif token in 'iI':
+            angles = list(pose)
+            indexedList = task[1]
+            for e in range(0, len(indexedList) - 1, 2):
+                angles[indexedList[e]] = indexedList[e + 1]
+            move(angles, indexedList[0::2], delayUnits(task[2]), True)
+        elif token == 'm':
+            indexedList = task[1]
+            last = len(indexedList) // 2 * 2 - 2    # the delay comes after the last joint
+            for e in range(0, len(indexedList) - 1, 2):
+                angles = list(pose)
+                angles[indexedList[e]] = indexedList[e + 1]
+                move(angles, None, delayUnits(task[2]) if e == last else 0, False)
+    if frames == 0:
+        return None
+    if frames > maxFrames:
+        raise ValueError(f"The schedule makes {frames} frames. A skill holds {maxFrames}")
+    return Skill([-frames, 0, 0, 1, 0, 0, 0] + buffer[:frames * frameSize])
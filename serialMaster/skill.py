@@ -0,0 +1,300 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# A skill of the K token in one signed byte buffer, laid out like the instinct arrays of the firmware (src/skill.h):
+#   period, pitch, roll, angleRatio                                    gaits (period > 1) and postures (period 1)
+#   period, pitch, roll, angleRatio, loopStart, loopEnd, loopRepeat    behaviors (period < 0)
+# then abs(period) frames of frameSize values:
+#   gait        the angles of the last 8 joints (12 on a 16 DoF robot that walks with its shoulders)
+#   posture     the angles of the 16 joints
+#   behavior    the angles of the 16 joints, speed, delay, trigger axis, trigger angle
+# The angles are kept divided by angleRatio, the way the firmware receives them, so every value fits in a byte.
+# frame(), frames() and joint() are read-only views of the buffer, not copies. encode() keeps the bytes of the K
+# command until the skill is changed through its setters.
+# e.g.
+# skill = Skill(var)    # the list of a K task, e.g. from a SkillLibrary file
+# skill.frame(0)    # memoryview of the first frame
+# skill.joint(8)    # memoryview of joint 8 in every frame
+# send(goodPorts, ['K', skill, 1])
+
+import re
+from array import array
+
+DOF = 16
+angleLimit = 125    # the angles of a skill with larger ones are sent divided by 2, with angleRatio 2
+
+
+def skillLayout(period, length):
+    # [header size, frame size] of a skill with length values, or ValueError if they do not fit its period
+    if period == 0:
+        raise ValueError("The period of a skill can't be 0")
+    header = 7 if period < 0 else 4
+    frames = abs(period)
+    if length <= header or (length - header) % frames != 0:
+        raise ValueError(f"{length - header} values don't make {frames} frames")
+    frameSize = (length - header) // frames
+    if period < 0:
+        expected = (20,)
+    elif period == 1:
+        expected = (16,)
+    else:
+        expected = (8, 12)
+    if frameSize not in expected:
+        raise ValueError(f"Frames of {frameSize} values don't fit a skill of period {period}")
+    return header, frameSize
+
+
+class Skill:
+    def __init__(self, data):
+        # data is the values of a K command: a list, bytes, an array('b') or another Skill.
+        # a list may hold angles beyond angleLimit. they are divided by 2 and angleRatio is set to 2
+        if isinstance(data, Skill):
+            self.data = array('b', data.data)
+        elif isinstance(data, (bytes, bytearray, memoryview)):
+            self.data = array('b')
+            self.data.frombytes(data)
+        else:
+            if not isinstance(data, (list, tuple, array)):
+                data = list(data)    # read an iterator once
+            try:
+                self.data = array('b', data)    # a list of ints within a byte. larger angles are halved below
+            except (TypeError, OverflowError):    # floats or angles beyond a byte
+                values = [int(v) for v in data]
+                if len(values) == 0:
+                    raise ValueError("Empty skill")
+                header, frameSize = skillLayout(values[0], len(values))
+                if halveLargeAngles(values, header, frameSize):
+                    values[3] = 2
+                try:
+                    self.data = array('b', values)
+                except OverflowError:
+                    raise ValueError(f"A value of the skill is out of -128 to 127: {values[:header]}...")
+            else:
+                if len(self.data) == 0:
+                    raise ValueError("Empty skill")
+                header, frameSize = skillLayout(self.data[0], len(self.data))
+                if halveLargeAngles(self.data, header, frameSize):
+                    self.data[3] = 2
+        self.headerSize, self.frameSize = skillLayout(self.data[0], len(self.data))
+        self.view = memoryview(self.data).toreadonly()
+        self.encoded = None
+
+    @classmethod
+    def parse(cls, text):
+        # a skill from the text of its C array, e.g. the Data section of a SkillLibrary file: '{ 1, 0, 0, 1, ... };'
+        if '{' in text:
+            text = text[text.index('{') + 1:]
+        if '}' in text:
+            text = text[:text.index('}')]
+        return cls([int(n) for n in re.findall(r'-?\d+', text)])
+
+    @classmethod
+    def fromFrames(cls, frames, pitch=0, roll=0, loop=None):
+        # a skill from its rows of real angles. loop = [loopStart, loopEnd, loopRepeat] makes a behavior
+        values = []
+        for row in frames:
+            values += row
+        if loop is None:
+            header = [len(frames), pitch, roll, 1]
+        else:
+            header = [-len(frames), pitch, roll, 1] + list(loop)
+        return cls(header + values)
+
+    def modified(self):
+        self.encoded = None
+
+    # the header
+    @property
+    def period(self):
+        return self.data[0]
+
+    @property
+    def pitch(self):
+        return self.data[1]
+
+    @pitch.setter
+    def pitch(self, value):
+        self.data[1] = value
+        self.modified()
+
+    @property
+    def roll(self):
+        return self.data[2]
+
+    @roll.setter
+    def roll(self, value):
+        self.data[2] = value
+        self.modified()
+
+    @property
+    def angleRatio(self):
+        return self.data[3]
+
+    @property
+    def loop(self):
+        # [loopStart, loopEnd, loopRepeat] of a behavior, or None
+        if self.period > 0:
+            return None
+        return self.data[4:7].tolist()
+
+    @loop.setter
+    def loop(self, value):
+        if self.period > 0:
+            raise ValueError("Only a behavior has a loop")
+        self.data[4:7] = array('b', value)
+        self.modified()
+
+    @property
+    def frameCount(self):
+        return abs(self.period)
+
+    @property
+    def angleColumns(self):
+        return min(DOF, self.frameSize)
+
+    @property
+    def firstJoint(self):
+        # the joint of the first column. a gait leaves out the head and the other joints that do not walk
+        return DOF - self.angleColumns
+
+    @property
+    def kind(self):
+        if self.period < 0:
+            return 'behavior'
+        if self.period == 1:
+            return 'posture'
+        return 'gait'
+
+    # views of the buffer
+    def frame(self, f):
+        start = self.headerSize + f * self.frameSize
+        if not 0 <= f < self.frameCount:
+            raise IndexError(f"The skill has {self.frameCount} frames")
+        return self.view[start:start + self.frameSize]
+
+    def frames(self):
+        # all the frames as a 2 dimensional view. [f, column] reads one value, tolist() copies the rows
+        return self.view[self.headerSize:].cast('b', [self.frameCount, self.frameSize])
+
+    def joint(self, j):
+        # the stored angles of joint j in every frame
+        column = j - self.firstJoint
+        if not 0 <= column < self.angleColumns:
+            raise IndexError(f"Joint {j} is not in the frames of this {self.kind}")
+        return self.view[self.headerSize + column::self.frameSize]
+
+    def frameValues(self, f):
+        # the values of frame f with the real angles, i.e. multiplied by angleRatio
+        values = self.frame(f).tolist()
+        if self.angleRatio > 1:
+            values[:self.angleColumns] = [angle * self.angleRatio for angle in values[:self.angleColumns]]
+        return values
+
+    # changes
+    def setFrame(self, f, values):
+        # values as stored, i.e. with the angles divided by angleRatio
+        self.frame(f)
+        start = self.headerSize + f * self.frameSize
+        self.data[start:start + self.frameSize] = array('b', values)
+        self.modified()
+
+    def setValue(self, f, column, value):
+        self.frame(f)
+        self.data[self.headerSize + f * self.frameSize + column] = value
+        self.modified()
+
+    # other forms
+    def encode(self):
+        # the bytes of the K command
+        if self.encoded is None:
+            self.encoded = b'K' + self.data.tobytes() + b'~'
+        return self.encoded
+
+    def toList(self):
+        return self.data.tolist()
+
+    def text(self):
+        # the C array, as SkillComposer exports it
+        lines = ['{', ('{:>4},' * 4).format(*self.data[:4])]
+        if self.headerSize > 4:
+            lines.append(('{:>4},' * 3).format(*self.data[4:7]))
+        for row in self.frames().tolist():
+            lines.append(('{:>4},' * self.frameSize).format(*row))
+        lines.append('};')
+        return '\n'.join(lines)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __eq__(self, other):
+        if isinstance(other, Skill):
+            return self.data == other.data
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Skill({self.kind}, {self.frameCount} frames of {self.frameSize}, angleRatio {self.angleRatio})"
+
+
+largeBytes = (b'\x7e', b'\x7f', b'\x80', b'\x81', b'\x82')    # 126, 127, -128, -127, -126 as signed bytes
+halvedBytes = bytes((((b ^ 0x80) - 0x80) // 2) & 0xFF for b in range(256))    # a signed byte to half of it, for translate()
+
+
+def halveLargeAngles(values, start, frameSize):
+    # values[start:] are frames of frameSize values. if an angle is beyond angleLimit, divide all the angles by 2
+    # in place and return True. the firmware multiplies them back by angleRatio (transform() in src/motion.h).
+    # works on whole columns, or on the whole body when every column is an angle, instead of value by value.
+    # the buffer of an array('b') is scanned and translated as bytes
+    if isinstance(values, array) and values.typecode == 'b':
+        return halveLargeBytes(values, start, frameSize)
+    angleColumns = min(DOF, frameSize)
+    body = values[start:]
+    distinct = set(body)    # one pass over the body. max() and min() of it are then almost free
+    if not distinct or (max(distinct) <= angleLimit and min(distinct) >= -angleLimit):
+        return False    # the common case, whatever the columns are
+    if angleColumns == frameSize:
+        values[start:] = [v // 2 for v in body]
+        return True
+    large = {v for v in distinct if v > angleLimit or v < -angleLimit}
+    columns = [body[c::frameSize] for c in range(angleColumns)]
+    if all(large.isdisjoint(column) for column in columns):
+        return False    # only the speed, delay or trigger of a behavior is beyond angleLimit
+    for c in range(angleColumns):
+        values[start + c::frameSize] = [v // 2 for v in columns[c]]
+    return True
+
+
+def halveLargeBytes(values, start, frameSize):
+    # halveLargeAngles() of an array('b')
+    angleColumns = min(DOF, frameSize)
+    body = bytearray(memoryview(values)[start:].cast('B'))
+    if not any(large in body for large in largeBytes):
+        return False
+    if angleColumns == frameSize:
+        body = body.translate(halvedBytes)
+    else:
+        if not any(large in body[c::frameSize] for c in range(angleColumns) for large in largeBytes):
+            return False
+        for c in range(angleColumns):
+            body[c::frameSize] = body[c::frameSize].translate(halvedBytes)
+    memoryview(values).cast('B')[start:] = body
+    return True
+
+
+def splitLargeAngles(angles):
+    # the L command has no angle ratio. returns [the angles clamped to angleLimit, [joint, angle, ...] beyond it],
+    # the second for an 'i' command that follows the L. angles is not changed
+    if max(angles) <= angleLimit and min(angles) >= -angleLimit:
+        return list(angles), []
+    large = [j for j, angle in enumerate(angles) if angle > angleLimit or angle < -angleLimit]
+    clamped = list(angles)
+    indexedList = []
+    for j in large:
+        clamped[j] = angleLimit if angles[j] > 0 else -angleLimit
+        indexedList += [j, angles[j]]
+    return clamped, indexedList
@@ -0,0 +1,294 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# One index of the skills spread over the repository and the config directory:
+#   SkillLibrary/<model>/*.md    the skills shared as markdown, and the ones exported by the Skill Composer
+#   src/Instinct*.h              the const int8_t arrays of the firmware
+#   example.py, demos/*.py       the skill lists of the scripts
+# Each file is parsed once. The skills are kept in skillIndex.bin, the int8 buffers of their Skill one after another,
+# and skillIndex.json, the table of their names, models, kinds and offsets for every file with its mtime and size.
+# A later run maps the .bin file and parses only the files that changed since.
+# e.g.
+# lib = library()
+# lib.skill('hi', 'Bittle')    # a Skill, or None
+# lib.entries(model='Nybble', kind='posture')    # [LibrarySkill]
+
+import ast
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+
+from deviceCache import configDir
+from skill import Skill
+
+logger = logging.getLogger(__name__)
+
+serialMasterDir = os.path.dirname(os.path.abspath(__file__))
+repoDir = os.path.dirname(serialMasterDir)
+indexDir = os.path.join(configDir, 'skillIndex')
+indexVersion = 1
+refreshPeriod = 2    # seconds between the checks of the file times by the lookups
+
+# the sources in the order of precedence for skills of the same name and model
+sourcePatterns = [
+    os.path.join(configDir, 'SkillLibrary', '*', '*.md'),    # exported by the Skill Composer
+    os.path.join(repoDir, 'SkillLibrary', '*', '*.md'),
+    os.path.join(repoDir, 'src', 'Instinct*.h'),
+    os.path.join(serialMasterDir, 'example.py'),
+    os.path.join(serialMasterDir, 'demos', '*.py'),
+]
+headerModels = {'BITTLE': 'Bittle', 'NYBBLE': 'Nybble'}    # the #define of an Instinct header
+pythonModel = 'Bittle'    # the skills of example.py and the demos are written for Bittle
+fallbackModels = {'BittleX': 'Bittle', 'BittleR': 'Bittle', 'DoF16': 'Bittle'}    # models that use Bittle's skills too
+
+cArrayPattern = re.compile(r'(?:int8_t\s+(\w+)\s*\[\s*\]\s*(?:PROGMEM\s*)?=\s*)?\{([^{}]*)\}')
+
+
+def parseSkillArrays(text):
+    # [[name, values]] of the C arrays in text. an array without a declaration, e.g. in a SkillLibrary file, has no name
+    return [[name, [int(n) for n in re.findall(r'-?\d+', data)]] for name, data in cArrayPattern.findall(text)]
+
+
+def parseMarkdown(fileName, text):
+    # [[name, model, values]] of a SkillLibrary file. only the K skills; the I and B files are not skills
+    token = re.search(r'^#\s*Token\s*\n\s*(\S+)', text, re.MULTILINE)
+    if token is not None and token.group(1) != 'K':
+        return []
+    data = re.search(r'^#\s*Data\s*$', text, re.MULTILINE)
+    if data is None:
+        return []
+    model = os.path.basename(os.path.dirname(fileName))
+    name = os.path.splitext(os.path.basename(fileName))[0]
+    return [[name, model, values] for n, values in parseSkillArrays(text[data.end():])[:1]]
+
+
+def parseHeader(fileName, text):
+    define = re.search(r'^#define\s+(\w+)', text, re.MULTILINE)
+    model = headerModels.get(define.group(1), define.group(1)) if define else ''
+    if os.path.basename(fileName).lower().endswith('_arm.h'):
+        model += 'R'    # the Bittle with the robotic arm
+    return [[name, model, values] for name, values in parseSkillArrays(text) if name]
+
+
+def parsePython(fileName, text):
+    # the module level lists of integers, e.g. sit = [1, 0, -30, 1, ...]
+    skills = []
+    for node in ast.parse(text, fileName).body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.List) and len(node.value.elts) > 4:
+            try:
+                values = ast.literal_eval(node.value)
+            except ValueError:
+                continue
+            if all(isinstance(v, int) for v in values):
+                skills += [[target.id, pythonModel, values] for target in node.targets if isinstance(target, ast.Name)]
+    return skills
+
+
+def parseSource(fileName):
+    with open(fileName, encoding='utf-8') as f:
+        text = f.read()
+    if fileName.endswith('.md'):
+        return parseMarkdown(fileName, text)
+    if fileName.endswith('.h'):
+        return parseHeader(fileName, text)
+    return parsePython(fileName, text)
+
+
+class LibrarySkill:
+    # an entry of the index. skill reads its buffer from the mapped index
+    def __init__(self, library, name, model, kind, source, offset, length):
+        self.library = library
+        self.name = name
+        self.model = model
+        self.kind = kind
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+    @property
+    def skill(self):
+        return self.library.readSkill(self.offset, self.length)
+
+    def __repr__(self):
+        return f"LibrarySkill({self.model}/{self.name}, {self.kind}, {os.path.basename(self.source)})"
+
+
+class SkillLibrary:
+    def __init__(self, patterns=None, directory=indexDir):
+        self.patterns = sourcePatterns if patterns is None else patterns
+        self.dataFile = os.path.join(directory, 'skillIndex.bin')
+        self.tableFile = os.path.join(directory, 'skillIndex.json')
+        self.lock = threading.RLock()
+        self.files = {}    # {fileName: {'mtime': ns, 'size': bytes, 'skills': [[name, model, kind, offset, length]]}}
+        self.buffer = None    # the mapped skillIndex.bin, or the bytes of a library that could not be saved
+        self.entryList = []
+        self.lastCheck = 0
+        self.load()
+
+    def sourceFiles(self):
+        fileNames = []
+        for pattern in self.patterns:
+            for fileName in sorted(glob.glob(os.path.abspath(pattern))):
+                if fileName not in fileNames:
+                    fileNames.append(fileName)
+        return fileNames
+
+    def load(self):
+        # the saved index, if it is complete and of this version
+        try:
+            with open(self.tableFile, encoding='utf-8') as f:
+                table = json.load(f)
+            if table.get('version') != indexVersion:
+                return
+            with open(self.dataFile, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size != table.get('size'):
+                    return
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+        except (OSError, ValueError) as e:
+            logger.debug(f"No skill index to load: {e}")
+            return
+        self.files = table['files']
+        self.buffer = buffer
+        self.makeEntries()
+
+    def refresh(self, force=False):
+        # parse the new and changed files and save the index. returns the number of files parsed
+        with self.lock:
+            self.lastCheck = time.monotonic()
+            fileNames = self.sourceFiles()
+            files = {}
+            parsed = 0
+            for fileName in fileNames:
+                try:
+                    stat = os.stat(fileName)
+                except OSError:
+                    continue
+                old = self.files.get(fileName)
+                if not force and old is not None and old['mtime'] == stat.st_mtime_ns and old['size'] == stat.st_size:
+                    files[fileName] = old
+                    continue
+                try:
+                    skills = parseSource(fileName)
+                except (OSError, SyntaxError, UnicodeDecodeError) as e:
+                    logger.info(f"Fail to parse {fileName}: {e}")
+                    skills = []
+                files[fileName] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'skills': skills}
+                parsed += 1
+            if parsed == 0 and list(files) == list(self.files):
+                return 0
+            self.rebuild(files)
+            return parsed
+
+    def rebuild(self, files):
+        # files holds [name, model, kind, offset, length] of the unchanged files, [name, model, values] of the parsed
+        data = bytearray()
+        table = {}
+        for fileName, source in files.items():
+            skills = []
+            for record in source['skills']:
+                if len(record) == 5:
+                    name, model, kind, offset, length = record
+                    buffer = bytes(self.buffer[offset:offset + length])
+                else:
+                    name, model, values = record
+                    try:
+                        skill = Skill(values)
+                    except ValueError as e:
+                        logger.debug(f"{fileName}: {name} is not a skill: {e}")
+                        continue
+                    kind, buffer = skill.kind, skill.data.tobytes()
+                skills.append([name, model, kind, len(data), len(buffer)])
+                data += buffer
+            table[fileName] = {'mtime': source['mtime'], 'size': source['size'], 'skills': skills}
+        self.files = table
+        self.save(data)
+        self.makeEntries()
+
+    def makeEntries(self):
+        self.entryList = [LibrarySkill(self, name, model, kind, fileName, offset, length)
+                          for fileName, source in self.files.items() for name, model, kind, offset, length in source['skills']]
+
+    def save(self, data):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()    # Windows does not replace a mapped file
+        self.buffer = bytes(data)
+        try:
+            os.makedirs(os.path.dirname(self.dataFile), exist_ok=True)
+            with open(self.dataFile + '.tmp', 'wb') as f:
+                f.write(data)
+            with open(self.tableFile + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'version': indexVersion, 'size': len(data), 'files': self.files}, f)
+            os.replace(self.dataFile + '.tmp', self.dataFile)
+            os.replace(self.tableFile + '.tmp', self.tableFile)
+        except OSError as e:
+            logger.info(f"Fail to save the skill index: {e}")
+            return
+        if len(data) > 0:
+            with open(self.dataFile, 'rb') as f:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def readSkill(self, offset, length):
+        with self.lock:
+            return Skill(self.buffer[offset:offset + length])
+
+    def checkFiles(self):
+        if time.monotonic() - self.lastCheck > refreshPeriod:
+            self.refresh()
+
+    def entries(self, model=None, kind=None, name=None):
+        # the skills of model (and of the model it borrows from) in the order of precedence,
+        # one for each name unless model is None
+        with self.lock:
+            self.checkFiles()
+            models = None
+            if model is not None:
+                model = model.replace(' ', '')
+                models = [model] + ([fallbackModels[model]] if model in fallbackModels else [])
+            found = []
+            seen = set()
+            for m in (models or [None]):
+                for entry in self.entryList:
+                    if m is not None and entry.model != m:
+                        continue
+                    if kind is not None and entry.kind != kind or name is not None and entry.name != name:
+                        continue
+                    if models is not None:
+                        if entry.name in seen:
+                            continue
+                        seen.add(entry.name)
+                    found.append(entry)
+            return found
+
+    def fileEntries(self, fileName):
+        # the skills of one source file, e.g. an Instinct header, in their order in the file
+        fileName = os.path.normcase(os.path.abspath(fileName))
+        with self.lock:
+            self.checkFiles()
+            return [entry for entry in self.entryList if os.path.normcase(entry.source) == fileName]
+
+    def names(self, model=None, kind=None):
+        return [entry.name for entry in self.entries(model, kind)]
+
+    def skill(self, name, model=None):
+        # the Skill called name, or None
+        found = self.entries(model, name=name)
+        return found[0].skill if found else None
+
+
+sharedLibrary = None
+libraryLock = threading.Lock()
+
+
+def library():
+    # the library shared by the tools of the process
+    global sharedLibrary
+    with libraryLock:
+        if sharedLibrary is None:
+            sharedLibrary = SkillLibrary()
+        return sharedLibrary
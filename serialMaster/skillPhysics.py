@@ -0,0 +1,268 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Screens skills for falls on the MuJoCo model of Bittle, Resources/SimulationModels/bittle_simple.xml, before they
+# touch a robot. The model gets a position servo on each of its eight leg joints, with the kp of the actuators
+# commented out in the file and the torque and speed of Bittle's servos scaled to the weight of the model, and is
+# compiled once in each process of a pool, with the implicitfast integrator. Every skill is played headless and as
+# fast as the physics goes: virtualRobot.py turns it into the targets of the servos at each step of the firmware,
+# eased transitions, gait frames and delays included. The robot starts standing on the first frame and holds the
+# last one for settleSeconds at the end. For each skill it reports:
+#   maxTilt     the largest angle of the torso from level, degrees, and maxPitch and maxRoll the same about one axis
+#   finalTilt   the angle of the torso from level at the end
+#   fell        finalTilt beyond fallTilt, i.e. the robot ended on its side or its back, or the physics diverged
+#   diverged    the accelerations blew up (MuJoCo's bad qacc warning), and divergedAt the time of the skill it did
+#   distance    how far the torso travelled on the ground from the start of the skill, meters, forward the part of it
+#               toward the head at the start, and turn the change of heading, degrees to the left
+# It needs MuJoCo and NumPy (pip3 install mujoco numpy). Only Bittle has a simulation model.
+# e.g.
+# results = evaluateSkills(libraryJobs('Bittle', ['gait']) + variantJobs([0.5, 2], 'Bittle'))
+# [result['name'] for result in results if result['fell']]
+# python3 skillPhysics.py --kinds gait behavior --factors 0.5 2    # the library and its gait variants
+# python3 skillPhysics.py --files ../SkillLibrary/Bittle/*.md    # exits with 1 if a skill fell
+
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import time
+
+try:
+    import mujoco
+except ImportError:
+    mujoco = None
+
+from kinematics import LegModel, legJoints, numpy, requireNumpy, skillAngles
+from skill import Skill
+from skillLibrary import fallbackModels, library, parseSource
+from skillTransform import scaleLibrary, variantName
+from virtualRobot import VirtualRobot
+
+serialMasterDir = os.path.dirname(os.path.abspath(__file__))
+mjcfFile = os.path.join(os.path.dirname(serialMasterDir), 'Resources', 'SimulationModels', 'bittle_simple.xml')
+servoGain = 150    # N m / rad of the position servos, as in the actuators commented out in the model
+servoTorque = 20    # N m at most: like Bittle's servos, about 6 times what a leg bears standing on the 29 kg model
+servoDamping = 2    # N m s / rad: the torque is gone at about 10 rad/s, the top speed of the servos
+gaitSeconds = 3    # how long a gait is played
+settleSeconds = 1    # the first frame is held before a skill, the last one after it
+fallTilt = 60    # degrees from level at the end that count as a fall
+stepSeconds = 0.002    # a step of transform(): the 16 servos written
+frameSeconds = 0.02    # a gait frame: a whole pass of the loop, with the IMU read. faster frames make the gaits skate
+groundGap = 0.0005    # meters between the lowest point of the robot and the floor at the start
+foreverLoops = 3    # the repeats of the loop of a behavior that repeats it forever
+
+
+def requireMujoco():
+    requireNumpy()
+    if mujoco is None:
+        raise ImportError("skillPhysics.py needs MuJoCo: pip3 install mujoco")
+
+
+def simulated(model):
+    # whether model walks on the legs of the simulation model
+    model = (model or 'Bittle').replace(' ', '')
+    return fallbackModels.get(model, model).startswith('Bittle')
+
+
+def modelXml(fileName=mjcfFile):
+    # the MJCF of the robot with a position servo on each leg joint, in the order of legJoints
+    with open(fileName, encoding='utf-8') as f:
+        text = f.read()
+    servos = ''.join(f'        <position name="{joint}_servo" joint="{joint}" kp="{servoGain}" kv="{servoDamping}" '
+                     f'forcerange="{-servoTorque} {servoTorque}"/>\n'
+                     for leg in legJoints for index, joint in leg)
+    end = text.rindex('</mujoco>')
+    return text[:end] + '    <actuator>\n' + servos + '    </actuator>\n' + text[end:]
+
+
+# one model per process, compiled by startWorker()
+worker = {}
+
+
+def startWorker(xml):
+    requireMujoco()
+    model = mujoco.MjModel.from_xml_string(xml)
+    model.opt.integrator = mujoco.mjtIntegrator.mjINT_IMPLICITFAST    # the damping of the servos, stable at 1 ms
+    mujoco.set_mju_user_warning(lambda message: None)    # evaluate() reports them, instead of MUJOCO_LOG.TXT
+    worker['model'] = model
+    worker['data'] = mujoco.MjData(model)
+    worker['legs'] = LegModel()
+    worker['torso'] = model.body('torso').id
+    worker['joints'] = [model.joint(joint).qposadr[0] for leg in legJoints for index, joint in leg]
+    solid = (model.geom_contype | model.geom_conaffinity) > 0
+    worker['capsules'] = numpy.flatnonzero(solid & (model.geom_type == mujoco.mjtGeom.mjGEOM_CAPSULE))
+    worker['boxes'] = numpy.flatnonzero(solid & (model.geom_type == mujoco.mjtGeom.mjGEOM_BOX))
+
+
+def skillTimeline(skill, seconds=gaitSeconds, settle=settleSeconds, step=stepSeconds, frame=frameSeconds):
+    # [times, angles: times x 16] of the skill as the firmware plays it from its first frame. [start, end] of the
+    # skill itself are the times of its first and last step
+    if skill.kind == 'behavior' and skill.loop[2] < 0:
+        skill = Skill(skill)
+        skill.loop = skill.loop[:2] + [foreverLoops]
+    robot = VirtualRobot('Bittle', stepSeconds=step, frameSeconds=frame)
+    robot.currentAng = skillAngles(skill)[0].tolist()
+    robot.times, robot.poses = [], []
+    robot.record()
+    robot.wait(settle)
+    start = robot.clock
+    robot.playTask(['K', skill, seconds if skill.kind == 'gait' else 0])
+    end = robot.clock
+    robot.wait(settle)
+    robot.record()
+    return numpy.array(robot.times), numpy.array(robot.poses), start, end
+
+
+def lowestPoint(model, data):
+    # the height of the lowest point of the geoms that touch the floor
+    capsules, boxes = worker['capsules'], worker['boxes']
+    xmat = data.geom_xmat.reshape(-1, 3, 3)
+    size = model.geom_size
+    capsuleLow = data.geom_xpos[capsules, 2] - numpy.abs(xmat[capsules, 2, 2]) * size[capsules, 1] - size[capsules, 0]
+    boxLow = data.geom_xpos[boxes, 2] - (numpy.abs(xmat[boxes, 2, :]) * size[boxes]).sum(1)
+    return min(capsuleLow.min(initial=math.inf), boxLow.min(initial=math.inf))
+
+
+def evaluate(job, seconds=gaitSeconds, settle=settleSeconds, step=stepSeconds, frame=frameSeconds, tilt=fallTilt):
+    # the metrics of one job, [name, model, kind, the bytes of the Skill], in the process of startWorker()
+    name, model, kind, data = job
+    startTime = time.perf_counter()
+    times, angles, start, end = skillTimeline(Skill(data), seconds, settle, step, frame)
+    legs = worker['legs']
+    targets = legs.urdfAngles(angles).reshape(len(angles), -1)
+    physics, state = worker['model'], worker['data']
+    torso, joints = worker['torso'], worker['joints']
+    mujoco.mj_resetData(physics, state)
+    state.qpos[joints] = targets[0]
+    mujoco.mj_kinematics(physics, state)
+    state.qpos[2] += groundGap - lowestPoint(physics, state)
+
+    timestep = physics.opt.timestep
+    ends = numpy.append(times[1:], times[-1] + timestep)
+    tilts, pitches, rolls = [], [], []
+    origin = heading = None
+    badAcceleration = state.warning[mujoco.mjtWarning.mjWARN_BADQACC]
+    divergedAt = None
+    for target, until in zip(targets, ends):
+        state.ctrl[:] = target
+        now = state.time
+        steps = int(round((until - now) / timestep))
+        if steps > 0:
+            mujoco.mj_step(physics, state, steps)
+        if badAcceleration.number > 0 or not numpy.isfinite(state.qpos).all():
+            divergedAt = now - start    # MuJoCo has reset the data
+            break
+        rotation = state.xmat[torso].reshape(3, 3)
+        tilts.append(math.acos(max(-1, min(1, rotation[2, 2]))))
+        pitches.append(-math.asin(max(-1, min(1, rotation[2, 1]))))    # the head down
+        rolls.append(math.asin(max(-1, min(1, rotation[2, 0]))))    # the left side down
+        if origin is None and state.time >= start:
+            origin = state.qpos[:2].copy()
+            heading = rotation[:2, 1].copy()
+    diverged = divergedAt is not None
+    result = {'name': name, 'model': model, 'kind': kind, 'seconds': float(times[-1]), 'skillSeconds': end - start,
+              'diverged': diverged, 'divergedAt': divergedAt}
+    if diverged or origin is None:
+        result.update({'maxTilt': math.nan, 'maxPitch': math.nan, 'maxRoll': math.nan, 'finalTilt': math.nan,
+                       'fell': True, 'distance': math.nan, 'forward': math.nan, 'turn': math.nan})
+    else:
+        moved = state.qpos[:2] - origin
+        final = state.xmat[torso].reshape(3, 3)[:2, 1]
+        result.update({
+            'maxTilt': math.degrees(max(tilts)), 'maxPitch': math.degrees(max(map(abs, pitches))),
+            'maxRoll': math.degrees(max(map(abs, rolls))), 'finalTilt': math.degrees(tilts[-1]),
+            'fell': math.degrees(tilts[-1]) > tilt,
+            'distance': float(numpy.hypot(*moved)), 'forward': float(moved @ heading / numpy.hypot(*heading)),
+            'turn': math.degrees(math.atan2(heading[0] * final[1] - heading[1] * final[0], heading @ final))})
+    result['wall'] = time.perf_counter() - startTime
+    return result
+
+
+def evaluateJob(arguments):
+    job, options = arguments
+    return evaluate(job, **options)
+
+
+def evaluateSkills(jobs, processes=None, **options):
+    # the metrics of evaluate() of each job, in their order. processes=1 runs them in this process
+    requireMujoco()
+    xml = modelXml()
+    work = [[job, options] for job in jobs]
+    if processes == 1:
+        startWorker(xml)
+        return [evaluateJob(arguments) for arguments in work]
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=startWorker, initargs=(xml,)) as pool:
+        return list(pool.map(evaluateJob, work))
+
+
+def libraryJobs(model='Bittle', kinds=('gait', 'behavior', 'posture')):
+    # the jobs of the skills of the library, e.g. the SkillLibrary submissions and the Instinct arrays
+    if not simulated(model):
+        raise ValueError(f"{model} has no simulation model")
+    return [[entry.name, entry.model, entry.kind, entry.skill.data.tobytes()]
+            for kind in kinds for entry in library().entries(model, kind)]
+
+
+def variantJobs(factors, model='Bittle', kinds=('gait',)):
+    # the jobs of the slower and faster variants of scaleLibrary()
+    if not simulated(model):
+        raise ValueError(f"{model} has no simulation model")
+    return [[variantName(entry.name, factor), entry.model, skill.kind, skill.data.tobytes()]
+            for entry, factor, skill in scaleLibrary(factors, model, kinds)]
+
+
+def fileJobs(fileNames):
+    # the jobs of the skills in files the library reads: SkillLibrary markdown, Instinct headers, skill lists
+    jobs = []
+    for fileName in fileNames:
+        for name, model, values in parseSource(fileName):
+            skill = Skill(values)
+            jobs.append([name or os.path.basename(fileName), model, skill.kind, skill.data.tobytes()])
+    return jobs
+
+
+def report(results):
+    lines = [f"{'skill':20} {'kind':8} {'seconds':>7} {'maxTilt':>7} {'pitch':>6} {'roll':>6} {'final':>6} "
+             f"{'distance mm':>11} {'forward mm':>10} {'turn':>6}"]
+    for r in results:
+        lines.append(f"{r['name']:20} {r['kind']:8} {r['seconds']:7.2f} {r['maxTilt']:7.1f} {r['maxPitch']:6.1f} "
+                     f"{r['maxRoll']:6.1f} {r['finalTilt']:6.1f} {r['distance'] * 1000:11.1f} "
+                     f"{r['forward'] * 1000:10.1f} {r['turn']:6.1f}"
+                     + (f"  DIVERGED at {r['divergedAt']:.2f} s" if r['diverged'] else '  FELL' if r['fell'] else ''))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Screen skills for falls on the MuJoCo model of Bittle')
+    parser.add_argument('--model', default='Bittle')
+    parser.add_argument('--kinds', nargs='*', default=['gait', 'behavior', 'posture'],
+                        choices=['gait', 'behavior', 'posture'], help='the kinds of the library skills. none skips them')
+    parser.add_argument('--factors', type=float, nargs='*', default=[],
+                        help='also the variants of the gaits that play this many times as long')
+    parser.add_argument('--files', nargs='*', default=[], help='also the skills of these files')
+    parser.add_argument('--processes', type=int, help='the size of the pool. 1 runs in this process')
+    parser.add_argument('--gait-seconds', type=float, default=gaitSeconds)
+    parser.add_argument('--settle-seconds', type=float, default=settleSeconds)
+    parser.add_argument('--step-ms', type=float, default=stepSeconds * 1000, help='time of one transform step in ms')
+    parser.add_argument('--frame-ms', type=float, default=frameSeconds * 1000, help='time of one gait frame in ms')
+    parser.add_argument('--fall-tilt', type=float, default=fallTilt)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+    jobs = libraryJobs(args.model, args.kinds) + variantJobs(args.factors, args.model) + fileJobs(args.files)
+    startTime = time.perf_counter()
+    results = evaluateSkills(jobs, args.processes, seconds=args.gait_seconds, settle=args.settle_seconds,
+                             step=args.step_ms / 1000, frame=args.frame_ms / 1000, tilt=args.fall_tilt)
+    wall = time.perf_counter() - startTime
+    print(report(results))
+    robotSeconds = sum(r['seconds'] for r in results)
+    falls = [r['name'] for r in results if r['fell']]
+    diverged = [r['name'] for r in results if r['diverged']]
+    print(f"{len(results)} skills, {robotSeconds:.1f} s of the robot in {wall:.1f} s, x{robotSeconds / wall:.0f} "
+          f"real time. {len(falls)} fell" + (': ' + ', '.join(falls) if falls else '')
+          + (f", of them {len(diverged)} diverged: " + ', '.join(diverged) if diverged else ''))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if falls:
+        raise SystemExit(1)
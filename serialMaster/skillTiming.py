@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# How long the robot is busy with a task, for the 'auto' wait mode of ardSerial (setWaitMode('auto')).
+# The firmware moves in steps of transform() (src/motion.h): round(the largest joint difference / speed) + 1 of them,
+# eased, then waits delay * 50 ms after each frame of a behavior, and answers with the token when the move is done.
+# TimingModel plays the tasks sent to a robot on a VirtualRobot that only counts the steps, so it knows the pose each
+# move starts from, and turns them into seconds with two numbers of the robot:
+#   stepSeconds     one step of transform(), the servos written once
+#   commandSeconds  the rest of a command: reading it (read_serial() waits for more bytes) and the echo
+# calibrate() measures them once on a robot from the time L moves of growing size take from the write to the echo,
+# and remembers them in the device cache. A gait has no end: it is given the seconds of its task after its first frame.
+# e.g.
+# calibrate(port)    # {'stepSeconds': ..., 'commandSeconds': ...}, saved for the robot on that port
+# setWaitMode('auto')    # send() then waits as long as the move takes, not the last element of the task
+# TimingModel('Bittle').taskSeconds(['ksit', 1])    # the seconds from writing ksit until the next task may be written
+
+import time
+
+from ardSerial import postureAngles, writeTask
+from deviceCache import deviceKey, lookupDevice, rememberDevice
+from virtualRobot import VirtualRobot
+
+defaultTiming = {
+    'stepSeconds': 0.002,    # as emulator.py. a NyBoard writes the PCA9685 over I2C
+    'commandSeconds': 0.006,    # read_serial() waits 1 ms after the token and 5 ms for more bytes
+}
+calibrationMoves = [10, 30, 60, 90, 120]    # degrees the head turns, there and back
+calibrations = {}    # {port name: timing} of the ports without a device key, e.g. pseudo terminals
+
+
+class StepCounter(VirtualRobot):
+    # a VirtualRobot that counts its steps instead of recording them
+    def __init__(self, model='Bittle', stepSeconds=0.002):
+        self.steps = 0
+        super().__init__(model, stepSeconds=stepSeconds)
+
+    def record(self):
+        self.steps += 1
+
+
+class TimingModel:
+    def __init__(self, model='Bittle', timing=None):
+        timing = dict(defaultTiming, **(timing or {}))
+        self.stepSeconds = timing['stepSeconds']
+        self.commandSeconds = timing['commandSeconds']
+        self.robot = StepCounter(model, self.stepSeconds)
+
+    def busySeconds(self, task):
+        # seconds from writing task until the robot has done it and answered. the pose follows the task
+        start = self.robot.clock
+        self.robot.playTask(list(task[:-1]) + [0])
+        return self.robot.clock - start + self.commandSeconds
+
+    def taskSeconds(self, task):
+        # seconds from writing task until the next task may be written: the move, and the seconds of a gait
+        seconds = self.busySeconds(task)
+        if task[0][0] in 'kK' and self.robot.skill.period > 1:
+            self.robot.idle(task[-1])
+            seconds += task[-1]
+        return seconds
+
+
+def deviceTiming(port):
+    # the calibrated timing of the robot on port, or None
+    name = str(port.port)
+    if name in calibrations:
+        return calibrations[name]
+    return (lookupDevice(deviceKey(name)) or {}).get('timing')
+
+
+def timedTask(port, task, timeout=5):
+    # seconds from writing task to its echo, or None without an echo
+    port.Start_Reader()
+    port.Flush_Input()
+    waiter = port.Expect(task[0][0])
+    start = time.monotonic()
+    writeTask(port, task)
+    if port.Wait_Response(waiter, timeout) == -1:
+        return None
+    return time.monotonic() - start
+
+
+def calibrate(port, model='Bittle'):
+    # fits stepSeconds and commandSeconds of the robot on port to L moves of the balance posture with the head
+    # turned by calibrationMoves, and remembers them. returns the timing, with 'residual': the largest error, seconds
+    balance = postureAngles('balance')
+    counter = StepCounter(model, stepSeconds=0)    # the clock only moves by the time of the bytes
+    points = []    # [steps, seconds less the bytes]
+    timedTask(port, ['L', balance, 0])
+    counter.playTask(['L', balance, 0])
+    for degrees in calibrationMoves:
+        turned = [degrees] + balance[1:]
+        for angles in [turned, balance]:
+            task = ['L', angles, 0]
+            seconds = timedTask(port, task)
+            start, steps = counter.clock, counter.steps
+            counter.playTask(task)
+            if seconds is not None:
+                points.append([counter.steps - steps, seconds - (counter.clock - start)])
+    if len(points) < 2:
+        raise RuntimeError(f"The robot on {port.port} didn't answer the calibration moves")
+    count = len(points)
+    meanSteps = sum(steps for steps, seconds in points) / count
+    meanSeconds = sum(seconds for steps, seconds in points) / count
+    variance = sum((steps - meanSteps) ** 2 for steps, seconds in points)
+    stepSeconds = sum((steps - meanSteps) * (seconds - meanSeconds) for steps, seconds in points) / variance
+    commandSeconds = max(0, meanSeconds - stepSeconds * meanSteps)
+    timing = {'stepSeconds': stepSeconds, 'commandSeconds': commandSeconds}
+    residual = max(abs(commandSeconds + stepSeconds * steps - seconds) for steps, seconds in points)
+    saveTiming(port, timing)
+    return dict(timing, residual=residual)
+
+
+def saveTiming(port, timing):
+    import ardSerial
+    name = str(port.port)
+    key = deviceKey(name)
+    if key is None:
+        calibrations[name] = timing
+    else:
+        rememberDevice(key, timing=timing)
+    ardSerial.timingModels.pop(port, None)    # the next task gets a model with the new timing
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    from SerialCommunication import Communication
+    parser = argparse.ArgumentParser(description='Calibrate the timing model of the robot on a serial port')
+    parser.add_argument('port', help='e.g. /dev/ttyACM0, COM3')
+    parser.add_argument('--model', default='Bittle')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serialObject = Communication(args.port, 115200, 1)
+    serialObject.Start_Reader()
+    time.sleep(3)    # the robot restarts when the port opens
+    serialObject.Flush_Input()
+    result = calibrate(serialObject, args.model)
+    print(f"step {result['stepSeconds'] * 1000:.3f} ms, command {result['commandSeconds'] * 1000:.2f} ms, "
+          f"largest error {result['residual'] * 1000:.1f} ms")
+    serialObject.Close_Engine()
@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Transforms of a Skill that the firmware plays back the same way, within a tolerance.
+# decimateSkill() removes the frames of a behavior that the transition between their neighbours passes within
+# tolerance degrees of. The firmware moves to each frame of a behavior with transform() (src/motion.h): steps =
+# round(the largest joint difference / (speed / 4)), eased by (1 - cos) / 2, then waits delay * 50 ms. A removed frame
+# has no delay and no trigger, and the speed of the frame after it is set so the merged transition takes the same
+# number of steps, so the timing is kept. Gaits keep all their frames: the firmware shows each one for a pass of the
+# loop without interpolating, so a gait with fewer frames would walk faster.
+# resampleSkill() interpolates a gait or a behavior to another number of frames, and scaleSkillTime() makes it slower
+# or faster: a gait by its number of frames, since the firmware shows one each pass of the loop, a behavior by its
+# speed and delay columns. The interpolation weights depend only on the number of frames before and after, so they
+# are computed once for them. With NumPy (pip3 install numpy) they are applied to the whole frame array at once, and
+# the speed and delay columns are scaled in place. Without it the same arithmetic runs one joint column after another.
+# scaleLibrary() does this across a whole library.
+# e.g.
+# smaller = decimateSkill(Skill.parse(text), 2)    # the joints stay within 2 degrees
+# slow = scaleSkillTime(library().skill('wkF', 'Bittle'), 2)    # walks at half the speed
+# variants = scaleLibrary([0.5, 2], 'Bittle')    # [[LibrarySkill, factor, Skill]] of every gait of Bittle
+# python3 skillTransform.py --factors 0.5 2 --model Bittle --output variants.h    # the same as C arrays
+
+import argparse
+import functools
+import math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from skill import DOF, Skill
+from skillLibrary import fallbackModels, library
+
+defaultTolerance = 2    # degrees
+speedColumn = DOF    # speed, delay, trigger axis and trigger angle follow the angles of a behavior frame
+delayColumn = DOF + 1
+triggerColumn = DOF + 2
+maxFrames = 127    # the period is a signed byte
+
+# the angleLimit of src/OpenCat.h, [lowest, highest] of each joint
+bittleLimits = [[-120, 120], [-85, 85], [-120, 120], [-120, 120], [-90, 60], [-90, 60], [-90, 90], [-90, 90],
+                [-200, 80], [-200, 80], [-80, 200], [-80, 200], [-80, 200], [-80, 200], [-80, 200], [-80, 200]]
+jointLimits = {
+    'Nybble': [[-120, 120], [-80, 45], [-120, 120], [-120, 120], [-90, 60], [-90, 60], [-90, 90], [-90, 90],
+               [-100, 80], [-100, 80], [-80, 100], [-80, 100], [-60, 120], [-60, 120], [-120, 60], [-120, 60]],
+    'Bittle': bittleLimits,
+    'BittleR': bittleLimits[:1] + [[-10, 180]] + bittleLimits[2:],    # the robotic arm
+}
+
+
+def transitionSteps(start, frame):
+    # the steps of transform() from the angles of start to frame, 0 if it jumps
+    speed = frame[speedColumn]
+    if speed <= 0:
+        return 0
+    maxDiff = max(abs(frame[j] - start[j]) for j in range(DOF))
+    return int(maxDiff * 4 / speed + 0.5)
+
+
+def mergedSpeed(start, end, steps):
+    # the speed column that makes transform() from start to end take steps, or None
+    maxDiff = max(abs(end[j] - start[j]) for j in range(DOF))
+    if steps == 0 or maxDiff == 0:
+        return None
+    speed = max(1, min(127, int(maxDiff * 4 / steps + 0.5)))
+    if abs(int(maxDiff * 4 / speed + 0.5) - steps) > 1:
+        return None
+    return speed
+
+
+def withinTolerance(rows, a, b, speed, tolerance):
+    # whether the transition from rows[a] to rows[b] at speed passes each frame between them within tolerance,
+    # at the step the frames before reached it
+    steps = int(max(abs(rows[b][j] - rows[a][j]) for j in range(DOF)) * 4 / speed + 0.5)
+    elapsed = 0
+    for f in range(a + 1, b):
+        elapsed += transitionSteps(rows[f - 1], rows[f])
+        eased = (1 - math.cos(math.pi * min(1, elapsed / steps))) / 2
+        for j in range(DOF):
+            if abs(rows[f][j] - (rows[a][j] + eased * (rows[b][j] - rows[a][j]))) > tolerance:
+                return False
+    return True
+
+
+def decimateSkill(skill, tolerance=defaultTolerance):
+    # returns a behavior without the frames the firmware reproduces within tolerance degrees, or skill itself
+    if skill.kind != 'behavior' or skill.frameCount < 3:
+        return skill
+    rows = [skill.frameValues(f) for f in range(skill.frameCount)]    # the real angles
+    loopStart, loopEnd, loopRepeat = skill.loop
+    fixed = {0, skill.frameCount - 1, loopStart, loopEnd}
+    removable = [f not in fixed and rows[f][delayColumn] == 0 and rows[f][triggerColumn] == 0
+                 and rows[f][speedColumn] > 0 for f in range(skill.frameCount)]
+
+    keys = [0]
+    speeds = {}    # {key frame: the speed of its merged transition}
+    a = 0
+    while a < skill.frameCount - 1:
+        b = a + 1
+        best = None
+        steps = transitionSteps(rows[a], rows[b])
+        while b + 1 < skill.frameCount and removable[b] and rows[b + 1][speedColumn] > 0 and b + 1 != loopStart:
+            steps += transitionSteps(rows[b], rows[b + 1])
+            speed = mergedSpeed(rows[a], rows[b + 1], steps)
+            if speed is None or not withinTolerance(rows, a, b + 1, speed, tolerance):
+                break
+            best = [b + 1, speed]
+            b += 1
+        if best is None:
+            a += 1
+        else:
+            a = best[0]
+            speeds[a] = best[1]
+        keys.append(a)
+    if len(keys) == skill.frameCount:
+        return skill
+
+    values = [-len(keys), skill.pitch, skill.roll, skill.angleRatio, keys.index(loopStart), keys.index(loopEnd),
+              loopRepeat]
+    for f in keys:
+        frame = skill.frame(f).tolist()
+        if f in speeds:
+            frame[speedColumn] = speeds[f]
+        values += frame
+    return Skill(array('b', values).tobytes())    # already divided by angleRatio
+
+
+def limitsOf(model):
+    model = (model or 'Bittle').replace(' ', '')
+    return jointLimits.get(model) or jointLimits.get(fallbackModels.get(model), bittleLimits)
+
+
+@functools.lru_cache(maxsize=None)
+def interpolationTable(frames, newFrames, periodic):
+    # [[4 source frames, 4 weights]] of the Catmull-Rom interpolation of each new frame. a periodic skill wraps around
+    # to its first frame, the others keep their first and last frames
+    table = []
+    for i in range(newFrames):
+        t = i * frames / newFrames if periodic else i * (frames - 1) / max(1, newFrames - 1)
+        k = min(int(t), frames - 1)
+        u = t - k
+        neighbours = [k - 1, k, k + 1, k + 2]
+        if periodic:
+            neighbours = [n % frames for n in neighbours]
+        else:
+            neighbours = [max(0, min(frames - 1, n)) for n in neighbours]
+        weights = [(-u ** 3 + 2 * u ** 2 - u) / 2, (3 * u ** 3 - 5 * u ** 2 + 2) / 2,
+                   (-3 * u ** 3 + 4 * u ** 2 + u) / 2, (u ** 3 - u ** 2) / 2]
+        table.append(neighbours + weights)
+    return table
+
+
+def resampleColumn(column, table, low, high):
+    # the column of one joint at the new frames, within its limits
+    return [max(low, min(high, int(math.floor(w0 * column[a] + w1 * column[b] + w2 * column[c] + w3 * column[d] + 0.5))))
+            for a, b, c, d, w0, w1, w2, w3 in table]
+
+
+@functools.lru_cache(maxsize=None)
+def interpolationArrays(frames, newFrames, periodic):
+    # interpolationTable() for NumPy: newFrames x 4 source frames and newFrames x 4 weights
+    table = numpy.array(interpolationTable(frames, newFrames, periodic))
+    return table[:, :4].astype(int), table[:, 4:]
+
+
+def frameArray(skill):
+    # the frames of skill as a frames x frameSize NumPy array that shares its buffer
+    values = numpy.frombuffer(skill.data, numpy.int8, skill.frameCount * skill.frameSize, skill.headerSize)
+    return values.reshape(skill.frameCount, skill.frameSize)
+
+
+def resampleFrames(skill, newFrames, periodic, limits):
+    # resampleSkill() with NumPy: every joint of every new frame at once, in the order of resampleColumn()'s sums
+    frames = frameArray(skill)
+    angles = frames[:, :skill.angleColumns] * float(skill.angleRatio)
+    sources, weights = interpolationArrays(skill.frameCount, newFrames, periodic)
+    values = weights[:, 0:1] * angles[sources[:, 0]] + weights[:, 1:2] * angles[sources[:, 1]] + \
+        weights[:, 2:3] * angles[sources[:, 2]] + weights[:, 3:4] * angles[sources[:, 3]]
+    low, high = numpy.array(limits[skill.firstJoint:]).T
+    resampled = numpy.clip(numpy.floor(values + 0.5), low, high).astype(int)
+    if periodic:
+        return [newFrames, skill.pitch, skill.roll, 1] + resampled.ravel().tolist()
+    nearest = nearestFrames(skill.frameCount, newFrames)
+    rows = numpy.zeros((newFrames, skill.frameSize), int)
+    rows[:, :skill.angleColumns] = resampled
+    # a new frame takes the speed of the first frame nearest to it or after it, 0 after the last one, and the delays
+    # of the frames nearest to it. the delays are never negative, so they can be summed before they are capped
+    speeds = numpy.append(frames[:, speedColumn], 0)
+    rows[:, speedColumn] = speeds[numpy.searchsorted(nearest, numpy.arange(newFrames))]
+    numpy.add.at(rows[:, delayColumn], nearest, frames[:, delayColumn])
+    numpy.minimum(rows[:, delayColumn], 127, out=rows[:, delayColumn])
+    for f in numpy.flatnonzero(frames[:, triggerColumn]):
+        rows[nearest[f], triggerColumn:triggerColumn + 2] = frames[f, triggerColumn:triggerColumn + 2]
+    loopStart, loopEnd, loopRepeat = skill.loop
+    return [-newFrames, skill.pitch, skill.roll, 1, nearest[loopStart], nearest[loopEnd], loopRepeat] + \
+        rows.ravel().tolist()
+
+
+def nearestFrames(frames, newFrames):
+    # the new frame closest to each frame of a behavior
+    return [int(f * (newFrames - 1) / max(1, frames - 1) + 0.5) for f in range(frames)]
+
+
+def resampleSkill(skill, newFrames, model=None):
+    # the gait or behavior with newFrames frames. the angles are kept within the joint limits of model, and halved
+    # with angleRatio 2 if they go beyond angleLimit. a posture is returned as it is
+    if skill.kind == 'posture' or newFrames == skill.frameCount:
+        return skill
+    if not 2 <= newFrames <= maxFrames:
+        raise ValueError(f"A skill can't have {newFrames} frames")
+    periodic = skill.kind == 'gait'
+    limits = limitsOf(model)
+    if numpy is not None:
+        return Skill(resampleFrames(skill, newFrames, periodic, limits))
+    table = interpolationTable(skill.frameCount, newFrames, periodic)
+    ratio = skill.angleRatio
+    columns = []
+    for j in range(skill.firstJoint, DOF):
+        column = skill.joint(j).tolist()
+        if ratio > 1:
+            column = [angle * ratio for angle in column]
+        columns.append(resampleColumn(column, table, *limits[j]))
+    if periodic:
+        header = [newFrames, skill.pitch, skill.roll, 1]
+        rows = zip(*columns)
+    else:
+        # a frame's speed, delay and trigger go to the new frame nearest to it, the speed to the new frames up to it
+        nearest = nearestFrames(skill.frameCount, newFrames)
+        extras = [[0, 0, 0, 0] for i in range(newFrames)]
+        source = skill.frames()
+        for f in range(skill.frameCount - 1, -1, -1):
+            for i in range(nearest[f - 1] + 1 if f > 0 else 0, nearest[f] + 1):
+                extras[i][0] = source[f, speedColumn]
+        for f in range(skill.frameCount):
+            extra = extras[nearest[f]]
+            extra[1] = min(127, extra[1] + source[f, delayColumn])
+            if source[f, triggerColumn] != 0:
+                extra[2:] = [source[f, triggerColumn], source[f, triggerColumn + 1]]
+        loopStart, loopEnd, loopRepeat = skill.loop
+        header = [-newFrames, skill.pitch, skill.roll, 1, nearest[loopStart], nearest[loopEnd], loopRepeat]
+        rows = (list(angles) + extra for angles, extra in zip(zip(*columns), extras))
+    values = header
+    for row in rows:
+        values += row
+    return Skill(values)
+
+
+def scaleSkillTime(skill, factor, model=None):
+    # the skill played factor times as long: a gait with factor times the frames, a behavior with its speeds divided
+    # and its delays multiplied by factor. a speed of 0 still jumps
+    if skill.kind == 'gait':
+        return resampleSkill(skill, max(2, min(maxFrames, int(skill.frameCount * factor + 0.5))), model)
+    if skill.kind == 'posture' or factor == 1:
+        return skill
+    scaled = Skill(skill)
+    if numpy is not None:
+        frames = frameArray(scaled)    # changed in place
+        speeds = frames[:, speedColumn]
+        moving = speeds > 0
+        speeds[moving] = numpy.clip(numpy.floor(speeds[moving] / factor + 0.5), 1, 127)
+        frames[:, delayColumn] = numpy.minimum(127, numpy.trunc(frames[:, delayColumn] * float(factor) + 0.5))
+        scaled.modified()
+        return scaled
+    for f in range(scaled.frameCount):
+        speed = scaled.frames()[f, speedColumn]
+        if speed > 0:
+            scaled.setValue(f, speedColumn, max(1, min(127, int(speed / factor + 0.5))))
+        scaled.setValue(f, delayColumn, min(127, int(scaled.frames()[f, delayColumn] * factor + 0.5)))
+    return scaled
+
+
+def scaleLibrary(factors, model=None, kinds=('gait',)):
+    # [[LibrarySkill, factor, Skill]] of every skill of the kinds in the library, e.g. the gaits of InstinctBittle.h,
+    # at each factor
+    variants = []
+    for kind in kinds:
+        for entry in library().entries(model, kind):
+            skill = entry.skill
+            variants += [[entry, factor, scaleSkillTime(skill, factor, entry.model)] for factor in factors]
+    return variants
+
+
+def variantName(name, factor):
+    return f"{name}_x{factor:g}".replace('.', '_')
+
+
+def variantArrays(variants):
+    # the C arrays of scaleLibrary(), declared as in the Instinct headers
+    arrays = []
+    for entry, factor, skill in variants:
+        arrays.append(f"const int8_t {variantName(entry.name, factor)}[] PROGMEM = " + skill.text())
+    return '\n'.join(arrays) + '\n'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Slower and faster variants of the skills of the library')
+    parser.add_argument('--factors', type=float, nargs='+', default=[0.5, 2],
+                        help='how many times as long a variant plays. a gait gets as many times the frames')
+    parser.add_argument('--model', default='Bittle')
+    parser.add_argument('--kinds', nargs='+', default=['gait'], choices=['gait', 'behavior'])
+    parser.add_argument('--output', help='the file of the C arrays. they are printed if omitted')
+    args = parser.parse_args()
+    text = variantArrays(scaleLibrary(args.factors, args.model, args.kinds))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
@@ -0,0 +1,15 @@
+# The tests of the modules of serialMaster. Run them from the repository or from serialMaster:
+# python3 -m pytest serialMaster/tests
+# The modules are imported the way the scripts import them, from serialMaster itself. ardSerial finds the translations
+# in ../pyUI from the working directory, so pyUI is put on the path too. The baselines and the emulator helpers of
+# benchmark.py are imported from it, and the tests that need emulator.py start their own.
+
+import os
+import sys
+
+serialMasterDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+pyUIDir = os.path.join(os.path.dirname(serialMasterDir), 'pyUI')
+if serialMasterDir not in sys.path:
+    sys.path.insert(0, serialMasterDir)
+if pyUIDir not in sys.path:
+    sys.path.append(pyUIDir)
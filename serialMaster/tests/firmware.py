@@ -0,0 +1,27 @@
+# What the robot should end up doing with a schedule or a skill, worked out the simple way for the tests to check
+# against: the pose it ends in and the delay units it waits on the way.
+
+from ardSerial import postureAngles
+from scheduleCompiler import delayUnits
+
+
+def playSchedule(schedule):
+    # [the last pose, the delay units] the robot is meant to end with. the delays of an 'm' count once
+    pose = None
+    delay = 0
+    for task in schedule:
+        token = task[0][0]
+        if token == 'k' and postureAngles(task[0][1:]) is not None:
+            pose, delay = list(postureAngles(task[0][1:])), delay + delayUnits(task[1])
+        elif token == 'L':
+            pose, delay = list(task[1][:16]), delay + delayUnits(task[2])
+        elif token in 'iIm' and pose is not None:
+            for e in range(0, len(task[1]) - 1, 2):
+                pose[task[1][e]] = task[1][e + 1]
+            delay += delayUnits(task[2])
+    return pose, delay
+
+
+def playSkill(skill):
+    pose = skill.frameValues(skill.frameCount - 1)[:16]
+    return pose, sum(skill.frames()[f, 17] for f in range(skill.frameCount))
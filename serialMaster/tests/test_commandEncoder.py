@@ -0,0 +1,37 @@
+# The bytes serialWriteNumToByte() writes through commandEncoder.py against the encoding it replaced, which
+# benchmark.py keeps as the baseline it times them against.
+
+import copy
+
+import pytest
+
+import ardSerial
+from benchmark import NullPort, encodeCases, legacyWriteNumToByte
+
+cases = encodeCases()
+caseIds = [f"{token} {len(var)}" for token, var in cases]
+# the gaits and postures with larger angles, which both halve with angleRatio 2
+largeCases = [['K', var[:4] + [round(v * 1.6) for v in var[4:]]] for token, var in cases if token == 'K' and var[0] > 0]
+
+
+@pytest.fixture
+def port():
+    port = NullPort()
+    ardSerial.setWritePolicy(port, 'single')
+    tolerance = ardSerial.keyframeTolerance
+    ardSerial.setKeyframeTolerance(0)    # the legacy code sent every frame
+    yield port
+    ardSerial.setKeyframeTolerance(tolerance)
+
+
+@pytest.mark.parametrize('token, var', cases, ids=caseIds)
+def testEncodingMatchesTheLegacyEncoding(port, token, var):
+    var = copy.deepcopy(var)
+    ardSerial.serialWriteNumToByte(port, token, var)
+    assert port.data == legacyWriteNumToByte(port, token, copy.deepcopy(var))
+
+
+@pytest.mark.parametrize('token, var', largeCases, ids=[f"K {len(var)} x1.6" for token, var in largeCases])
+def testLargeAnglesMatchTheLegacyEncoding(port, token, var):
+    ardSerial.serialWriteNumToByte(port, token, copy.deepcopy(var))
+    assert port.data == legacyWriteNumToByte(port, token, copy.deepcopy(var))
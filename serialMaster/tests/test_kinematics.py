@@ -0,0 +1,73 @@
+# The feet of kinematics.py against the legs worked out in their plane, and the legs BodyPoseSolver solves for the
+# dials of the Skill Composer against the feet they should reach.
+
+import itertools
+import math
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import kinematics
+from benchmark import planarFoot
+from skillLibrary import library
+
+
+def movedFoot(foot, pose):
+    # a foot [x, y, z] of the torso at rest in the frame of the torso moved by pose, one rotation at a time
+    yaw, pitch, roll = [math.radians(v) for v in pose[:3]]
+    x, y, z = [foot[0] - pose[5] / 1000, foot[1] - pose[3] / 1000, foot[2] - pose[4] / 1000]
+    x, y = x * math.cos(yaw) + y * math.sin(yaw), -x * math.sin(yaw) + y * math.cos(yaw)    # undo the yaw
+    y, z = y * math.cos(pitch) - z * math.sin(pitch), y * math.sin(pitch) + z * math.cos(pitch)    # the head down
+    x, z = x * math.cos(roll) + z * math.sin(roll), -x * math.sin(roll) + z * math.cos(roll)    # the left side down
+    return [x, y, z]
+
+
+@pytest.fixture(scope='module')
+def legModel():
+    return kinematics.LegModel()
+
+
+@pytest.mark.parametrize('entry', library().entries('Bittle', 'gait'), ids=lambda entry: entry.name)
+def testFeetOfTheGaits(legModel, entry):
+    skill = entry.skill
+    feet = legModel.feet(skill)
+    for f, angles in enumerate(kinematics.skillAngles(skill)):
+        for leg in range(4):
+            error = max(abs(a - b) for a, b in zip(feet[f, leg], planarFoot(legModel, leg, angles)))
+            assert error < 1e-9, f"frame {f} {kinematics.legNames[leg]}: {error * 1000:.3f} mm off"
+
+
+@pytest.mark.parametrize('model', ['Bittle', 'Nybble'])
+def testSolvedLegsReachTheMovedFeet(model):
+    generator = random.Random(1)
+    solver = kinematics.BodyPoseSolver(model)
+    posture = library().skill('balance', model).frameValues(0)
+    rest = solver.feet([posture])[0]
+    poses = [list(p) for p in itertools.product([0], range(-40, 41, 10), range(-30, 31, 10), range(-15, 16, 5),
+                                                  range(-50, 41, 10), [0])]
+    poses += [[generator.randint(-20, 20), 0, 0, 0, 0, 0] for n in range(50)]
+    checked = 0
+    for pose, legs in zip(poses, solver.solve(posture, poses).tolist()):
+        angles = list(posture)
+        angles[8:16] = legs
+        feet = solver.feet([angles])[0]
+        for leg in range(4):
+            target = movedFoot([solver.shoulders[leg][0], rest[leg][0], rest[leg][1]], pose)
+            reach = math.hypot(target[1] - solver.shoulders[leg][1], target[2] - solver.shoulders[leg][2])
+            limits = solver.lowest[leg], solver.highest[leg]
+            if not solver.upper[leg] - solver.lower[leg] + 0.002 < reach < solver.upper[leg] + solver.lower[leg] - 0.002 \
+                    or any(a in [limits[0][n], limits[1][n]] for n, a in enumerate([legs[leg], legs[leg + 4]])):
+                continue    # out of reach or at a joint limit, where the leg only gets near
+            checked += 1
+            error = math.hypot(feet[leg][0] - target[1], feet[leg][1] - target[2])
+            assert error <= 0.002, f"{pose} {kinematics.legNames[leg]}: {error * 1000:.2f} mm off"
+    assert checked > len(poses)
+
+
+@pytest.mark.parametrize('model', ['Bittle', 'Nybble'])
+def testDialsAtZeroKeepThePosture(model):
+    solver = kinematics.BodyPoseSolver(model)
+    posture = library().skill('balance', model).frameValues(0)
+    assert solver.solve(posture, [[0] * 6]).tolist()[0] == [int(v) for v in posture[8:16]]
@@ -0,0 +1,31 @@
+# waitForRobot() of robotProbe.py on emulator.py: a robot that is booting answers the '?' handshake, with the model in
+# the prints, and a port whose writes go nowhere is given up.
+
+from ardSerial import writeProbe
+from benchmark import openEmulatorPort, startEmulator
+from robotProbe import waitForRobot
+from SerialCommunication import Communication
+
+
+def testBootingRobotAnswers():
+    emulator, portName = startEmulator()
+    port = Communication(portName, 115200, 1)
+    port.Start_Reader()
+    try:
+        result = waitForRobot(port, writeProbe)
+    finally:
+        port.Close_Engine()
+        emulator.terminate()
+    assert result != -1
+    assert result[0].strip() == '?' and 'Bittle' in result[1]
+
+
+def testProbeThatIsNeverWrittenTimesOut():
+    emulator, portName = startEmulator()
+    port = openEmulatorPort(portName)
+    try:
+        result = waitForRobot(port, lambda port: None, 1)
+    finally:
+        port.Close_Engine()
+        emulator.terminate()
+    assert result == -1
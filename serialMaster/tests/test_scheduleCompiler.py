@@ -0,0 +1,24 @@
+# compileSchedule() against the pose and the delays a testSchedule is meant to end with, for the schedule of
+# demos/climbCeiling.py and random ones.
+
+import os
+import random
+
+import pytest
+
+from ardSerial import postureAngles
+from benchmark import demoSchedule, randomSchedule
+from firmware import playSchedule, playSkill
+from scheduleCompiler import compileSchedule
+
+serialMasterDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+generator = random.Random(1)
+schedules = [demoSchedule(os.path.join(serialMasterDir, 'demos', 'climbCeiling.py'))]
+schedules += [randomSchedule(generator, 40) for n in range(200)]
+
+
+@pytest.mark.parametrize('schedule', schedules, ids=['climbCeiling'] + [f'random {n}' for n in range(200)])
+def testCompiledScheduleEndsWhereTheScheduleDoes(schedule):
+    skill = compileSchedule(schedule, postureAngles)
+    pose, delay = playSchedule(schedule)
+    assert playSkill(skill) == ([v // skill.angleRatio * skill.angleRatio for v in pose], delay)
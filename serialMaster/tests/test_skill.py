@@ -0,0 +1,207 @@
+# halveLargeAngles() and splitLargeAngles() of skill.py against what the firmware expects of a K skill and an L pose:
+# the angles of a K skill beyond angleLimit are sent divided by 2 with angleRatio 2 and transform() multiplies them
+# back, the speed, delay and trigger of a behavior are never divided, and the L command has no angle ratio.
+
+import random
+from array import array
+
+import pytest
+
+from skill import DOF, Skill, angleLimit, halveLargeAngles, skillLayout, splitLargeAngles
+from skillLibrary import configDir, library
+
+
+def gait(rows):
+    return [len(rows), 0, 0, 1] + [value for row in rows for value in row]
+
+
+def behavior(rows, extras=(8, 0, 0, 0)):
+    # rows of 16 angles, each followed by its speed, delay, trigger axis and trigger angle
+    return [-len(rows), 0, 0, 1, 0, len(rows) - 1, 0] + [value for row in rows for value in list(row) + list(extras)]
+
+
+def halved(values):
+    # the skill as the firmware should receive it: a copy halved by halveLargeAngles() and whether it was
+    header, frameSize = skillLayout(values[0], len(values))
+    values = list(values)
+    changed = halveLargeAngles(values, header, frameSize)
+    return values, changed
+
+
+def halvedBytes(values):
+    # the same through the buffer of an array('b'), as a Skill does
+    header, frameSize = skillLayout(values[0], len(values))
+    values = array('b', values)
+    changed = halveLargeAngles(values, header, frameSize)
+    return values.tolist(), changed
+
+
+both = pytest.mark.parametrize('halve', [halved, halvedBytes], ids=['list', 'array'])
+
+
+def checkRescaled(original, rescaled):
+    # what the firmware needs from a rescaled skill. returns the reason it is wrong, or None
+    header, frameSize = skillLayout(original[0], len(original))
+    angleColumns = min(DOF, frameSize)
+    large = any((n - header) % frameSize < angleColumns and abs(original[n]) > angleLimit
+                for n in range(header, len(original)))
+    ratio = rescaled[3]
+    if ratio != (2 if large else original[3]):
+        return f"angle ratio {ratio}"
+    if rescaled[:3] != original[:3] or rescaled[4:header] != original[4:header]:
+        return "header changed"
+    for n in range(header, len(original)):
+        if not -128 <= rescaled[n] <= 127:
+            return f"value {rescaled[n]} out of int8"
+        if (n - header) % frameSize < angleColumns:
+            if large and not 0 <= original[n] - rescaled[n] * ratio <= 1:    # transform() multiplies by the ratio
+                return f"angle {original[n]} sent as {rescaled[n]} x {ratio}"
+        elif rescaled[n] != original[n]:
+            return f"column {(n - header) % frameSize} changed from {original[n]} to {rescaled[n]}"
+    return None
+
+
+def randomSkill(generator, kind):
+    if kind == 'gait':
+        period = generator.randint(2, 40)
+        header, rows = [period, 0, 0, 1], [[generator.randint(-180, 180) for c in range(8)] for f in range(period)]
+    elif kind == 'posture':
+        header, rows = [1, 0, 0, 1], [[generator.randint(-180, 180) for c in range(16)]]
+    else:
+        period = generator.randint(1, 60)
+        header = [-period, 0, 0, 1, 0, period - 1, generator.randint(0, 5)]
+        rows = [[generator.randint(-180, 180) for c in range(16)] + [generator.randint(0, 127), generator.randint(0, 127),
+                                                                     generator.randint(0, 4), generator.randint(-128, 127)]
+                for f in range(period)]
+    if generator.random() < 0.5:    # half of them within the int8 range
+        for row in rows:
+            row[:16] = [max(-125, min(125, angle)) for angle in row[:16]]
+    return header + [value for row in rows for value in row]
+
+
+@both
+@pytest.mark.parametrize('angle', [angleLimit, -angleLimit])
+def testAnglesAtTheLimitAreKept(halve, angle):
+    original = gait([[angle, 0, -40, 30, 1, -1, 7, 8]] * 2)
+    assert halve(original) == (original, False)
+
+
+@both
+@pytest.mark.parametrize('angle, half', [[126, 63], [-126, -63], [-128, -64], [127, 63], [-127, -64]])
+def testAnglesBeyondTheLimitHalveEveryAngle(halve, angle, half):
+    original = gait([[angle, 0, -40, 30, 1, -1, 7, 8], [0, 125, -125, 3, 2, -2, 0, 0]])
+    rescaled, changed = halve(original)
+    assert changed
+    assert rescaled[:4] == original[:4]    # halveLargeAngles() leaves angleRatio to its caller
+    assert rescaled[4:] == [half, 0, -20, 15, 0, -1, 3, 4, 0, 62, -63, 1, 1, -1, 0, 0]
+
+
+@pytest.mark.parametrize('angle', [200, -200, 250])
+def testAnglesBeyondAByteAreHalved(angle):
+    original = gait([[angle, 0, -3, 0, 0, 0, 0, 0]] * 2)
+    assert halved(original) == (original[:4] + [angle // 2, 0, -2, 0, 0, 0, 0, 0] * 2, True)
+
+
+@both
+@pytest.mark.parametrize('column, value', [[16, 127], [16, 126], [17, 126], [17, 127], [18, -128], [19, -128],
+                                           [19, 127], [19, -126]], ids=['speed 127', 'speed 126', 'delay 126',
+                                                                        'delay 127', 'trigger axis -128',
+                                                                        'trigger angle -128', 'trigger angle 127',
+                                                                        'trigger angle -126'])
+def testBehaviorColumnsBeyondTheLimitAreNotAngles(halve, column, value):
+    extras = [8, 0, 0, 0]
+    extras[column - DOF] = value
+    original = behavior([[10 * j - 80 for j in range(DOF)], [125, -125] + [0] * 14], extras)
+    assert halve(original) == (original, False)
+
+
+@both
+def testBehaviorAnglesAreHalvedWithoutTheirSpeedDelayAndTrigger(halve):
+    original = behavior([[126] + [0] * 15, [-128] + [41] * 15], [127, 126, -128, -128])
+    rescaled, changed = halve(original)
+    assert changed
+    for f in range(2):
+        start = 7 + f * 20
+        assert rescaled[start:start + DOF] == [v // 2 for v in original[start:start + DOF]]
+        assert rescaled[start + DOF:start + 20] == [127, 126, -128, -128]
+
+
+@both
+@pytest.mark.parametrize('frameSize', [8, 12])
+@pytest.mark.parametrize('angle', [126, -126, -128])
+def testGaitColumns(halve, frameSize, angle):
+    # a gait of 8 (or 12, with the shoulders) columns has only angles, wherever the large one is
+    for column in range(frameSize):
+        rows = [[5] * frameSize, [-5] * frameSize, [angleLimit] * frameSize]
+        rows[1][column] = angle
+        original = gait(rows)
+        rescaled, changed = halve(original)
+        assert changed
+        assert rescaled[4:] == [v // 2 for v in original[4:]]
+
+
+@both
+@pytest.mark.parametrize('frameSize', [8, 12])
+def testGaitWithinTheLimit(halve, frameSize):
+    original = gait([[angleLimit] * frameSize, [-angleLimit] * frameSize])
+    assert halve(original) == (original, False)
+
+
+def testSkillSetsTheAngleRatio():
+    original = behavior([[200] + [0] * 15, [-126] + [30] * 15], [127, 126, 0, 0])
+    skill = Skill(original)
+    assert skill.angleRatio == 2
+    assert skill.frameValues(0)[:DOF] == [200] + [0] * 15
+    assert skill.frameValues(1) == [-126] + [30] * 15 + [127, 126, 0, 0]
+    assert Skill(skill.toList()) == skill    # the halved bytes are not halved again
+    assert Skill(gait([[125] * 8, [-125] * 8])).angleRatio == 1
+
+
+def testLibrarySkills():
+    # the K skills of the SkillLibrary files, the Instinct headers and the example scripts, not the exported ones, and
+    # the gaits and postures of them with larger angles
+    skills = [[entry.model + '/' + entry.name, entry.skill.toList()] for entry in library().entries()
+              if not entry.source.startswith(configDir)]
+    skills += [[name + ' x1.6', data[:4] + [round(v * 1.6) for v in data[4:]]] for name, data in skills if data[0] > 0]
+    assert skills
+    for name, original in skills:
+        assert checkRescaled(original, Skill(original).toList()) is None, name
+
+
+def testRandomSkills():
+    generator = random.Random(1)
+    for kind in ['gait', 'posture', 'behavior']:
+        for n in range(300):
+            original = randomSkill(generator, kind)
+            rescaled = Skill(original).toList()
+            assert checkRescaled(original, rescaled) is None, original
+            if max(original[4:]) <= 127 and min(original[4:]) >= -128:    # the same through a list
+                values, changed = halved(original)
+                assert values[4:] == rescaled[4:]
+
+
+@pytest.mark.parametrize('angle', [angleLimit, -angleLimit])
+def testPoseAtTheLimitIsNotSplit(angle):
+    angles = [angle] + [0] * 15
+    assert splitLargeAngles(angles) == (angles, [])
+
+
+@pytest.mark.parametrize('angle, clamped', [[126, 125], [-126, -125], [-128, -125], [200, 125]])
+def testPoseBeyondTheLimitIsSplit(angle, clamped):
+    angles = [10] * 4 + [angle] + [-10] * 11
+    assert splitLargeAngles(angles) == ([10] * 4 + [clamped] + [-10] * 11, [4, angle])
+    assert angles[4] == angle    # not changed
+
+
+def testRandomPoses():
+    # what the robot does: the L as it is, then the joints of the i
+    generator = random.Random(2)
+    for n in range(2000):
+        angles = [generator.randint(-200, 200) if generator.random() < 0.2 else generator.randint(-125, 125)
+                  for j in range(16)]
+        clamped, indexedList = splitLargeAngles(angles)
+        assert max(clamped) <= angleLimit and min(clamped) >= -angleLimit
+        pose = list(clamped)
+        for p in range(0, len(indexedList), 2):
+            pose[indexedList[p]] = indexedList[p + 1]
+        assert pose == angles
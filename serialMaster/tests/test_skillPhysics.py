@@ -0,0 +1,68 @@
+# The MuJoCo model of Bittle against the URDF kinematics.py reads, and the fall screen of skillPhysics.py on the skills
+# of the library: the same results in a pool as in one process, and postures that stand and gaits that walk.
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('mujoco')
+
+import kinematics
+import skillPhysics
+from skillLibrary import library
+
+
+@pytest.fixture(scope='module')
+def results():
+    jobs = skillPhysics.libraryJobs('Bittle', ['gait', 'behavior', 'posture'])
+    return skillPhysics.evaluateSkills(jobs, 1), skillPhysics.evaluateSkills(jobs, 2)
+
+
+def testFeetOfTheModelAreThoseOfTheURDF():
+    mujoco, numpy = skillPhysics.mujoco, kinematics.numpy
+    skillPhysics.startWorker(skillPhysics.modelXml())
+    physics, state = skillPhysics.worker['model'], skillPhysics.worker['data']
+    legs = skillPhysics.worker['legs']
+    # the far end of each lower leg capsule
+    angles = numpy.concatenate([kinematics.skillAngles(entry.skill) for entry in library().entries('Bittle', 'gait')])
+    feet = legs.positions(angles)[1]
+    largest = 0
+    for frame, urdfFeet in zip(legs.urdfAngles(angles), feet):
+        state.qpos[skillPhysics.worker['joints']] = frame.reshape(-1)
+        state.qpos[:3] = 0
+        mujoco.mj_kinematics(physics, state)
+        for leg, [shoulder, [index, knee]] in enumerate(kinematics.legJoints):
+            geom = physics.geom(knee[:3]).id
+            axis = state.geom_xmat[geom].reshape(3, 3)[:, 2] * physics.geom_size[geom].sum()
+            anchor = state.xanchor[physics.joint(knee).id]
+            ends = [state.geom_xpos[geom] + axis, state.geom_xpos[geom] - axis]
+            foot = max(ends, key=lambda end: numpy.linalg.norm(end - anchor))
+            largest = max(largest, numpy.abs(foot - urdfFeet[leg]).max())
+    assert largest < 1e-9
+
+
+def testPoolGivesTheSameResults(results):
+    serial, pooled = results
+    for one, other in zip(serial, pooled):
+        for key, value in one.items():
+            if key != 'wall' and value == value:    # not NaN
+                assert other[key] == value, f"{one['name']}: the pool gives {other}, not {one}"
+
+
+def testPhysicsDoesNotDiverge(results):
+    assert [r['name'] for r in results[0] if r['diverged']] == []
+
+
+@pytest.mark.parametrize('name', ['balance', 'sit', 'rest', 'up'])
+def testPostureStandsStill(results, name):
+    result = {r['name']: r for r in results[0]}.get(name)
+    if result is None:
+        pytest.skip(f"{name} is not in the library")
+    assert not result['fell'] and result['distance'] <= 0.001
+
+
+@pytest.mark.parametrize('name, direction', [['wkF', 1], ['trF', 1], ['crF', 1], ['bk', -1]])
+def testGaitWalks(results, name, direction):
+    result = {r['name']: r for r in results[0]}.get(name)
+    if result is None:
+        pytest.skip(f"{name} is not in the library")
+    assert result['forward'] * direction >= 0.02
@@ -0,0 +1,65 @@
+# The timing model of skillTiming.py calibrated on emulator.py: the step it finds, its predictions of single tasks
+# against their echoes, and a demo that gets every answer with the auto waits. benchmark.py timing times the demo
+# with the fixed waits too.
+
+import copy
+import os
+
+import pytest
+
+import skillTiming
+from ardSerial import closePortWorker, goodPorts, postureAngles, send, setWaitMode
+from benchmark import demoSchedule, openEmulatorPort, startEmulator
+from skillLibrary import library
+
+serialMasterDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+stepMs = 4    # the step of the emulator the calibration should find
+
+
+@pytest.fixture(scope='module')
+def port():
+    emulator, portName = startEmulator('Bittle', ['--step-ms', str(stepMs)])
+    port = openEmulatorPort(portName)
+    goodPorts.clear()
+    goodPorts[port] = 'emulator'
+    yield port
+    setWaitMode('fixed')
+    goodPorts.clear()
+    closePortWorker(port)
+    port.Close_Engine()
+    emulator.terminate()
+
+
+@pytest.fixture(scope='module')
+def calibration(port):
+    return skillTiming.calibrate(port)
+
+
+def testCalibratedStep(calibration):
+    assert abs(calibration['stepSeconds'] * 1000 - stepMs) <= 0.1 * stepMs
+
+
+def testPredictedTasks(port, calibration):
+    model = skillTiming.TimingModel('Bittle', calibration)
+    model.busySeconds(['L', postureAngles('balance'), 0])    # where the calibration left the robot
+    # emulator.py doesn't hold a head moved by hand as the firmware and the model do, so the i moves a leg
+    tasks = [['kbalance', 0], ['ksit', 0], ['kbalance', 0], ['L', [40] + postureAngles('balance')[1:], 0],
+             ['I', [8, -30, 12, 60], 0], ['i', [9, 40, 13, -20], 0], ['khi', 0], ['kpu', 0], ['d', 0],
+             ['K', library().skill('wkF', 'Bittle').toList(), 0], ['K', library().skill('fiv', 'Bittle').toList(), 0]]
+    for task in tasks:
+        measured = skillTiming.timedTask(port, copy.deepcopy(task), 10)
+        predicted = model.busySeconds(task)
+        assert measured is not None, f"no echo of {task[0]}"
+        assert abs(predicted - measured) <= max(0.02, 0.05 * measured), \
+            f"{task[0]}: predicted {predicted * 1000:.1f} ms, took {measured * 1000:.1f} ms"
+
+
+def testEveryTaskOfADemoIsAnsweredWithAutoWaits(port, calibration):
+    schedule = demoSchedule(os.path.join(serialMasterDir, 'demos', 'climbCeiling.py'))
+    setWaitMode('auto')
+    try:
+        send(goodPorts, ['kbalance', 0.5])
+        answers = [send(goodPorts, copy.deepcopy(task)) for task in schedule]
+    finally:
+        setWaitMode('fixed')
+    assert answers.count(-1) == 0
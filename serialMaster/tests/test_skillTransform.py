@@ -0,0 +1,123 @@
+# decimateSkill() against the steps transform() of the firmware takes (src/motion.h), and resampleSkill() and
+# scaleSkillTime() against the frame by frame interpolation benchmark.py times them against, on the gaits and behaviors
+# of the SkillLibrary files, the Instinct headers and the example scripts, not the exported ones.
+
+import math
+
+import pytest
+
+import skillTransform
+from benchmark import legacyResample
+from skillLibrary import configDir, library
+from skillTransform import decimateSkill, limitsOf, resampleSkill, scaleLibrary, scaleSkillTime, transitionSteps
+
+entries = [entry for kind in ['gait', 'behavior'] for entry in library().entries(kind=kind)
+           if not entry.source.startswith(configDir)]
+behaviors = [entry for entry in entries if entry.skill.kind == 'behavior']
+
+
+def entryId(entry):
+    return entry.model + '/' + entry.name
+
+
+def firmwareSteps(skill):
+    # [the real frames, the step of one pass without the loop at which transform() reaches each of them]
+    rows = [skill.frameValues(f) for f in range(skill.frameCount)]
+    arrivals = [0]
+    for f in range(1, len(rows)):
+        arrivals.append(arrivals[-1] + transitionSteps(rows[f - 1], rows[f]))
+    return rows, arrivals
+
+
+def easedAngle(start, end, step, steps):
+    return start + (1 - math.cos(math.pi * step / steps)) / 2 * (end - start)
+
+
+def checkDecimated(original, decimated):
+    # [the largest joint error at the frames left out, the steps the pass gained or lost, the merges], or a string
+    # if the decimated skill does not play the frames it kept the way the original does
+    rows, arrivals = firmwareSteps(original)
+    keptRows, keptArrivals = firmwareSteps(decimated)
+    keys = []    # the original frame of each kept frame
+    for row in keptRows:
+        f = keys[-1] + 1 if keys else 0
+        while f < len(rows) and rows[f][:16] != row[:16]:
+            f += 1
+        if f == len(rows):
+            return 'a kept frame is not in the original'
+        keys.append(f)
+    if [rows[f][17:] for f in keys] != [row[17:] for row in keptRows] or \
+            sum(row[17] for row in rows) != sum(row[17] for row in keptRows):
+        return 'the delays or the triggers changed'
+    loopStart, loopEnd, loopRepeat = original.loop
+    if decimated.loop != [keys.index(loopStart), keys.index(loopEnd), loopRepeat]:
+        return 'the loop moved'
+    largest = 0
+    for k in range(1, len(keys)):
+        steps = keptArrivals[k] - keptArrivals[k - 1]
+        for f in range(keys[k - 1] + 1, keys[k]):
+            step = min(steps, arrivals[f] - arrivals[keys[k - 1]])
+            largest = max(largest, max(abs(rows[f][j] - easedAngle(keptRows[k - 1][j], keptRows[k][j], step, steps))
+                                       for j in range(16)))
+    merges = sum(1 for k in range(1, len(keys)) if keys[k] - keys[k - 1] > 1)
+    return [largest, keptArrivals[-1] - arrivals[-1], merges]
+
+
+@pytest.mark.parametrize('tolerance', [1, 2, 5, 10])
+@pytest.mark.parametrize('entry', behaviors, ids=entryId)
+def testDecimatedBehaviorPlaysWithinTolerance(entry, tolerance):
+    checked = checkDecimated(entry.skill, decimateSkill(entry.skill, tolerance))
+    assert not isinstance(checked, str), checked
+    error, gained, merges = checked
+    assert error <= tolerance
+    assert abs(gained) <= merges    # each merged transition may round its steps once
+
+
+@pytest.mark.parametrize('entry', [entry for entry in entries if entry.skill.kind == 'gait'], ids=entryId)
+def testGaitsAreNotDecimated(entry):
+    skill = entry.skill
+    assert decimateSkill(skill, 10) is skill
+
+
+@pytest.mark.parametrize('factor', [0.5, 2, 3])
+@pytest.mark.parametrize('entry', entries, ids=entryId)
+def testResampledSkill(entry, factor):
+    skill, model = entry.skill, entry.model
+    newFrames = max(2, min(127, int(skill.frameCount * factor + 0.5)))
+    resampled = resampleSkill(skill, newFrames, model)
+    if newFrames != skill.frameCount:
+        expected = legacyResample(skill, newFrames, model)
+        if resampled.angleRatio > 1:
+            expected = [[angle // 2 * 2 for angle in row] for row in expected]
+        assert [resampled.frameValues(f)[:skill.angleColumns] for f in range(newFrames)] == expected
+    if skill.kind == 'behavior':    # the delays are kept
+        assert sum(resampled.frames()[f, 17] for f in range(newFrames)) == \
+            min(127 * newFrames, sum(skill.frames()[f, 17] for f in range(skill.frameCount)))
+    if skill.kind == 'gait' and newFrames > skill.frameCount and newFrames % skill.frameCount == 0:
+        # a gait resampled to a multiple of its frames comes back, within the joint limits some library gaits go beyond
+        back = resampleSkill(resampled, skill.frameCount, model)
+        limits = limitsOf(model)[skill.firstJoint:]
+        error = max(abs(a - max(low, min(high, b))) for f in range(skill.frameCount)
+                    for a, b, [low, high] in zip(back.frameValues(f), skill.frameValues(f), limits))
+        assert error <= skill.angleRatio * resampled.angleRatio
+
+
+@pytest.mark.parametrize('entry', entries, ids=entryId)
+def testSkillAtItsOwnLength(entry):
+    skill = entry.skill
+    assert resampleSkill(skill, skill.frameCount, entry.model) is skill
+    assert scaleSkillTime(skill, 1, entry.model) == skill
+
+
+def testWithoutNumPy(monkeypatch):
+    # the column at a time path gives the same skills
+    if skillTransform.numpy is None:
+        pytest.skip("NumPy is not installed")
+    factors = [0.1, 0.5, 0.7, 1.5, 2, 3, 10]
+    withNumPy = scaleLibrary(factors, kinds=('gait', 'behavior'))
+    resampled = [resampleSkill(entry.skill, frames, entry.model) for entry in behaviors for frames in range(2, 128, 7)]
+    monkeypatch.setattr(skillTransform, 'numpy', None)
+    assert [skill for entry, factor, skill in scaleLibrary(factors, kinds=('gait', 'behavior'))] == \
+        [skill for entry, factor, skill in withNumPy]
+    assert [resampleSkill(entry.skill, frames, entry.model) for entry in behaviors for frames in range(2, 128, 7)] == \
+        resampled
@@ -0,0 +1,72 @@
+# UIDispatcher sends commands from the Tk mainloop while a slider of the Skill Composer moves a joint all along through
+# a CommandChannel, and every command must get its own answer from emulator.py.
+
+import threading
+import time
+
+import pytest
+
+tkinter = pytest.importorskip('tkinter')
+
+from ardSerial import closePortWorker
+from benchmark import openEmulatorPort, startEmulator, timeMainloop
+from commandChannel import CommandChannel
+from uiDispatcher import UIDispatcher
+
+answeredTasks = [['?', 0], ['g', 0], ['kbalance', 0], ['c', 0]]    # commands whose answers can be told apart
+
+
+def answered(task, result):
+    # whether result is the answer of task: its echo, and the lines of '?' and 'c'
+    if result == -1:
+        return False
+    token = task[0][0]
+    return (result[0].strip().lower() == token and (token != '?' or 'Bittle' in result[1])
+            and (token != 'c' or '15\t' in result[1]))
+
+
+def testAnswersWhileASliderMoves():
+    # a window if there is a display, otherwise only the Tcl event loop, which runs after() the same way
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        root = tkinter.Tcl()
+    emulator, portName = startEmulator()
+    port = openEmulatorPort(portName)
+    ports = {port: 'emulator'}
+    channel = CommandChannel(ports)
+    dispatcher = UIDispatcher(root)
+    sliding = threading.Event()
+
+    def slide():
+        angle = 0
+        while not sliding.is_set():
+            angle = (angle + 7) % 60
+            channel.setJoint(8, angle - 30)
+            time.sleep(0.003)
+
+    slider = threading.Thread(target=slide)
+    slider.start()
+    tasks = [answeredTasks[n % len(answeredTasks)] for n in range(20)]
+    answers = []
+
+    def check(report, task):
+        def callback(result):
+            answers.append(answered(task, result))
+            report(result)
+        return callback
+
+    try:
+        timeMainloop(root, [lambda report, task=task: dispatcher.send(ports, task, callback=check(report, task))
+                            for task in tasks], 0.1)
+    finally:
+        sliding.set()
+        slider.join()
+        dispatcher.close(10)
+        channel.close()
+        closePortWorker(port)
+        port.Close_Engine()
+        emulator.terminate()
+        if isinstance(root, tkinter.Tk) and root.tk.call('info', 'commands', 'destroy'):
+            root.destroy()
+    assert answers == [True] * len(tasks)
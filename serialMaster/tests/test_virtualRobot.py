@@ -0,0 +1,44 @@
+# VirtualRobot plays testSchedules, task by task and compiled into one skill, to the pose they should end with, for the
+# schedule of demos/climbCeiling.py and random ones.
+
+import os
+import random
+
+import pytest
+
+from ardSerial import postureAngles
+from benchmark import demoSchedule, randomSchedule
+from firmware import playSchedule
+from scheduleCompiler import compileSchedule
+from virtualRobot import VirtualRobot
+
+serialMasterDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+generator = random.Random(1)
+schedules = [demoSchedule(os.path.join(serialMasterDir, 'demos', 'climbCeiling.py'))]
+schedules += [randomSchedule(generator, 40) for n in range(50)]
+# playSchedule() doesn't know the rest posture
+schedules = [[task for task in schedule if task[0][0] != 'd'] for schedule in schedules]
+scheduleIds = ['climbCeiling'] + [f'random {n}' for n in range(50)]
+
+
+def heldPose(robot, expected):
+    # a head moved by hand stays there through the postures and gaits after it, which playSchedule() ignores
+    return [robot.targetHead.get(j, angle) for j, angle in enumerate(expected)]
+
+
+@pytest.mark.parametrize('schedule', schedules, ids=scheduleIds)
+def testScheduleTaskByTask(schedule):
+    robot = VirtualRobot('Bittle')
+    robot.playSchedule(schedule)
+    expected = [round(v) for v in playSchedule(schedule)[0]]
+    assert [round(v) for v in robot.currentAng] == heldPose(robot, expected)
+    jumps = [abs(b - a) for before, after in zip(robot.poses, robot.poses[1:]) for a, b in zip(before, after)]
+    assert max(jumps) <= 180
+
+
+@pytest.mark.parametrize('schedule', schedules, ids=scheduleIds)
+def testCompiledSchedule(schedule):
+    robot = VirtualRobot('Bittle')
+    robot.playTask(['K', compileSchedule(schedule, postureAngles), 0])
+    expected = [round(v) for v in playSchedule(schedule)[0]]
+    assert [round(v) for v in robot.currentAng] == heldPose(robot, expected)
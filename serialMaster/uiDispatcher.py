@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# Runs the serial I/O of a Tk window off its mainloop.
+# A handler calls dispatcher.send(ports, task, callback=...) and returns at once. One worker thread runs the jobs
+# in the order they were given, so a posture still follows the 'i' before it. A send goes through send(), which
+# runs it on the worker of each port (portWorker.PortWorker), in order with the flushes of a CommandChannel.
+# The callbacks run on the Tk thread with the result of the job, delivered by window.after(), because Tk must only
+# be touched from its own thread. Close the dispatcher before destroying the window: no callback runs after close().
+# e.g.
+# self.dispatcher = UIDispatcher(self.window)
+# self.dispatcher.send(goodPorts, ['kbalance', 0])
+# self.dispatcher.send(goodPorts, ['c', 0], callback=self.showOffsets)
+# self.dispatcher.submit(time.sleep, 2)    # any function, e.g. a pause between two commands
+
+import queue
+
+from ardSerial import *
+
+pollPeriod = 20    # milliseconds between the checks for finished jobs while some are outstanding
+
+
+class UIDispatcher:
+    def __init__(self, window):
+        self.window = window
+        self.jobs = queue.Queue()    # [function, args, callback], or None to stop
+        self.finished = queue.Queue()    # [callback, result]
+        self.outstanding = 0    # jobs whose callbacks have not run. only used on the Tk thread
+        self.pollId = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, function, *args, callback=None):
+        # call from the Tk thread. callback(result) runs on the Tk thread after function(*args) returns
+        self.outstanding += 1
+        self.jobs.put([function, args, callback])
+        self.schedulePoll()
+
+    def send(self, ports, task, timeout=0, callback=None):
+        # callback gets what send() returns: [response, allPrints] or -1
+        self.submit(send, ports, task, timeout, callback=callback)
+
+    def busy(self):
+        return self.outstanding > 0
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            function, args, callback = job
+            try:
+                result = function(*args)
+            except Exception as e:
+                logger.info(f"Fail to run {function.__name__}: {e}")
+                result = -1
+            self.finished.put([callback, result])
+
+    def schedulePoll(self):
+        if self.pollId is None and not self.closed:
+            try:
+                self.pollId = self.window.after(pollPeriod, self.deliver)
+            except Exception:    # TclError: the window is destroyed
+                self.pollId = None
+
+    def deliver(self):
+        self.pollId = None
+        while not self.closed:
+            try:
+                callback, result = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            self.outstanding -= 1
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception as e:
+                    logger.info(f"Fail to run the callback {getattr(callback, '__name__', callback)}: {e}")
+        if self.outstanding > 0:
+            self.schedulePoll()
+
+    def close(self, wait=0):
+        # stop the worker after the jobs already given. wait up to wait seconds for them, e.g. the last 'd' on closing.
+        # call from the Tk thread. the callbacks not run yet are dropped
+        self.closed = True
+        if self.pollId is not None:
+            try:
+                self.window.after_cancel(self.pollId)
+            except Exception:    # TclError: the window is destroyed
+                pass
+            self.pollId = None
+        self.jobs.put(None)
+        if wait > 0 and self.thread is not threading.current_thread():
+            self.thread.join(wait)
@@ -0,0 +1,235 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+
+# A headless robot on a virtual clock. It reads the bytes ardSerial writes (encodeTask(), the bytes of
+# serialWriteNumToByte() and serialWriteByte()) and reacts as emulator.py does, but nothing waits: the clock moves
+# by the time the robot would take. Every step of transform() is eased as in src/motion.h, a gait shows one frame
+# per step (or per frameSeconds) while the host waits, and each step is recorded with the angles of the 16 joints. save() writes them to
+# a NumPy file with the feet and knees of kinematics.py for Bittle.
+# e.g.
+# robot = VirtualRobot('Bittle')
+# robot.playSchedule([['kbalance', 1], ['kwkF', 2], ['i', [8, -30, 12, 60], 0.5], ['d', 1]])
+# robot.save('walk.npz')    # time, angles, knees, feet, tokens, tokenTimes
+#
+# or behind a pseudo terminal, for unchanged scripts: the robot answers at once and the clock moves by the robot's
+# time plus the time the host waits between commands
+# robot = VirtualRobot('Bittle'); port = robot.start()
+# python3 virtualRobot.py --output run.npz    # prints the port, saves the recording on Ctrl+C
+
+import argparse
+import math
+import os
+import select
+import time
+
+from ardSerial import encodeTask, splitTaskForLargeAngles
+from emulator import DOF, SERIAL_TIMEOUT_LONG, WALKING_DOF, FirmwareEmulator
+
+
+class VirtualRobot(FirmwareEmulator):
+    def __init__(self, model='Bittle', board='NyBoard', baudRate=115200, stepSeconds=0.002, frameSeconds=None):
+        super().__init__(model, board, baudRate, stepSeconds, boot=True, bootDelay=0)
+        self.frameSeconds = frameSeconds or stepSeconds    # a gait frame, a whole pass of the loop
+        self.clock = 0.0    # seconds of the robot since it started
+        self.running = True
+        self.input = bytearray()
+        self.lastInput = None    # when the last bytes came in through the pseudo terminal
+        self.output = []    # the lines printed
+        self.times = []
+        self.poses = []
+        self.tokens = []    # [time, token] of each command
+        self.gaitFrame = 0
+        self.targetHead = {}    # {joint: angle} of the head after an indexed command, manualHeadQ of the firmware
+        self.record()
+
+    # the clock
+    def wait(self, seconds):
+        self.clock += max(0, seconds)
+
+    def available(self):
+        return False    # a command only comes after the one before is done
+
+    def record(self):
+        self.times.append(self.clock)
+        self.poses.append(list(self.currentAng))
+
+    def println(self, text=''):
+        data = (str(text) + '\r\n').encode('ISO-8859-1')
+        self.wait(len(data) * self.byteSeconds)
+        self.output.append(str(text))
+        if self.master is not None:
+            try:
+                os.write(self.master, data)
+            except OSError:
+                pass
+
+    # motion
+    def transform(self, target, angleRatio=1, speedRatio=2, offset=0):
+        # transform() in motion.h, one recorded step per step of the servos
+        targets = [target[i - offset] * angleRatio for i in range(offset, DOF)]
+        if speedRatio <= 0:
+            self.currentAng[offset:] = targets
+            self.wait(self.stepSeconds)
+            self.record()
+            return
+        diff = [self.currentAng[i] - targets[i - offset] for i in range(offset, DOF)]
+        steps = int(round(max(abs(d) for d in diff) / speedRatio))
+        for s in range(steps + 1):
+            eased = 0 if steps == 0 else (1 + math.cos(math.pi * s / steps)) / 2
+            self.currentAng[offset:] = [t + eased * d for t, d in zip(targets, diff)]
+            self.wait(self.stepSeconds)
+            self.record()
+        self.currentAng[offset:] = targets
+
+    def loadSkill(self, data):
+        super().loadSkill(data)
+        self.gaitFrame = 0
+
+    def moveJoints(self, token, values):
+        for p in range(0, len(values) - 1, 2):
+            if 0 <= values[p] < 4:
+                self.targetHead[values[p]] = values[p + 1]
+        super().moveJoints(token, values)
+
+    def react(self, token, cmd):
+        if token == 'd' or token == 'i' and not bytes(cmd).strip() or token in 'IM' and len(cmd) < 2:
+            self.targetHead = {}
+        super().react(token, cmd)
+
+    def holdHead(self):
+        # the loop of the firmware writes a head moved by hand in every pass of a gait or posture (skill.h)
+        for joint, angle in self.targetHead.items():
+            self.currentAng[joint] = angle
+
+    def idle(self, seconds):
+        # the host waits. a gait goes on with one frame per step, anything else holds its pose
+        skill = self.skill
+        end = self.clock + max(0, seconds)
+        if skill.period > 1 and self.tStep:
+            first = skill.firstJoint
+            while self.clock + self.frameSeconds <= end:
+                self.gaitFrame = (self.gaitFrame + self.tStep) % skill.period
+                frame = skill.frame(self.gaitFrame)
+                self.currentAng[first:] = [angle * (skill.angleRatio or 1) for angle in frame]
+                self.holdHead()
+                self.wait(self.frameSeconds)
+                self.record()
+        elif skill.period == 1 and any(self.currentAng[j] != angle for j, angle in self.targetHead.items()):
+            self.holdHead()    # the next pass of the loop, however short the wait
+            self.wait(self.stepSeconds)
+            self.record()
+        if end > self.clock:
+            self.clock = end
+            self.record()
+
+    # commands
+    def nextCommand(self, final=False):
+        # [token, the bytes after it] of the first complete command of the input, or None. final takes the rest
+        # without a terminator, as read_serial() does after its timeout
+        if not self.input:
+            return None
+        token = chr(self.input[0])
+        if token == 'K' and len(self.input) >= 2:
+            period = self.input[1] - 256 if self.input[1] > 127 else self.input[1]
+            frameSize = DOF + 4 if period < 0 else DOF if period == 1 else WALKING_DOF
+            end = (7 if period < 0 else 4) + abs(period) * frameSize + 1    # the frames may hold the value of '~'
+            end = self.input.find(b'~', end) if len(self.input) > end else -1
+        else:
+            end = self.input.find(b'~' if 'A' <= token <= 'Z' else b'\n', 1)
+        if end < 0:
+            if not final:
+                return None
+            end = len(self.input)
+        cmd = list(self.input[1:end])
+        del self.input[:end + 1]
+        return token, cmd
+
+    def feed(self, data, seconds=0):
+        # the robot receives data, reacts to each command in it, then the host waits seconds
+        self.input += data
+        self.wait(len(data) * self.byteSeconds)
+        while True:
+            command = self.nextCommand(final=True)
+            if command is None:
+                break
+            self.tokens.append([self.clock, command[0]])
+            self.commandCount += 1
+            self.react(*command)
+        self.idle(seconds)
+
+    def playTask(self, task):
+        # a task of send(), e.g. ['kwkF', 2] or ['K', skill, 1], as ardSerial would write it
+        for part in splitTaskForLargeAngles(list(task)):
+            if len(part) > 2 and isinstance(part[1], list):
+                part = [part[0], list(part[1]), part[-1]]    # encodeTask() rescales a K list in place
+            self.feed(encodeTask(part), part[-1])
+
+    def playSchedule(self, schedule):
+        for task in schedule:
+            self.playTask(task)
+
+    # the pseudo terminal
+    def run(self):
+        for line in ['k', '\n* Start *', self.model, self.version, 'Ready!']:
+            self.println(line)
+        while self.running:
+            try:
+                ready = select.select([self.master], [], [], SERIAL_TIMEOUT_LONG)[0]
+                data = os.read(self.master, 4096) if ready else b''
+            except OSError:
+                break
+            now = time.monotonic()
+            if data:
+                if self.lastInput is not None and not self.input:
+                    self.idle(now - self.lastInput)    # the host waited since the robot answered
+                self.input += data
+                self.wait(len(data) * self.byteSeconds)
+            while True:
+                command = self.nextCommand(final=not data)
+                if command is None:
+                    break
+                self.tokens.append([self.clock, command[0]])
+                self.commandCount += 1
+                self.react(*command)
+                self.idle(0)
+            if data:
+                self.lastInput = time.monotonic()
+
+    # the recording
+    def trajectories(self):
+        # {'time': steps, 'angles': steps x 16, 'tokens', 'tokenTimes'}, and 'knees' and 'feet': steps x 4 x 3 for
+        # Bittle, as NumPy arrays
+        import kinematics
+        kinematics.requireNumpy()
+        numpy = kinematics.numpy
+        result = {'time': numpy.array(self.times), 'angles': numpy.array(self.poses),
+                  'tokens': numpy.array([token for t, token in self.tokens], dtype=str),
+                  'tokenTimes': numpy.array([t for t, token in self.tokens])}
+        if self.model.startswith('Bittle'):
+            result['knees'], result['feet'] = kinematics.LegModel().positions(result['angles'])
+        return result
+
+    def save(self, fileName):
+        import kinematics
+        kinematics.numpy.savez_compressed(fileName, **self.trajectories())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='A robot on a virtual clock behind a pseudo terminal')
+    parser.add_argument('--model', default='Bittle', choices=['Bittle', 'Nybble'])
+    parser.add_argument('--step-ms', type=float, default=2, help='time of one transform step in ms')
+    parser.add_argument('--frame-ms', type=float, help='time of one gait frame in ms, a step if omitted')
+    parser.add_argument('--output', default='virtualRobot.npz', help='the NumPy file of the recording')
+    args = parser.parse_args()
+    robot = VirtualRobot(args.model, stepSeconds=args.step_ms / 1000,
+                         frameSeconds=args.frame_ms / 1000 if args.frame_ms else None)
+    portName = robot.start()
+    print(f"{args.model} virtual robot on {portName}")
+    print(f"export OPENCAT_EXTRA_PORTS={portName}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        robot.stop()
+        robot.save(args.output)
+        print(f"{len(robot.times)} steps over {robot.clock:.1f} s saved to {args.output}")